@@ -6,7 +6,9 @@ from .client import Client
 from .client.utils import VERSION
 
 
-__all__ = ["Client", "transport", "serializer", "connection", "exceptions"]
+__all__ = ["Client", "transport", "serializer", "connection", "exceptions",
+           "futures", "retry", "hedge", "metrics", "hooks", "emulator", "body",
+           "sync", "index"]
 __version__ = VERSION
 
 
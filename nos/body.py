@@ -0,0 +1,94 @@
+# -*- coding:utf8 -*-
+
+import mmap
+import os
+
+from .compat import memoryview
+
+__all__ = ["FileSegment", "get_buffer", "map_file"]
+
+
+def map_file(fileobj, offset=0, length=None):
+    """
+    Return a read-only buffer of `length` bytes of a file from `offset`,
+    backed by a memory map: hashing and sending it reads the page cache
+    directly, without copying the data into Python strings. `fileobj` is a
+    path or a file opened in binary mode, `length` defaults to the rest of
+    the file.
+
+    The file must not be truncated while the buffer is used: reading the
+    map beyond the end of the file kills the process with SIGBUS.
+    """
+    if isinstance(fileobj, basestring):
+        with open(fileobj, 'rb') as fp:
+            return map_file(fp, offset, length)
+
+    size = os.fstat(fileobj.fileno()).st_size
+    if length is None:
+        length = size - offset
+    if offset < 0 or length < 0 or offset + length > size:
+        raise ValueError('segment %d+%d exceeds the file size %d' % (
+            offset, length, size
+        ))
+    if length == 0:
+        return buffer('')
+
+    # the offset of a map must be a multiple of the allocation granularity
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    mapped = mmap.mmap(fileobj.fileno(), offset + length - start,
+                       access=mmap.ACCESS_READ, offset=start)
+    # the buffer keeps the map open until it is garbage collected
+    return buffer(mapped, offset - start, length)
+
+
+class FileSegment(object):
+    """
+    Request body made of `length` bytes of a file from `offset`, sent from a
+    memory map of the file. `fileobj` is a path or a file opened in binary
+    mode, whose position is left untouched; `length` defaults to the rest
+    of the file.
+
+        client.upload_part(bucket, key, 2, upload_id,
+                           FileSegment('/data/big.bin', part_size, part_size))
+    """
+    def __init__(self, fileobj, offset=0, length=None):
+        self.fileobj = fileobj
+        self.offset = offset
+        if length is None:
+            if isinstance(fileobj, basestring):
+                length = os.path.getsize(fileobj) - offset
+            else:
+                length = os.fstat(fileobj.fileno()).st_size - offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return 'FileSegment(%r, %d, %d)' % (self.fileobj, self.offset,
+                                            self.length)
+
+    def get_buffer(self):
+        return map_file(self.fileobj, self.offset, self.length)
+
+
+def get_buffer(data):
+    """
+    Return a zero-copy read-only buffer of a bytes-like body: a
+    `FileSegment`, `bytearray`, `mmap`, `array`, NumPy array or any other
+    object exposing the buffer interface. A `memoryview` of bytes is
+    returned as is. Return `None` for the other objects.
+    """
+    if isinstance(data, FileSegment):
+        return data.get_buffer()
+    if isinstance(data, buffer):
+        return data
+    if memoryview is not None and isinstance(data, memoryview):
+        if data.ndim == 1 and data.itemsize == 1:
+            return data
+        # python 2 can't view the bytes of a memoryview of other items
+        return data.tobytes()
+    try:
+        return buffer(data)
+    except TypeError:
+        return None
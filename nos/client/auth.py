@@ -4,10 +4,85 @@ import base64
 import hashlib
 import hmac
 import time
-import urllib2
-import copy
 from .utils import (HTTP_HEADER, NOS_HEADER_PREFIX, TIME_CST_FORMAT,
-                    CHUNK_SIZE, SUB_RESOURCE, USER_AGENT)
+                    CHUNK_SIZE, SUB_RESOURCE, get_user_agent)
+from ..compat import quote
+
+_SIGNED_HEADERS = {
+    HTTP_HEADER.CONTENT_TYPE.lower(): 'content_type',
+    HTTP_HEADER.CONTENT_MD5.lower(): 'content_md5',
+    HTTP_HEADER.DATE.lower(): 'date',
+    HTTP_HEADER.EXPIRES.lower(): 'expires',
+}
+
+
+class RequestSigner(object):
+    """
+    Signing state shared by all the requests of a client: the HMAC keyed with
+    the secret, which is copied for each request instead of being created
+    again, and the Date header, which is formatted once per second.
+    """
+    __slots__ = ('access_key_id', 'access_key_secret', '_hmac', '_date')
+
+    def __init__(self, access_key_id, access_key_secret):
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self._hmac = None
+        if None not in (access_key_id, access_key_secret):
+            self._hmac = hmac.new(str(access_key_secret),
+                                  digestmod=hashlib.sha256)
+        self._date = (None, '')
+
+    def get_date(self):
+        now = int(time.time())
+        second, date = self._date
+        if second != now:
+            date = time.strftime(TIME_CST_FORMAT,
+                                 time.gmtime(now + 8 * 3600))
+            self._date = (now, date)
+        return date
+
+    def can_sign(self):
+        return self._hmac is not None
+
+    def get_signature(self, str_to_sign):
+        hmac_sha256 = self._hmac.copy()
+        hmac_sha256.update(str_to_sign)
+        return base64.b64encode(hmac_sha256.digest())
+
+    def get_authorization(self, str_to_sign):
+        return 'NOS %s:%s' % (self.access_key_id,
+                              self.get_signature(str_to_sign))
+
+
+def presign_urls(signer, method, bucket, keys, expires,
+                 end_point='nos.netease.com', enable_ssl=False):
+    """
+    Yield a query string authenticated url for each of the `keys`, valid
+    until the unix time `expires`.
+
+    Everything but the key is prepared once: the url and string to sign
+    prefixes, the query string and the keyed HMAC of `signer`.
+    """
+    url_prefix = '%s%s.%s/' % ('https://' if enable_ssl else 'http://',
+                               bucket, end_point)
+    if not signer.can_sign():
+        for key in keys:
+            if isinstance(key, unicode):
+                key = key.encode('utf-8')
+            yield url_prefix + quote(key.strip('/'), '*')
+        return
+
+    sign_prefix = '%s\n\n\n%d\n/%s/' % (method, expires, bucket)
+    query = '?NOSAccessKeyId=%s&Expires=%d&Signature=' % (
+        quote(str(signer.access_key_id), ''), expires
+    )
+    for key in keys:
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        quoted_key = quote(key.strip('/'), '*')
+        signature = signer.get_signature(sign_prefix + quoted_key)
+        yield url_prefix + quoted_key + query + quote(signature, '')
 
 
 class RequestMetaData(object):
@@ -16,7 +91,8 @@ class RequestMetaData(object):
     """
     def __init__(self, access_key_id, access_key_secret, method,
                  bucket=None, key=None, end_point='nos.netease.com',
-                 params={}, body=None, headers={}, enable_ssl=False):
+                 params={}, body=None, headers={}, enable_ssl=False,
+                 signer=None):
         self.access_key_id = access_key_id
         self.access_key_secret = access_key_secret
         self.method = method
@@ -24,10 +100,13 @@ class RequestMetaData(object):
         self.key = key
         self.end_point = end_point
         self.params = params
-        self.headers = copy.deepcopy(headers)
+        self.headers = dict(headers)
         self.enable_ssl = enable_ssl
         self.body = body
         self.url = ''
+        self.signer = signer or RequestSigner(access_key_id, access_key_secret)
+        self._quoted_key = (None, '')
+        self._query_pieces = (None, [])
 
         self._complete_headers()
         self._complete_url()
@@ -38,17 +117,44 @@ class RequestMetaData(object):
     def get_headers(self):
         return self.headers
 
+    def _get_quoted_key(self):
+        """
+        Quote the key once for both the url and the canonicalized resource.
+        """
+        key, quoted_key = self._quoted_key
+        if key != self.key:
+            quoted_key = quote(self.key.strip('/'), '*')
+            self._quoted_key = (self.key, quoted_key)
+        return quoted_key
+
+    def _get_query_pieces(self):
+        """
+        Quote the params once for both the url and the canonicalized resource.
+        """
+        params, pieces = self._query_pieces
+        if params is not self.params:
+            pieces = []
+            for k, v in self.params.iteritems():
+                piece = k
+                if v is not None:
+                    # the markers of listings are the unicode keys
+                    v = v.encode('utf-8') if isinstance(v, unicode) \
+                        else str(v)
+                    piece += "=%s" % quote(v, '*')
+                pieces.append((k, piece))
+            self._query_pieces = (self.params, pieces)
+        return pieces
+
     def _complete_headers(self):
         # init date header
-        self.headers[HTTP_HEADER.DATE] = time.strftime(
-            TIME_CST_FORMAT, time.gmtime(time.time() + 8 * 3600)
-        )
+        self.headers[HTTP_HEADER.DATE] = self.signer.get_date()
 
         # init user-agent header
-        self.headers.setdefault(HTTP_HEADER.USER_AGENT, USER_AGENT)
+        self.headers.setdefault(HTTP_HEADER.USER_AGENT, get_user_agent())
 
-        # init content-md5 header
-        if self.body is not None:
+        # init content-md5 header unless the caller has supplied it
+        if (self.body is not None and
+                HTTP_HEADER.CONTENT_MD5 not in self.headers):
             md5 = hashlib.md5()
             if isinstance(self.body, file):
                 offset = self.body.tell()
@@ -67,15 +173,8 @@ class RequestMetaData(object):
 
         # init authorization header
         if None not in (self.access_key_id, self.access_key_secret):
-            str_to_sign = self._get_string_to_sign()
-            hmac_sha1 = hmac.new(str(self.access_key_secret),
-                                 str_to_sign, hashlib.sha256)
-            b64_hmac_sha1 = base64.encodestring(hmac_sha1.digest()).strip()
-            authorization_string = b64_hmac_sha1.rstrip('\n')
-
-            self.headers[HTTP_HEADER.AUTHORIZATION] = 'NOS %s:%s' % (
-                self.access_key_id, authorization_string
-            )
+            self.headers[HTTP_HEADER.AUTHORIZATION] = \
+                self.signer.get_authorization(self._get_string_to_sign())
 
     def _complete_url(self):
         """
@@ -90,18 +189,12 @@ class RequestMetaData(object):
             self.url += '%s.%s/' % (self.bucket, self.end_point)
 
         if self.key is not None:
-            self.url += urllib2.quote(self.key.strip('/'), '*')
+            self.url += self._get_quoted_key()
 
         if not self.params:
             return
 
-        pairs = []
-        for k, v in self.params.iteritems():
-            piece = k
-            if v is not None:
-                piece += "=%s" % urllib2.quote(str(v), '*')
-            pairs.append(piece)
-        query_string = '&'.join(pairs)
+        query_string = '&'.join(p for _, p in self._get_query_pieces())
         self.url += ("?" + query_string)
 
     def _get_string_to_sign(self):
@@ -111,33 +204,30 @@ class RequestMetaData(object):
         @rtype: string
         @return: canonical string for netease storage service
         """
-        headers = dict([(k.lower(), str(v).strip().strip("'\""))
-                        for k, v in self.headers.iteritems()])
-
-        meta_headers = dict([(k, v) for k, v in headers.iteritems()
-                             if k.startswith(NOS_HEADER_PREFIX)])
-
-        content_type = headers.get(HTTP_HEADER.CONTENT_TYPE.lower(), '')
-        content_md5 = headers.get(HTTP_HEADER.CONTENT_MD5.lower(), '')
-        date = headers.get(HTTP_HEADER.DATE.lower(), '')
-        expires = headers.get(HTTP_HEADER.EXPIRES.lower(), '')
+        # lower the header names in a single pass
+        signed = {}
+        meta_headers = []
+        for k, v in self.headers.iteritems():
+            k = k.lower()
+            if k in _SIGNED_HEADERS:
+                signed[_SIGNED_HEADERS[k]] = str(v).strip().strip("'\"")
+            elif k.startswith(NOS_HEADER_PREFIX):
+                meta_headers.append((k, str(v).strip().strip("'\"")))
 
         # compute string to sign
-        str_to_sign = '%s\n%s\n%s\n%s\n' % (
+        parts = [
             self.method,
-            content_md5,
-            content_type,
-            expires or date
-        )
+            signed.get('content_md5', ''),
+            signed.get('content_type', ''),
+            signed.get('expires') or signed.get('date', '')
+        ]
 
-        sorted_meta_headers = meta_headers.keys()
-        sorted_meta_headers.sort()
+        meta_headers.sort()
+        for meta_header in meta_headers:
+            parts.append('%s:%s' % meta_header)
 
-        for meta_header in sorted_meta_headers:
-            str_to_sign += '%s:%s\n' % (meta_header, meta_headers[meta_header])
-
-        str_to_sign += "%s" % (self._get_canonicalized_resource())
-        return str_to_sign
+        parts.append(self._get_canonicalized_resource())
+        return '\n'.join(parts)
 
     def _get_canonicalized_resource(self):
         """
@@ -151,19 +241,13 @@ class RequestMetaData(object):
 
         # add the key.  even if it doesn't exist, add the slash
         if self.key is not None:
-            buf += urllib2.quote(self.key.strip('/'), '*')
+            buf += self._get_quoted_key()
 
         # handle sub source in special query string arguments
         if self.params:
             buf += "?"
-            pairs = []
-            for k, v in self.params.iteritems():
-                if k not in SUB_RESOURCE:
-                    continue
-                piece = k
-                if v is not None:
-                    piece += "=%s" % urllib2.quote(str(v), '*')
-                pairs.append(piece)
+            pairs = [p for k, p in self._get_query_pieces()
+                     if k in SUB_RESOURCE]
 
             buf += '&'.join(pairs)
             if len(pairs) == 0:
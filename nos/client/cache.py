@@ -0,0 +1,413 @@
+# -*- coding:utf8 -*-
+
+import errno
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from .utils import METADATA_CACHE_TTL, CONTENT_CACHE_SIZE
+
+_ETAG_RE = re.compile(r'^[0-9A-Za-z_-]+$')
+
+#: Seconds between two scans of a content cache directory, to account for
+#: the contents stored by the other processes sharing it.
+RESCAN_INTERVAL = 30
+
+
+def cache_key(bucket, key):
+    """
+    Return the cache key of an object, the same for unicode and utf-8 names.
+    """
+    if isinstance(bucket, unicode):
+        bucket = bucket.encode('utf-8')
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return bucket, key
+
+
+class MetadataCache(object):
+    """
+    Thread-safe LRU cache of the `head_object` results of a `Client`.
+
+    At most `max_size` objects are kept, the least recently used one being
+    evicted first. An entry is fresh for `ttl` seconds after it was stored
+    or revalidated; a stale entry is still returned by `get` so that the
+    client can revalidate it with a conditional request instead of fetching
+    it again.
+    """
+    def __init__(self, max_size, ttl=METADATA_CACHE_TTL):
+        if max_size <= 0:
+            raise ValueError('max_size must be positive: %r' % max_size)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, bucket, key):
+        """
+        Return `(info, fresh)` for the object, or `(None, False)` if it is
+        not cached.
+        """
+        name = cache_key(bucket, key)
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return None, False
+            self._entries[name] = entry
+        info, expires_at = entry
+        return dict(info), time.time() < expires_at
+
+    def set(self, bucket, key, info):
+        """
+        Store the `head_object` result of the object, fresh for `ttl`
+        seconds.
+        """
+        name = cache_key(bucket, key)
+        with self._lock:
+            self._entries.pop(name, None)
+            self._entries[name] = (dict(info), time.time() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, bucket, key):
+        name = cache_key(bucket, key)
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ContentCache(object):
+    """
+    Size bounded on-disk cache of object contents, which can be shared by
+    the processes using the same `directory`.
+
+    The content of an object is stored as `<directory>/<h>/<etag>`, where
+    `<h>` is the SHA-1 of the bucket and key, next to a `<etag>.json` file
+    holding its metadata. Only the latest version of an object is kept. The
+    least recently used contents, according to their modification time which
+    is updated on every hit, are removed once the total size of the cache
+    exceeds `max_bytes`. As other processes may have added or removed
+    contents, the directory is scanned again before evicting, and when a
+    content is stored at least `RESCAN_INTERVAL` seconds after the last
+    scan, so that `max_bytes` bounds the whole directory rather than what
+    this process wrote. It may thus be exceeded by what the other processes
+    stored since the last scan; concurrent evictions may remove a few more
+    contents than needed, never less.
+    """
+    def __init__(self, directory, max_bytes=CONTENT_CACHE_SIZE):
+        if max_bytes <= 0:
+            raise ValueError('max_bytes must be positive: %r' % max_bytes)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        self._size = 0
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._load()
+
+    def _load(self):
+        """
+        Scan the directory for the cached contents, ordered from the least
+        recently used one.
+        """
+        self._sizes.clear()
+        self._size = 0
+        self._scanned_at = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            entry_dir = os.path.join(self.directory, name)
+            if not os.path.isdir(entry_dir):
+                continue
+            for etag in os.listdir(entry_dir):
+                path = os.path.join(entry_dir, etag)
+                if not _ETAG_RE.match(etag):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, path, st.st_size))
+        entries.sort()
+        for _, path, size in entries:
+            self._sizes[path] = size
+            self._size += size
+
+    def __len__(self):
+        return len(self._sizes)
+
+    @property
+    def size(self):
+        """ The total number of bytes of the cached contents. """
+        return self._size
+
+    def _entry_dir(self, bucket, key):
+        bucket, key = cache_key(bucket, key)
+        return os.path.join(self.directory,
+                            hashlib.sha1('%s/%s' % (bucket, key)).hexdigest())
+
+    def get(self, bucket, key):
+        """
+        Return the metadata of the cached version of the object, or `None`.
+        """
+        entry_dir = self._entry_dir(bucket, key)
+        try:
+            names = os.listdir(entry_dir)
+        except OSError:
+            return None
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            etag = name[:-len('.json')]
+            if not os.path.exists(os.path.join(entry_dir, etag)):
+                continue
+            try:
+                with open(os.path.join(entry_dir, name), 'rb') as fp:
+                    info = json.load(fp)
+            except (IOError, ValueError):
+                return None
+            return dict(
+                (str(k), v.encode('utf-8') if isinstance(v, unicode) else v)
+                for k, v in info.iteritems()
+            )
+        return None
+
+    def open(self, bucket, key, etag):
+        """
+        Open the cached content of the `etag` version of the object for
+        reading, and mark it as the most recently used one.
+        """
+        path = os.path.join(self._entry_dir(bucket, key), etag)
+        fp = open(path, 'rb')
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            size = self._sizes.pop(path, None)
+            if size is not None:
+                self._sizes[path] = size
+        return fp
+
+    def writer(self, bucket, key, info):
+        """
+        Return a `CacheWriter` storing a new version of the object, or `None`
+        if its ETag can not be used as a file name or it is larger than the
+        cache.
+        """
+        if not _ETAG_RE.match(info.get('etag') or ''):
+            return None
+        if info['content_length'] > self.max_bytes:
+            return None
+        return CacheWriter(self, self._entry_dir(bucket, key), info)
+
+    def commit(self, entry_dir, info, tmp_path):
+        """
+        Move the completely written content `tmp_path` into the cache, in
+        place of the older versions of the object, and evict the least
+        recently used contents if needed.
+        """
+        etag = info['etag']
+        path = os.path.join(entry_dir, etag)
+        try:
+            os.makedirs(entry_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp_meta = tempfile.mkstemp(suffix='.tmp', dir=entry_dir)
+        with os.fdopen(fd, 'wb') as fp:
+            json.dump(info, fp)
+        os.rename(tmp_path, path)
+        os.rename(tmp_meta, path + '.json')
+
+        with self._lock:
+            for name in os.listdir(entry_dir):
+                if name in (etag, etag + '.json') or name.endswith('.tmp'):
+                    continue
+                self._remove(os.path.join(entry_dir, name))
+            self._size -= self._sizes.pop(path, 0)
+            self._sizes[path] = info['content_length']
+            self._size += info['content_length']
+            if (self._size > self.max_bytes or
+                    time.time() - self._scanned_at >= RESCAN_INTERVAL):
+                # the contents written or removed by the other processes
+                # sharing the directory count as well
+                self._load()
+            self._evict()
+
+    def invalidate(self, bucket, key):
+        """ Remove every cached version of the object. """
+        entry_dir = self._entry_dir(bucket, key)
+        with self._lock:
+            try:
+                names = os.listdir(entry_dir)
+            except OSError:
+                return
+            for name in names:
+                if not name.endswith('.tmp'):
+                    self._remove(os.path.join(entry_dir, name))
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._sizes:
+            path = next(iter(self._sizes))
+            self._remove(path)
+            self._remove(path + '.json')
+
+    def _remove(self, path):
+        self._size -= self._sizes.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CacheWriter(object):
+    """
+    Temporary file receiving the content of an object while it is read from
+    the connection, moved into the cache once it is complete.
+    """
+    def __init__(self, cache, entry_dir, info):
+        self.cache = cache
+        self.entry_dir = entry_dir
+        self.info = info
+        self.written = 0
+        try:
+            os.makedirs(entry_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, self.path = tempfile.mkstemp(suffix='.tmp', dir=entry_dir)
+        self.fp = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.fp.write(data)
+        self.written += len(data)
+
+    def complete(self):
+        return self.written >= self.info['content_length']
+
+    def commit(self):
+        self.fp.close()
+        if self.written != self.info['content_length']:
+            self.discard()
+            return
+        self.cache.commit(self.entry_dir, self.info, self.path)
+
+    def discard(self):
+        self.fp.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class CachingBody(object):
+    """
+    Response body of `get_object` copying what is read into a
+    `CacheWriter`. The content is cached when the body has been read up to
+    its end, by `read`, `stream` or iteration, and discarded when it is
+    released or closed before.
+    """
+    def __init__(self, body, writer):
+        self._body = body
+        self._writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self._body, name)
+
+    def read(self, amt=None):
+        data = self._body.read() if amt is None else self._body.read(amt)
+        self._feed(data)
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def __iter__(self):
+        return self._copy(iter(self._body))
+
+    def stream(self, *args, **kwargs):
+        return self._copy(self._body.stream(*args, **kwargs))
+
+    def _copy(self, chunks):
+        for data in chunks:
+            self._feed(data)
+            yield data
+        self._finish()
+
+    def _feed(self, data):
+        writer = self._writer
+        if writer is None or not data:
+            return
+        try:
+            writer.write(data)
+        except (IOError, OSError):
+            self._discard()
+            return
+        if writer.complete():
+            self._finish()
+
+    def _finish(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            try:
+                writer.commit()
+            except (IOError, OSError):
+                writer.discard()
+
+    def _discard(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.discard()
+
+    def release_conn(self):
+        self._discard()
+        release_conn = getattr(self._body, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+
+    def close(self):
+        self._discard()
+        close = getattr(self._body, 'close', None)
+        if close is not None:
+            close()
+
+
+class CachedBody(object):
+    """
+    Body of `get_object` reading a cached file, with the `stream` and
+    `release_conn` methods of the response bodies.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+    def __iter__(self):
+        return iter(self._fp)
+
+    def read(self, amt=None):
+        return self._fp.read() if amt is None else self._fp.read(amt)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        return iter(lambda: self._fp.read(amt), '')
+
+    def release_conn(self):
+        self._fp.close()
+
+    def close(self):
+        self._fp.close()
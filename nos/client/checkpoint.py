@@ -0,0 +1,96 @@
+# -*- coding:utf8 -*-
+
+import json
+import os
+import tempfile
+import threading
+
+
+def to_unicode(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def file_fingerprint(path):
+    """
+    Return the size and modification time of a local file, which change
+    when the file is modified.
+    """
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime}
+
+
+class Checkpoint(object):
+    """
+    Progress of a transfer, kept as a JSON dict in a small local file which
+    is rewritten atomically after every change, so that the transfer can be
+    resumed after a crash. The parts done are kept in `parts`, a dict keyed
+    by part number.
+    """
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.state.setdefault('parts', {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Return the checkpoint saved in `path`, or `None` if it is missing or
+        unreadable.
+        """
+        try:
+            with open(path, 'rb') as fp:
+                state = json.load(fp)
+        except (IOError, ValueError):
+            return None
+        if not isinstance(state, dict):
+            return None
+        return cls(path, state)
+
+    def matches(self, **expected):
+        """ Whether the checkpoint belongs to the transfer `expected`. """
+        return all(self.state.get(k) == to_unicode(v)
+                   for k, v in expected.iteritems())
+
+    @property
+    def parts(self):
+        with self._lock:
+            return dict((int(k), v)
+                        for k, v in self.state['parts'].iteritems())
+
+    def set_parts(self, parts):
+        with self._lock:
+            self.state['parts'] = dict((str(k), v)
+                                       for k, v in parts.iteritems())
+            self._save()
+
+    def add_part(self, part_num, etag):
+        with self._lock:
+            self.state['parts'][str(part_num)] = etag
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                json.dump(self.state, fp)
+            if os.name == 'nt' and os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
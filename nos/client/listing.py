@@ -0,0 +1,310 @@
+# -*- coding:utf8 -*-
+
+import sys
+import threading
+import Queue
+
+from .utils import RETURN_KEY, LIST_PREFETCH_SIZE
+from ..exceptions import XmlParseError
+from ..compat import ET
+
+_DONE = object()
+
+
+def object_summary(element):
+    """
+    Convert a `Contents` element of an object listing into a dict.
+    """
+    return {
+        'key': element.findtext('Key', ''),
+        'size': int(element.findtext('Size') or 0),
+        'etag': (element.findtext('ETag') or
+                 element.findtext('Etag') or '').strip("'\""),
+        'last_modified': element.findtext('LastModified', ''),
+        'storage_class': element.findtext('StorageClass', '')
+    }
+
+
+def prefix_summary(element):
+    """
+    Convert a `CommonPrefixes` element of an object listing into a dict.
+    """
+    return {'prefix': element.findtext('Prefix', '')}
+
+
+def part_summary(element):
+    """
+    Convert a `Part` element of a part listing into a dict.
+    """
+    return {
+        'part_num': int(element.findtext('PartNumber') or 0),
+        'etag': (element.findtext('ETag') or '').strip("'\""),
+        'size': int(element.findtext('Size') or 0),
+        'last_modified': element.findtext('LastModified', '')
+    }
+
+
+def upload_summary(element):
+    """
+    Convert an `Upload` element of a multipart upload listing into a dict.
+    """
+    return {
+        'key': element.findtext('Key', ''),
+        'upload_id': element.findtext('UploadId', ''),
+        'initiated': element.findtext('Initiated', ''),
+        'storage_class': element.findtext('StorageClass', '')
+    }
+
+
+class Listing(object):
+    """
+    Description of a paginated listing: how its entries are decoded and how
+    the marker of the next page is found.
+
+    A marker made of several values, such as the key and upload ID markers
+    of multipart uploads, is a tuple, `next_marker_tag` being then the tuple
+    of the tags of its values. When the entries of a page are `in_order`,
+    the marker of the last entry is used when the response has none;
+    otherwise the greatest marker of the page is used.
+    """
+    def __init__(self, converters, next_marker_tag, marker_of,
+                 in_order=False):
+        self.converters = converters
+        self.next_marker_tag = next_marker_tag
+        self.marker_of = marker_of
+        self.in_order = in_order
+
+    def last_marker(self, last, entry):
+        """
+        Return the marker following `entry`, `last` being the one following
+        the previous entries of the page.
+        """
+        if self.in_order:
+            return self.marker_of(entry)
+        return max(last, self.marker_of(entry))
+
+    def next_marker(self, info, last):
+        """
+        Return the marker of the page following the page whose top level
+        elements are `info` and whose last marker is `last`, or `None`
+        after the last page.
+        """
+        if info.get('IsTruncated', 'false').lower() != 'true':
+            return None
+        if isinstance(self.next_marker_tag, tuple):
+            marker = tuple(info.get(tag) or None
+                           for tag in self.next_marker_tag)
+            return marker if marker[0] else last
+        return info.get(self.next_marker_tag) or last
+
+
+OBJECTS = Listing(
+    {'Contents': object_summary, 'CommonPrefixes': prefix_summary},
+    'NextMarker',
+    lambda entry: entry.get('key', entry.get('prefix'))
+)
+PARTS = Listing(
+    {'Part': part_summary},
+    'NextPartNumberMarker',
+    lambda entry: entry['part_num']
+)
+UPLOADS = Listing(
+    {'Upload': upload_summary},
+    ('NextKeyMarker', 'NextUploadIdMarker'),
+    lambda entry: (entry['key'], entry['upload_id']),
+    in_order=True
+)
+
+
+class ListingStream(object):
+    """
+    Incremental decoder of a listing response.
+
+    Iterating over it parses the response body with `iterparse` as it is
+    read from the connection and yields a compact dict for each entry of
+    the listing, the parsed elements being cleared as soon as they have been
+    converted. The text of the other top level elements, such as
+    `IsTruncated` or `NextMarker`, is collected in `info`.
+
+    The connection goes back to the pool once the body has been read to
+    the end. A listing abandoned before is closed with its connection,
+    which can't be reused, when the iteration stops or `close` is called,
+    so that it doesn't hold a connection of the pool.
+    """
+    def __init__(self, status, headers, body, listing):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.listing = listing
+        self.info = {}
+        self.closed = False
+
+    def __iter__(self):
+        completed = False
+        try:
+            for entry in self._parse(self.listing.converters):
+                yield entry
+            completed = True
+        finally:
+            self._release(completed)
+
+    def close(self):
+        """
+        Close the response and its connection before the end of the body.
+        """
+        self._release(False)
+
+    def _release(self, completed):
+        if self.closed:
+            return
+        self.closed = True
+        if not completed:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        release_conn = getattr(self.body, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+
+    def _parse(self, converters):
+        root = None
+        depth = 0
+        try:
+            for event, element in ET.iterparse(self.body,
+                                               events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+                convert = converters.get(element.tag)
+                if convert is not None:
+                    entry = convert(element)
+                    root.clear()
+                    yield entry
+                else:
+                    if not len(element):
+                        self.info[element.tag] = element.text or ''
+                    root.clear()
+        except Exception as e:
+            raise XmlParseError(
+                '\n%s\nstatus: %s\nheaders: %s\n' % (
+                    str(e), self.status, self.headers
+                ),
+                e
+            )
+
+
+def iter_listing(fetch, listing, marker=None,
+                 prefetch_size=LIST_PREFETCH_SIZE):
+    """
+    Yield the entries of all the pages of a listing.
+
+    `fetch(marker)` returns the `ListingStream` of the page following
+    `marker`. The pages are requested and decoded by a background thread
+    which keeps at most `prefetch_size` entries ahead of the consumer, so
+    that the next page is already on its way while the current one is being
+    consumed.
+    """
+    entries = Queue.Queue(prefetch_size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                entries.put(item, True, 0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce(marker):
+        try:
+            while True:
+                stream = fetch(marker)
+                last = None
+                for entry in stream:
+                    last = listing.last_marker(last, entry)
+                    if not put(entry):
+                        # the consumer is gone
+                        stream.close()
+                        return
+                marker = listing.next_marker(stream.info, last)
+                if marker is None:
+                    break
+        except:
+            put((_DONE, sys.exc_info()))
+        else:
+            put((_DONE, None))
+
+    producer = threading.Thread(target=produce, args=(marker, ))
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item = entries.get()
+            if type(item) is tuple and item[0] is _DONE:
+                exc_info = item[1]
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def iter_objects(client, bucket, marker=None, **kwargs):
+    """
+    Yield the summaries of all the objects of a listing, see
+    `Client.iter_objects`.
+    """
+    kwargs = dict((k, v) for k, v in kwargs.iteritems() if v is not None)
+
+    def fetch(marker):
+        if marker is not None:
+            kwargs['marker'] = marker
+        return client.list_objects(bucket, stream=True,
+                                   **kwargs)[RETURN_KEY.RESPONSE]
+    return iter_listing(fetch, OBJECTS, marker)
+
+
+def iter_parts(client, bucket, key, upload_id, part_number_marker=None,
+               **kwargs):
+    """
+    Yield the summaries of all the parts of a multipart upload, see
+    `Client.iter_parts`.
+    """
+    kwargs = dict((k, v) for k, v in kwargs.iteritems() if v is not None)
+
+    def fetch(marker):
+        if marker is not None:
+            kwargs['part_number_marker'] = marker
+        return client.list_parts(bucket, key, upload_id, stream=True,
+                                 **kwargs)[RETURN_KEY.RESPONSE]
+    return iter_listing(fetch, PARTS, part_number_marker)
+
+
+def iter_multipart_uploads(client, bucket, key_marker=None,
+                           upload_id_marker=None, **kwargs):
+    """
+    Yield the summaries of all the in-progress multipart uploads of a bucket,
+    see `Client.iter_multipart_uploads`.
+    """
+    kwargs = dict((k, v) for k, v in kwargs.iteritems() if v is not None)
+
+    def fetch(marker):
+        if marker is not None:
+            kwargs['key_marker'] = marker[0]
+            kwargs.pop('upload_id_marker', None)
+            if marker[1] is not None:
+                kwargs['upload_id_marker'] = marker[1]
+        return client.list_multipart_uploads(bucket, stream=True,
+                                             **kwargs)[RETURN_KEY.RESPONSE]
+    marker = None
+    if key_marker is not None:
+        marker = (key_marker, upload_id_marker)
+    return iter_listing(fetch, UPLOADS, marker)
@@ -1,13 +1,17 @@
 # -*- coding:utf8 -*-
 
-from .utils import (HTTP_METHOD, HTTP_HEADER, RETURN_KEY)
+from .utils import (HTTP_METHOD, HTTP_HEADER, RETURN_KEY, PART_SIZE,
+                    MAX_WORKERS, PART_RETRIES, MAX_DELETE_KEYS,
+                    PRESIGNED_URL_EXPIRES, METADATA_CACHE_TTL,
+                    CONTENT_CACHE_SIZE)
+from .auth import presign_urls
+from . import listing, transfer
 from ..exceptions import (XmlParseError, MultiObjectDeleteException,
-                          InvalidBucketName, InvalidObjectName)
-from ..transport import Transport
-from ..compat import ET
+                          InvalidBucketName, InvalidObjectName,
+                          NotModifiedError, NotFoundError)
+from ..compat import ET, quote
 
-import cgi
-import urllib2
+import time
 
 
 def parse_xml(status, headers, body):
@@ -23,6 +27,12 @@ def parse_xml(status, headers, body):
         )
 
 
+def parse_listing(status, headers, body, listing_type, kwargs):
+    if kwargs.get('stream'):
+        return listing.ListingStream(status, headers, body, listing_type)
+    return parse_xml(status, headers, body)
+
+
 class Client(object):
     """
     The client for accessing the Netease NOS web service.
@@ -73,7 +83,7 @@ class Client(object):
 
     """
     def __init__(self, access_key_id=None, access_key_secret=None,
-                 transport_class=Transport, **kwargs):
+                 transport_class=None, **kwargs):
         """
         If the bucket is public-read, the parameter of `access_key_id` or
         `access_key_secret` can be set to `None`, else the parameter should be
@@ -90,6 +100,16 @@ class Client(object):
             :opt_arg num_pools(integer): Number of connection pools to cache
               before discarding the leastrecently used pool. `16` is set by
               default.
+            :opt_arg maxsize(integer): Number of connections kept by each
+              connection pool, which should match the number of threads
+              using the same bucket. `10` is set by default.
+            :opt_arg block(boolean): Wait for a free connection when `maxsize`
+              connections of a pool are in use, instead of opening a
+              connection which is discarded after the request. `False` is
+              set by default.
+            :opt_arg idle_timeout(float): Close the connections which have
+              been idle for more than this number of seconds instead of
+              reusing them. `None` is set by default.
             :opt_arg timeout(integer): Timeout while connecting to server.
             :opt_arg max_retries(integer): The count of retry when get http 5XX.
               `2` is set by default.
@@ -102,7 +122,48 @@ class Client(object):
                 By default, backoff is disabled (set to 0).
             :opt_arg enable_ssl(boolean): Use https while connecting to server.
               False is set by default, so default use http.
+            :opt_arg retry_policy(RetryPolicy): The `nos.retry.RetryPolicy`
+              deciding the retries of the requests, with jitter, Retry-After
+              hints, a retry budget or a deadline. When it is given,
+              `max_retries`, `retry_backoff_factor` are ignored.
+            :opt_arg hedge_policy(HedgePolicy): The `nos.hedge.HedgePolicy`
+              sending a second copy of the slow `get_object` and
+              `head_object` requests. `None` is set by default, which
+              disables hedging.
+            :opt_arg metrics(Metrics): The `nos.metrics.Metrics` recording
+              the timings and volumes of the requests per operation.
+              `None` is set by default.
+            :opt_arg metadata_cache_size(integer): The number of `head_object`
+              results cached by the client, the least recently used ones being
+              evicted first. `0` is set by default, which disables the cache.
+            :opt_arg metadata_cache_ttl(float): The number of seconds a cached
+              `head_object` result is used without any request. A stale result
+              is revalidated with a conditional request. `60` is set by
+              default.
+            :opt_arg content_cache_dir(string): The directory where the
+              contents returned by `get_object` are cached, which can be
+              shared by several processes. `None` is set by default, which
+              disables the cache.
+            :opt_arg content_cache_size(integer): The maximum number of bytes
+              of the content cache, for the whole directory when it is
+              shared. `1GB` is set by default.
         """
+        cache_size = kwargs.pop('metadata_cache_size', 0)
+        cache_ttl = kwargs.pop('metadata_cache_ttl', METADATA_CACHE_TTL)
+        self.metadata_cache = None
+        if cache_size:
+            from .cache import MetadataCache
+            self.metadata_cache = MetadataCache(cache_size, cache_ttl)
+
+        cache_dir = kwargs.pop('content_cache_dir', None)
+        cache_size = kwargs.pop('content_cache_size', CONTENT_CACHE_SIZE)
+        self.content_cache = None
+        if cache_dir:
+            from .cache import ContentCache
+            self.content_cache = ContentCache(cache_dir, cache_size)
+
+        if transport_class is None:
+            from ..transport import Transport as transport_class
         self.transport = transport_class(
             access_key_id=access_key_id,
             access_key_secret=access_key_secret,
@@ -121,9 +182,12 @@ class Client(object):
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
         """
-        _, headers, _ = self.transport.perform_request(
-            HTTP_METHOD.DELETE, bucket, key
-        )
+        try:
+            _, headers, _ = self.transport.perform_request(
+                HTTP_METHOD.DELETE, bucket, key
+            )
+        finally:
+            self.__invalidate(bucket, key)
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
@@ -144,11 +208,15 @@ class Client(object):
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
         """
+        keys = list(keys)
         body = self.__get_delete_objects_body(keys, quiet)
         params = {'delete': None}
-        status, headers, body = self.transport.perform_request(
-            HTTP_METHOD.POST, bucket, params=params, body=body
-        )
+        try:
+            status, headers, body = self.transport.perform_request(
+                HTTP_METHOD.POST, bucket, params=params, body=body
+            )
+        finally:
+            self.__invalidate(bucket, *keys)
 
         ret_xml = parse_xml(status, headers, body)
         errors = [
@@ -169,6 +237,48 @@ class Client(object):
             RETURN_KEY.RESPONSE: ret_xml
         }
 
+    def delete_many(self, bucket, keys, batch_size=MAX_DELETE_KEYS,
+                    max_workers=MAX_WORKERS, **kwargs):
+        """
+        Delete any number of objects in the specified bucket.
+
+        `keys` is consumed lazily, for instance straight from `iter_objects`,
+        in batches of `batch_size` keys. Each batch is sent as a quiet
+        `delete_objects` request, its body being built only when the batch is
+        dispatched, and up to `max_workers` batches are in flight at a time.
+        A batch failing with a connection error or an HTTP 5XX is sent again
+        on its own. The keys which could not be deleted are reported together
+        once all the batches are done.
+
+            client.delete_many(bucket, (i['key'] for i in
+                                        client.iter_objects(bucket, prefix)))
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg keys(iterable): The names of the Nos objects to delete.
+        :arg batch_size(integer): The number of keys deleted by a request, at
+          most and by default `1000`.
+        :arg max_workers(integer): The number of batches deleted
+          concurrently. `8` is set by default.
+        :arg kwargs: Other optional parameters.
+            :opt_arg batch_retries(integer): The count of retry of a failed
+              batch, each after a random delay growing exponentially from 0.5
+              second and taking a token of the retry budget of the
+              transport. The batchs are sent without the retries of the
+              transport, so a failing batch is sent `batch_retries + 1` times
+              in all. `3` is set by default.
+        :ret return_value(dict): The result of the deletion.
+            :element deleted(integer): The number of deleted objects.
+        :raise MultiObjectDeleteException: If some objects could not be
+          deleted, with the errors of all the batches.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return transfer.delete_many(
+            self, bucket, keys, batch_size=batch_size,
+            max_workers=max_workers,
+            batch_retries=kwargs.get('batch_retries', PART_RETRIES)
+        )
+
     def get_object(self, bucket, key, **kwargs):
         """
         Get the object stored in NOS under the specified bucket and key.
@@ -190,18 +300,51 @@ class Client(object):
               can use functions such as read(), readline().
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
+
+        When the content cache of the client is enabled, a whole object get is
+        sent with an `If-None-Match` header holding the ETag of the cached
+        version. If the object has not changed, the body is the cached file
+        and no content is transferred; otherwise the body is cached as it is
+        read, by `read`, `stream` or iteration, once it has been read up to
+        its end.
         """
         headers = {}
+        cache = self.content_cache
+        cached = None
         if 'range' in kwargs:
             headers[HTTP_HEADER.RANGE] = kwargs['range']
+            cache = None
+        elif cache is not None:
+            cached = cache.get(bucket, key)
+            if cached is not None:
+                headers[HTTP_HEADER.IF_NONE_MATCH] = \
+                        '"%s"' % cached[RETURN_KEY.ETAG]
 
-        _, headers, body = self.transport.perform_request(
-            HTTP_METHOD.GET, bucket, key, headers=headers
-        )
-        return {
-            RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
-                HTTP_HEADER.X_NOS_REQUEST_ID, ''
-            ),
+        try:
+            _, headers, body = self.transport.perform_request(
+                HTTP_METHOD.GET, bucket, key, headers=headers
+            )
+        except NotModifiedError as e:
+            if cached is None:
+                raise
+            from .cache import CachedBody
+            try:
+                body = CachedBody(
+                    cache.open(bucket, key, cached[RETURN_KEY.ETAG])
+                )
+            except IOError:
+                # evicted by another client in the meantime
+                cache.invalidate(bucket, key)
+                return self.get_object(bucket, key, **kwargs)
+            cached[RETURN_KEY.X_NOS_REQUEST_ID] = e.request_id
+            cached[RETURN_KEY.BODY] = body
+            return cached
+        except NotFoundError:
+            if cache is not None:
+                self.__invalidate(bucket, key)
+            raise
+
+        info = {
             RETURN_KEY.CONTENT_LENGTH: int(
                 headers.get(HTTP_HEADER.CONTENT_LENGTH, 0)
             ),
@@ -209,9 +352,19 @@ class Client(object):
                 HTTP_HEADER.CONTENT_RANGE, ''
             ),
             RETURN_KEY.CONTENT_TYPE: headers.get(HTTP_HEADER.CONTENT_TYPE, ''),
-            RETURN_KEY.ETAG: headers.get(HTTP_HEADER.ETAG, '').strip("'\""),
-            RETURN_KEY.BODY: body
+            RETURN_KEY.ETAG: headers.get(HTTP_HEADER.ETAG, '').strip("'\"")
         }
+        if cache is not None:
+            writer = cache.writer(bucket, key, dict(info))
+            if writer is not None:
+                from .cache import CachingBody
+                body = CachingBody(body, writer)
+
+        info[RETURN_KEY.X_NOS_REQUEST_ID] = headers.get(
+            HTTP_HEADER.X_NOS_REQUEST_ID, ''
+        )
+        info[RETURN_KEY.BODY] = body
+        return info
 
     def head_object(self, bucket, key):
         """
@@ -230,11 +383,34 @@ class Client(object):
             :element etag(string): The ETag header of response.
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
+
+        When the metadata cache of the client is enabled, a fresh cached result,
+        including its `x_nos_request_id`, is returned without any request, and
+        a stale one is revalidated with an `If-None-Match` request.
         """
-        _, headers, _ = self.transport.perform_request(
-            HTTP_METHOD.HEAD, bucket, key
-        )
-        return {
+        cache = self.metadata_cache
+        info = None
+        headers = {}
+        if cache is not None:
+            info, fresh = cache.get(bucket, key)
+            if fresh:
+                return info
+            if info is not None and info[RETURN_KEY.ETAG]:
+                headers[HTTP_HEADER.IF_NONE_MATCH] = \
+                        '"%s"' % info[RETURN_KEY.ETAG]
+
+        try:
+            _, headers, _ = self.transport.perform_request(
+                HTTP_METHOD.HEAD, bucket, key, headers=headers
+            )
+        except NotModifiedError:
+            cache.set(bucket, key, info)
+            return info
+        except NotFoundError:
+            self.__invalidate(bucket, key)
+            raise
+
+        info = {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
             ),
@@ -247,6 +423,9 @@ class Client(object):
             RETURN_KEY.CONTENT_TYPE: headers.get(HTTP_HEADER.CONTENT_TYPE, ''),
             RETURN_KEY.ETAG: headers.get(HTTP_HEADER.ETAG, '').strip("'\"")
         }
+        if cache is not None:
+            cache.set(bucket, key, info)
+        return info
 
     def list_objects(self, bucket, **kwargs):
         """
@@ -273,10 +452,16 @@ class Client(object):
               to keys which begin with the specified prefix. You can use
               prefixes to separate a bucket into different sets of keys in a way
               similar to how a file system uses folders.
+            :opt_arg stream(boolean): Decode the response incrementally
+              while it is read from the connection. `False` is set by default.
         :ret return_value(dict): The response of NOS server.
             :element x_nos_request_id(string): ID which can point out the
               request.
-            :element response(ElementTree): The response body of NOS server.
+            :element response(ElementTree|ListingStream): The response body of
+              NOS server. With `stream`, it is a `ListingStream` yielding the
+              dicts of the objects and common prefixes described in
+              `iter_objects`, and collecting the other elements, such as
+              `IsTruncated` or `NextMarker`, in its `info` dict.
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
         """
@@ -297,9 +482,49 @@ class Client(object):
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
             ),
-            RETURN_KEY.RESPONSE: parse_xml(status, headers, body)
+            RETURN_KEY.RESPONSE: parse_listing(
+                status, headers, body, listing.OBJECTS, kwargs
+            )
         }
 
+    def iter_objects(self, bucket, prefix=None, delimiter=None, **kwargs):
+        """
+        Return a generator of summary information about all the objects in
+        the specified bucket, following the `marker` of `list_objects` page
+        after page. The pages are requested and decoded incrementally in the
+        background, so that the first objects are available before the first
+        page has been fully received, and the next page is on its way while
+        the current one is being consumed.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg prefix(string): Optional parameter restricting the listing to
+          keys which begin with the specified prefix.
+        :arg delimiter(string): Optional parameter that causes keys that
+          contain the same string between the prefix and the first occurrence
+          of the delimiter to be rolled up into a single common prefix.
+        :arg kwargs: Other optional parameters.
+            :opt_arg marker(string): Optional parameter indicating where in the
+              bucket to begin listing.
+            :opt_arg limit(integer): Optional parameter indicating the maximum
+              number of keys of each page.
+        :ret return_value(generator): Yield a dict for each object and for
+          each common prefix.
+            :element key(string): The name of the object.
+            :element size(integer): The size of the object.
+            :element etag(string): The ETag of the object.
+            :element last_modified(string): The last modified time of the
+              object.
+            :element storage_class(string): The storage class of the object.
+            :element prefix(string): The common prefix, only in the dicts of
+              common prefixes.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return listing.iter_objects(
+            self, bucket, prefix=prefix, delimiter=delimiter,
+            marker=kwargs.get('marker'), limit=kwargs.get('limit')
+        )
+
     def put_object(self, bucket, key, body, **kwargs):
         """
         Upload the specified object to NOS under the specified bucket and key
@@ -309,10 +534,16 @@ class Client(object):
         :arg key(string): The name of the Nos object.
         :arg body(serializable_object): The content of the Nos object, which can
           be file, dict, list, string or any other serializable object.
+          Bytes-like objects, such as `bytearray`, `memoryview`, `mmap` or
+          NumPy arrays, and `nos.body.FileSegment` parts of files are hashed
+          and sent without being copied.
         :arg kwargs: Other optional parameters.
             :opt_arg meta_data(dict): Represents the object metadata that is
               stored with Nos. This includes custom user-supplied metadata and
               the key should start with 'x-nos-meta-'.
+            :opt_arg content_md5(string): The hex MD5 of the body. When it is
+              given, the body is not read to compute the Content-MD5 header
+              before it is sent.
         :ret return_value(dict): The response of NOS server.
             :element x_nos_request_id(string): ID which can point out the
               request.
@@ -321,12 +552,18 @@ class Client(object):
         :raise ServiceException: If any errors occurred in NOS server point.
         """
         headers = {}
+        if 'content_md5' in kwargs:
+            headers[HTTP_HEADER.CONTENT_MD5] = kwargs['content_md5']
+
         for k, v in kwargs.get('meta_data', {}).iteritems():
             headers[k] = v
 
-        _, headers, body = self.transport.perform_request(
-            HTTP_METHOD.PUT, bucket, key, body=body, headers=headers
-        )
+        try:
+            _, headers, body = self.transport.perform_request(
+                HTTP_METHOD.PUT, bucket, key, body=body, headers=headers
+            )
+        finally:
+            self.__invalidate(bucket, key)
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
@@ -359,12 +596,15 @@ class Client(object):
 
         headers = {}
         headers[HTTP_HEADER.X_NOS_COPY_SOURCE] = '/%s/%s' % (
-            src_bucket, urllib2.quote(src_key.strip('/'), '*')
+            src_bucket, quote(src_key.strip('/'), '*')
         )
 
-        _, headers, _ = self.transport.perform_request(
-            HTTP_METHOD.PUT, dest_bucket, dest_key, headers=headers
-        )
+        try:
+            _, headers, _ = self.transport.perform_request(
+                HTTP_METHOD.PUT, dest_bucket, dest_key, headers=headers
+            )
+        finally:
+            self.__invalidate(dest_bucket, dest_key)
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
@@ -396,12 +636,16 @@ class Client(object):
 
         headers = {}
         headers[HTTP_HEADER.X_NOS_MOVE_SOURCE] = '/%s/%s' % (
-            src_bucket, urllib2.quote(src_key.strip('/'), '*')
+            src_bucket, quote(src_key.strip('/'), '*')
         )
 
-        _, headers, _ = self.transport.perform_request(
-            HTTP_METHOD.PUT, dest_bucket, dest_key, headers=headers
-        )
+        try:
+            _, headers, _ = self.transport.perform_request(
+                HTTP_METHOD.PUT, dest_bucket, dest_key, headers=headers
+            )
+        finally:
+            self.__invalidate(src_bucket, src_key)
+            self.__invalidate(dest_bucket, dest_key)
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
@@ -446,7 +690,7 @@ class Client(object):
             RETURN_KEY.RESPONSE: parse_xml(status, headers, body)
         }
 
-    def upload_part(self, bucket, key, part_num, upload_id, body):
+    def upload_part(self, bucket, key, part_num, upload_id, body, **kwargs):
         """
         Upload a part in a multipart upload. You must initiate a multipart
         upload before you can upload any part.
@@ -460,6 +704,13 @@ class Client(object):
           upload, with which this new part will be associated.
         :arg body(serializable_object): The content of the Nos object, which can
           be file, dict, list, string or any other serializable object.
+          Bytes-like objects, such as `bytearray`, `memoryview`, `mmap` or
+          NumPy arrays, and `nos.body.FileSegment` parts of files are hashed
+          and sent without being copied.
+        :arg kwargs: Other optional parameters.
+            :opt_arg content_md5(string): The hex MD5 of the part. When it is
+              given, the body is not read to compute the Content-MD5 header
+              before it is sent.
         :ret return_value(dict): The response of NOS server.
             :element x_nos_request_id(string): ID which can point out the
               request.
@@ -471,8 +722,13 @@ class Client(object):
             'partNumber': str(part_num),
             'uploadId': upload_id
         }
+        headers = {}
+        if 'content_md5' in kwargs:
+            headers[HTTP_HEADER.CONTENT_MD5] = kwargs['content_md5']
+
         _, headers, body = self.transport.perform_request(
-            HTTP_METHOD.PUT, bucket, key, body=body, params=params
+            HTTP_METHOD.PUT, bucket, key, body=body, params=params,
+            headers=headers
         )
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
@@ -519,10 +775,13 @@ class Client(object):
         body = ('<CompleteMultipartUpload>%s</CompleteMultipartUpload>' %
                 (''.join(parts_xml)))
 
-        status, headers, body = self.transport.perform_request(
-            HTTP_METHOD.POST, bucket, key, body=body,
-            params=params, headers=headers
-        )
+        try:
+            status, headers, body = self.transport.perform_request(
+                HTTP_METHOD.POST, bucket, key, body=body,
+                params=params, headers=headers
+            )
+        finally:
+            self.__invalidate(bucket, key)
         return {
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
@@ -578,10 +837,14 @@ class Client(object):
               returned in the part listing.
             :opt_arg part_number_marker(string): The optional part number marker
               indicating where in the results to being listing parts.
+            :opt_arg stream(boolean): Decode the response incrementally
+              while it is read from the connection. `False` is set by default.
         :ret return_value(dict): The response of NOS server.
             :element x_nos_request_id(string): ID which can point out the
               request.
-            :element response(ElementTree): The response body of NOS server.
+            :element response(ElementTree|ListingStream): The response body of
+              NOS server. With `stream`, it is a `ListingStream` yielding the
+              dicts of the parts described in `iter_parts`.
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
         """
@@ -598,9 +861,40 @@ class Client(object):
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
             ),
-            RETURN_KEY.RESPONSE: parse_xml(status, headers, body)
+            RETURN_KEY.RESPONSE: parse_listing(
+                status, headers, body, listing.PARTS, kwargs
+            )
         }
 
+    def iter_parts(self, bucket, key, upload_id, **kwargs):
+        """
+        Return a generator of all the parts that have been uploaded for a
+        specific multipart upload, following the part number marker of
+        `list_parts` page after page. The pages are requested and decoded in
+        the background while the entries are being consumed.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg key(string): The name of the Nos object.
+        :arg upload_id(string): The ID of an existing, initiated multipart
+          upload.
+        :arg kwargs: Other optional parameters.
+            :opt_arg limit(integer): The maximum number of parts of each page.
+            :opt_arg part_number_marker(string): The optional part number marker
+              indicating where in the results to being listing parts.
+        :ret return_value(generator): Yield a dict for each part.
+            :element part_num(integer): The part number.
+            :element etag(string): The ETag of the part.
+            :element size(integer): The size of the part.
+            :element last_modified(string): The last modified time of the part.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return listing.iter_parts(
+            self, bucket, key, upload_id,
+            part_number_marker=kwargs.get('part_number_marker'),
+            limit=kwargs.get('limit')
+        )
+
     def list_multipart_uploads(self, bucket, **kwargs):
         """
         List in-progress multipart uploads. An in-progress multipart upload is
@@ -618,10 +912,18 @@ class Client(object):
               return.
             :opt_arg key_marker(string): The optional key marker indicating
               where in the results to begin listing.
+            :opt_arg upload_id_marker(string): The optional upload ID marker,
+              used with `key_marker`, indicating the upload of the key marker
+              after which the listing begins. Without it, the listing begins
+              after all the uploads of the key marker.
+            :opt_arg stream(boolean): Decode the response incrementally
+              while it is read from the connection. `False` is set by default.
         :ret return_value(dict): The response of NOS server.
             :element x_nos_request_id(string): ID which can point out the
               request.
-            :element response(ElementTree): The response body of NOS server.
+            :element response(ElementTree|ListingStream): The response body of
+              NOS server. With `stream`, it is a `ListingStream` yielding the
+              dicts of the uploads described in `iter_multipart_uploads`.
         :raise ClientException: If any errors are occured in the client point.
         :raise ServiceException: If any errors occurred in NOS server point.
         """
@@ -630,6 +932,8 @@ class Client(object):
             params['max-uploads'] = str(kwargs['limit'])
         if 'key_marker' in kwargs:
             params['key-marker'] = kwargs['key_marker']
+        if 'upload_id_marker' in kwargs:
+            params['upload-id-marker'] = kwargs['upload_id_marker']
 
         status, headers, body = self.transport.perform_request(
             HTTP_METHOD.GET, bucket, params=params
@@ -638,10 +942,287 @@ class Client(object):
             RETURN_KEY.X_NOS_REQUEST_ID: headers.get(
                 HTTP_HEADER.X_NOS_REQUEST_ID, ''
             ),
-            RETURN_KEY.RESPONSE: parse_xml(status, headers, body)
+            RETURN_KEY.RESPONSE: parse_listing(
+                status, headers, body, listing.UPLOADS, kwargs
+            )
         }
 
+    def iter_multipart_uploads(self, bucket, **kwargs):
+        """
+        Return a generator of all the in-progress multipart uploads of the
+        specified bucket, following the key and upload ID markers of
+        `list_multipart_uploads` page after page, so that the uploads of a key
+        split across two pages are all listed once. The pages are requested
+        and decoded in the background while the entries are being consumed.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg kwargs: Other optional parameters.
+            :opt_arg limit(integer): The maximum number of uploads of each
+              page.
+            :opt_arg key_marker(string): The optional key marker indicating
+              where in the results to begin listing.
+            :opt_arg upload_id_marker(string): The optional upload ID marker
+              of `key_marker`, see `list_multipart_uploads`.
+        :ret return_value(generator): Yield a dict for each upload.
+            :element key(string): The name of the object.
+            :element upload_id(string): The ID of the multipart upload.
+            :element initiated(string): The time the upload was initiated.
+            :element storage_class(string): The storage class of the object.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return listing.iter_multipart_uploads(
+            self, bucket, key_marker=kwargs.get('key_marker'),
+            upload_id_marker=kwargs.get('upload_id_marker'),
+            limit=kwargs.get('limit')
+        )
+
+    def prewarm(self, bucket, connections):
+        """
+        Open connections to the host of the bucket ahead of the first
+        requests, so that they don't pay for the TCP and TLS handshakes. The
+        statistics of the connection pools are available as
+        `client.transport.connection.stats.snapshot()`.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg connections(integer): The number of connections, at most the
+          `maxsize` of the connection pool.
+        :raise ClientException: If any errors are occured in the client point.
+        """
+        self.transport.prewarm(bucket, connections)
+
+    def generate_presigned_url(self, method, bucket, key,
+                               expires=PRESIGNED_URL_EXPIRES):
+        """
+        Generate a query string authenticated url, which gives access to the
+        specified object without any other credential until it expires, for
+        instance to let a browser or a CDN download it.
+
+        :arg method(string): The HTTP method the url is signed for, such as
+          'GET' or 'PUT'.
+        :arg bucket(string): The name of the Nos bucket.
+        :arg key(string): The name of the Nos object.
+        :arg expires(integer): The number of seconds the url stays valid.
+          `3600` is set by default.
+        :ret return_value(string): The url.
+        :raise ClientException: If any errors are occured in the client point.
+        """
+        return self.generate_presigned_urls(method, bucket, [key], expires)[0]
+
+    def generate_presigned_urls(self, method, bucket, keys,
+                                expires=PRESIGNED_URL_EXPIRES):
+        """
+        Generate the query string authenticated urls of many objects of the
+        same bucket at once. The expiration time, the url and string to sign
+        prefixes and the keyed HMAC are computed once for the whole batch.
+
+        :arg method(string): The HTTP method the urls are signed for, such as
+          'GET' or 'PUT'.
+        :arg bucket(string): The name of the Nos bucket.
+        :arg keys(iterable): The names of the Nos objects.
+        :arg expires(integer): The number of seconds the urls stay valid.
+          `3600` is set by default.
+        :ret return_value(list): The urls, in the order of `keys`.
+        :raise ClientException: If any errors are occured in the client point.
+        """
+        bucket = bucket.encode('utf-8') \
+                if isinstance(bucket, unicode) else bucket
+        if not bucket:
+            raise InvalidBucketName()
+        keys = list(keys)
+        if '' in keys or u'' in keys:
+            raise InvalidObjectName()
+
+        return list(presign_urls(
+            self.transport.signer, method, bucket, keys,
+            int(time.time()) + int(expires),
+            end_point=self.transport.end_point,
+            enable_ssl=self.transport.enable_ssl
+        ))
+
+    def upload_file(self, bucket, key, path, part_size=PART_SIZE,
+                    max_workers=MAX_WORKERS, **kwargs):
+        """
+        Upload a local file to NOS under the specified bucket and key name.
+
+        The file is read from disk only once, through a memory map unless
+        `use_mmap` is false. Files no larger than `part_size` are uploaded
+        with a single `put_object`. Larger files are read sequentially and
+        their parts are sent concurrently by a pool of `max_workers` threads
+        through `create_multipart_upload`, `upload_part` and
+        `complete_multipart_upload`, the MD5 of the whole object being
+        computed during the same pass and sent as the `x-nos-Object-md5`
+        header. A part failing with a connection error or an HTTP 5XX is
+        uploaded again on its own; any other error aborts the multipart
+        upload and is raised.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg key(string): The name of the Nos object.
+        :arg path(string): The path of the local file.
+        :arg part_size(integer): The size in bytes of each part, at most
+          100M. It is enlarged automatically when the file would need more
+          than 10,000 parts. `16M` is set by default.
+        :arg max_workers(integer): The number of parts uploaded concurrently.
+          `8` is set by default.
+        :arg kwargs: Other optional parameters.
+            :opt_arg part_retries(integer): The count of retry of a failed
+              part, each after a random delay growing exponentially from 0.5
+              second and taking a token of the retry budget of the
+              transport. The parts are sent without the retries of the
+              transport, so a failing part is sent `part_retries + 1` times
+              in all. `3` is set by default.
+            :opt_arg object_md5(string): The hex MD5 of the whole file. When
+              it is given, it is sent to NOS instead of being computed.
+            :opt_arg checkpoint(string): The path of a local file where the
+              upload ID, the part size, the ETags of the uploaded parts and
+              the size and modification time of the file are saved while a
+              multipart upload runs. When it exists, the upload it records is
+              reconciled with `list_parts` and resumed, only the missing parts
+              being uploaded; it is ignored when the file has changed. On
+              error the multipart upload is kept, instead of being aborted,
+              to be resumed by the next call, and the checkpoint is removed
+              once the upload completes.
+            :opt_arg use_mmap(bool): Whether the parts are hashed and sent
+              from a memory map of the file, without being copied. Reading a
+              map beyond the end of a file truncated meanwhile kills the
+              process with SIGBUS: the size of the file is checked before
+              every part is mapped and sent, and `FileChangedError` raised
+              when it shrank, but a truncation between the check and the
+              read can't be caught. Set it to `False` for files which may be
+              truncated while uploaded, such as rotated logs, so that every
+              part is read into memory instead. `True` is set by default.
+            :opt_arg meta_data(dict): Represents the object metadata that is
+              stored with Nos. This includes custom user-supplied metadata and
+              the key should start with 'x-nos-meta-'.
+        :ret return_value(dict): The response of NOS server.
+            :element x_nos_request_id(string): ID which can point out the
+              request.
+            :element etag(string): The ETag of the uploaded object.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return transfer.upload_file(
+            self, bucket, key, path, part_size=part_size,
+            max_workers=max_workers,
+            part_retries=kwargs.pop('part_retries', PART_RETRIES),
+            **kwargs
+        )
+
+    def put_stream(self, bucket, key, source, part_size=PART_SIZE,
+                   max_workers=MAX_WORKERS, **kwargs):
+        """
+        Upload the content of a source of unknown length, such as a
+        generator, a pipe, the standard input or a socket, to NOS under the
+        specified bucket and key name, without spooling it to disk.
+
+        The source is read part by part. When it ends within the first
+        `part_size` bytes, it is uploaded with a single `put_object`.
+        Otherwise a multipart upload is created and the parts are sent
+        while the next ones are being read, by a pool of `max_workers`
+        threads, so that at most `max_workers + 1` parts are held in memory.
+        The MD5 of the whole object is computed while reading and sent as
+        the `x-nos-Object-md5` header. A part failing with a connection
+        error or an HTTP 5XX is uploaded again on its own; any other error,
+        including an error raised by the source, aborts the multipart
+        upload and is raised.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg key(string): The name of the Nos object.
+        :arg source(file|iterable): An object with a `read(size)` method
+          returning an empty string at its end, or an iterable of strings.
+        :arg part_size(integer): The size in bytes of each part, at most
+          100M. The object can have at most 10,000 parts, that is 160G with
+          the default part size. `16M` is set by default.
+        :arg max_workers(integer): The number of parts uploaded concurrently.
+          `8` is set by default.
+        :arg kwargs: Other optional parameters.
+            :opt_arg part_retries(integer): The count of retry of a failed
+              part, each after a random delay growing exponentially from 0.5
+              second and taking a token of the retry budget of the
+              transport. The parts are sent without the retries of the
+              transport, so a failing part is sent `part_retries + 1` times
+              in all. `3` is set by default.
+            :opt_arg meta_data(dict): Represents the object metadata that is
+              stored with Nos. This includes custom user-supplied metadata and
+              the key should start with 'x-nos-meta-'.
+        :ret return_value(dict): The response of NOS server.
+            :element x_nos_request_id(string): ID which can point out the
+              request.
+            :element etag(string): The ETag of the uploaded object.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return transfer.put_stream(
+            self, bucket, key, source, part_size=part_size,
+            max_workers=max_workers,
+            part_retries=kwargs.pop('part_retries', PART_RETRIES),
+            **kwargs
+        )
+
+    def download_file(self, bucket, key, path, part_size=PART_SIZE,
+                      max_workers=MAX_WORKERS, **kwargs):
+        """
+        Download the object stored in NOS under the specified bucket and key
+        into a local file.
+
+        The object is checked with `head_object` and the local file is
+        allocated to its size first. Objects larger than `part_size` are then
+        fetched as byte ranges by a pool of `max_workers` threads, each range
+        being streamed straight to its offset in the file, so that the object
+        is never held in memory. A range failing with a connection error or
+        an HTTP 5XX is fetched again on its own; any other error removes the
+        local file and is raised.
+
+        :arg bucket(string): The name of the Nos bucket.
+        :arg key(string): The name of the Nos object.
+        :arg path(string): The path of the local file, which will be
+          overwritten.
+        :arg part_size(integer): The size in bytes of each range. `16M` is set
+          by default.
+        :arg max_workers(integer): The number of ranges downloaded
+          concurrently. `8` is set by default.
+        :arg kwargs: Other optional parameters.
+            :opt_arg part_retries(integer): The count of retry of a failed
+              range, each after a random delay growing exponentially from 0.5
+              second and taking a token of the retry budget of the
+              transport. The ranges are sent without the retries of the
+              transport, so a failing range is sent `part_retries + 1` times
+              in all. `3` is set by default.
+            :opt_arg checkpoint(string): The path of a local file where the
+              ETag and size of the object, the part size and the ranges
+              already written are saved while an object larger than
+              `part_size` is downloaded. When it exists and the ETag returned
+              by `head_object` is unchanged, only the missing ranges are
+              fetched into the partial local file; otherwise the download
+              starts over. On error the partial file is kept, instead of
+              being removed, to be resumed by the next call, and the
+              checkpoint is removed once the download completes.
+        :ret return_value(dict): The response of `head_object`.
+            :element x_nos_request_id(string): ID which can point out the
+              request.
+            :element content_length(integer): The size of the object.
+            :element last_modified(string): The Last-Modified header of
+              response.
+            :element content_type(string): The Content-Type header of response.
+            :element etag(string): The ETag header of response.
+        :raise ClientException: If any errors are occured in the client point.
+        :raise ServiceException: If any errors occurred in NOS server point.
+        """
+        return transfer.download_file(
+            self, bucket, key, path, part_size=part_size,
+            max_workers=max_workers,
+            part_retries=kwargs.get('part_retries', PART_RETRIES),
+            checkpoint=kwargs.get('checkpoint')
+        )
+
+    def __invalidate(self, bucket, *keys):
+        for cache in (self.metadata_cache, self.content_cache):
+            if cache is not None:
+                for key in keys:
+                    cache.invalidate(bucket, key)
+
     def __get_delete_objects_body(self, objects, quiet):
+        import cgi
         objs = ['<Object><Key>%s</Key></Object>' % (cgi.escape(i))
                 for i in objects]
         if not objs:
@@ -0,0 +1,730 @@
+# -*- coding:utf8 -*-
+
+import copy
+import functools
+import hashlib
+import itertools
+import logging
+import os
+import sys
+import threading
+import Queue
+
+from .utils import (RETURN_KEY, CHUNK_SIZE, MAX_OBJECT_SIZE, MAX_PART_NUM,
+                    PART_SIZE, MAX_WORKERS, PART_RETRIES, MAX_DELETE_KEYS)
+from ..body import map_file
+from ..compat import memoryview
+from ..retry import RetryPolicy
+from ..exceptions import (ClientException, ConnectionError, ServiceException,
+                          BadRequestError, NotFoundError, FileChangedError,
+                          MultiObjectDeleteException)
+
+logger = logging.getLogger('nos')
+
+_STOP = object()
+
+
+def imap_parallel(func, iterable, max_workers=MAX_WORKERS):
+    """
+    Apply `func` to every item of `iterable` using `max_workers` threads and
+    yield the results in completion order.
+
+    Items are pulled from `iterable` lazily, so no more than `max_workers`
+    of them are in flight at any time. The first exception raised by `func`
+    stops the dispatching, waits for the running calls and is re-raised to
+    the consumer.
+    """
+    max_workers = max(1, int(max_workers))
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while True:
+            item = tasks.get()
+            if item is _STOP:
+                return
+            if stopped.is_set():
+                continue
+            try:
+                results.put((True, func(item)))
+            except:
+                results.put((False, sys.exc_info()))
+
+    threads = []
+    for _ in xrange(max_workers):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    iterator = iter(iterable)
+    pending = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and pending < max_workers:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                tasks.put(item)
+                pending += 1
+
+            if not pending:
+                break
+
+            ok, value = results.get()
+            pending -= 1
+            if not ok:
+                raise value[0], value[1], value[2]
+            yield value
+    finally:
+        stopped.set()
+        for _ in threads:
+            tasks.put(_STOP)
+        for t in threads:
+            t.join()
+
+
+#: Base and maximum delay in seconds before retrying a failed part.
+PART_RETRY_BACKOFF = 0.5
+PART_RETRY_BACKOFF_MAX = 20
+
+#: Every HTTP 5XX of a part is worth another attempt.
+SERVER_ERRORS = tuple(range(500, 600))
+
+
+def get_retry_policy(client, retries):
+    """
+    Return the policy retrying a failed part, range or batch `retries`
+    times. The delays grow exponentially with full jitter, so that the
+    workers of a transfer don't retry in step, and the retries take tokens
+    of the retry budget of the transport, if any, so that they don't add
+    up with the retries of the requests when NOS is degraded. The calls
+    are made with the client of `without_retries`, so a failing part,
+    range or batch is sent `retries + 1` times in all.
+    """
+    transport_policy = getattr(getattr(client, 'transport', None),
+                               'retry_policy', None)
+    return RetryPolicy(
+        max_retries=retries,
+        backoff_factor=PART_RETRY_BACKOFF,
+        backoff_max=PART_RETRY_BACKOFF_MAX,
+        jitter='full',
+        retry_on_status=SERVER_ERRORS,
+        retry_on_timeout=True,
+        budget=getattr(transport_policy, 'budget', None)
+    )
+
+
+def without_retries(client):
+    """
+    Return a copy of `client` whose transport doesn't retry the requests,
+    sharing its connections, hooks and metrics. The parts, ranges and
+    batches are sent with it, so that their retries under the policy of
+    `get_retry_policy` don't multiply with the retries of the transport.
+    """
+    transport = getattr(client, 'transport', None)
+    if getattr(transport, 'retry_policy', None) is None:
+        return client
+    # the deadline of the requests still applies, the budget is left to
+    # the policy of `get_retry_policy`
+    deadline = transport.retry_policy.deadline
+    transport = copy.copy(transport)
+    transport.retry_policy = RetryPolicy(max_retries=0, deadline=deadline)
+    client = copy.copy(client)
+    client.transport = transport
+    return client
+
+
+def call_with_retries(policy, func, description):
+    """
+    Call `func` and return its result, calling it again on a connection
+    error or an HTTP 5XX as long as `policy` allows it.
+    """
+    state = policy.start()
+    while True:
+        try:
+            result = func()
+        except (ConnectionError, ServiceException) as e:
+            delay = state.next_delay(e)
+            if delay is None:
+                raise
+            logger.warning('retry %s in %.2fs: %s', description, delay, e)
+            policy.sleep(delay)
+        else:
+            state.succeeded()
+            return result
+
+
+def get_part_size(size, part_size):
+    """
+    Return the part size to use for an object of `size` bytes, enlarged when
+    `part_size` would need more than `MAX_PART_NUM` parts.
+    """
+    if part_size <= 0:
+        raise ValueError('part_size must be positive: %r' % part_size)
+    part_size = max(part_size, (size + MAX_PART_NUM - 1) // MAX_PART_NUM)
+    if part_size > MAX_OBJECT_SIZE:
+        raise BadRequestError(
+            400,
+            'Bad Request',
+            'EntityTooLarge',
+            '',
+            'Request Entity Too Large'
+        )
+    return part_size
+
+
+def iter_parts(fp, part_size, md5=None, use_mmap=True):
+    """
+    Yield `(part_num, data)` tuples covering the file `fp`, and feed every
+    part to the `md5` object when it is given. With `use_mmap`, each part is
+    a buffer of a memory map of the file which is hashed and sent without
+    being copied; otherwise it is read into a string.
+    """
+    size = os.fstat(fp.fileno()).st_size
+    for part_num, offset in enumerate(xrange(0, size, part_size), 1):
+        length = min(part_size, size - offset)
+        if use_mmap:
+            check_file_size(fp, offset + length)
+            data = map_file(fp, offset, length)
+        else:
+            # unbuffered, so that a truncation is seen
+            os.lseek(fp.fileno(), offset, os.SEEK_SET)
+            data = os.read(fp.fileno(), length)
+            if len(data) < length:
+                raise file_changed(fp, offset + length)
+        if md5 is not None:
+            md5.update(data)
+        yield part_num, data
+
+
+def file_changed(fp, size):
+    return FileChangedError(
+        'file truncated while uploaded',
+        '%s is shorter than %d bytes' % (getattr(fp, 'name', fp), size)
+    )
+
+
+def check_file_size(fp, size):
+    """
+    Raise `FileChangedError` if the file `fp` is now shorter than `size`.
+
+    Reading a memory map beyond the end of a truncated file kills the
+    process with SIGBUS, so the size is checked before a mapped part is
+    read. The file can still be truncated between the check and the read:
+    use `use_mmap=False` for files which may be truncated while uploaded.
+    """
+    if os.fstat(fp.fileno()).st_size < size:
+        raise file_changed(fp, size)
+
+
+def part_checker(fp, part_size):
+    """
+    Return a function checking, before the part `part_num` of the file `fp`
+    is sent, that the file still holds it.
+    """
+    size = os.fstat(fp.fileno()).st_size
+
+    def check(part_num):
+        check_file_size(fp, min(part_num * part_size, size))
+    return check
+
+
+def upload_part(client, bucket, key, upload_id, part, retry_policy,
+                check=None):
+    """
+    Upload one `(part_num, data)` part, retrying it on transient errors
+    under `retry_policy`, and return the part info used by
+    `complete_multipart_upload`. `check(part_num)` is called before every
+    attempt when it is given.
+    """
+    part_num, data = part
+
+    def send():
+        if check is not None:
+            check(part_num)
+        return client.upload_part(bucket, key, part_num, upload_id, data)
+    resp = call_with_retries(retry_policy, send,
+                             'part %s of %s/%s' % (part_num, bucket, key))
+    return {'part_num': part_num, 'etag': resp[RETURN_KEY.ETAG]}
+
+
+def abort_quietly(client, bucket, key, upload_id):
+    try:
+        client.abort_multipart_upload(bucket, key, upload_id)
+    except Exception as e:
+        logger.warning('failed to abort multipart upload %s of %s/%s: %s',
+                       upload_id, bucket, key, e)
+
+
+def upload_file(client, bucket, key, path, part_size=PART_SIZE,
+                max_workers=MAX_WORKERS, part_retries=PART_RETRIES,
+                checkpoint=None, **kwargs):
+    """
+    Upload the local file `path`, see `Client.upload_file`.
+    """
+    object_md5 = kwargs.pop('object_md5', None)
+    use_mmap = kwargs.pop('use_mmap', True)
+    size = os.path.getsize(path)
+    part_size = get_part_size(size, part_size)
+
+    # map the small file, which is hashed for Content-MD5 and sent without
+    # being copied
+    if size <= part_size:
+        if use_mmap:
+            data = map_file(path)
+        else:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        if object_md5 is not None:
+            kwargs['content_md5'] = object_md5
+        return client.put_object(bucket, key, data, **kwargs)
+
+    if checkpoint is not None:
+        return resume_upload(client, bucket, key, path, part_size,
+                             max_workers, part_retries, checkpoint,
+                             object_md5=object_md5, use_mmap=use_mmap,
+                             **kwargs)
+
+    md5 = hashlib.md5() if object_md5 is None else None
+    with open(path, 'rb') as fp:
+        return upload_parts(client, bucket, key,
+                            iter_parts(fp, part_size, md5, use_mmap), md5,
+                            max_workers, part_retries, object_md5=object_md5,
+                            check=part_checker(fp, part_size)
+                            if use_mmap else None, **kwargs)
+
+
+def upload_parts(client, bucket, key, parts, md5, max_workers, part_retries,
+                 object_md5=None, check=None, **kwargs):
+    """
+    Upload the `(part_num, data)` tuples of `parts` as a multipart upload,
+    at most `max_workers` of them being in flight, and complete it with
+    `object_md5` or the digest of `md5` once all the parts have been read.
+    `check` is passed to `upload_part`. The multipart upload is aborted on
+    any error.
+    """
+    retry_policy = get_retry_policy(client, part_retries)
+    part_client = without_retries(client)
+    resp = client.create_multipart_upload(bucket, key, **kwargs)
+    upload_id = resp[RETURN_KEY.RESPONSE].findtext('UploadId')
+    try:
+        info = list(imap_parallel(
+            lambda part: upload_part(part_client, bucket, key, upload_id,
+                                     part, retry_policy, check),
+            parts,
+            max_workers
+        ))
+        info.sort(key=lambda i: i['part_num'])
+        resp = client.complete_multipart_upload(
+            bucket, key, upload_id, info,
+            object_md5=object_md5 or md5.hexdigest()
+        )
+    except:
+        exc_info = sys.exc_info()
+        abort_quietly(client, bucket, key, upload_id)
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    return {
+        RETURN_KEY.X_NOS_REQUEST_ID: resp[RETURN_KEY.X_NOS_REQUEST_ID],
+        RETURN_KEY.ETAG: (resp[RETURN_KEY.RESPONSE].findtext('ETag') or
+                          '').strip("'\"")
+    }
+
+
+def load_upload_checkpoint(client, bucket, key, path, checkpoint_path):
+    """
+    Return the checkpoint saved in `checkpoint_path` for the upload of the
+    local file `path`, its parts being reconciled with the parts listed by
+    NOS, or `None` when there is no upload to resume. The multipart upload
+    of a checkpoint left by another file, or by an older version of the
+    file, is aborted.
+    """
+    from .checkpoint import Checkpoint, file_fingerprint
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if checkpoint is None or not checkpoint.state.get('upload_id'):
+        return None
+    state = checkpoint.state
+    if not checkpoint.matches(bucket=bucket, key=key,
+                              fingerprint=file_fingerprint(path)):
+        abort_quietly(client, state.get('bucket'), state.get('key'),
+                      state['upload_id'])
+        return None
+
+    try:
+        uploaded = dict((part['part_num'], part['etag']) for part in
+                        client.iter_parts(bucket, key, state['upload_id']))
+    except NotFoundError:
+        # the upload has been completed, aborted or expired meanwhile
+        return None
+    # a part is kept only when NOS holds the same content
+    checkpoint.set_parts(dict(
+        (part_num, etag) for part_num, etag in checkpoint.parts.iteritems()
+        if uploaded.get(part_num) == etag
+    ))
+    return checkpoint
+
+
+def resume_upload(client, bucket, key, path, part_size, max_workers,
+                  part_retries, checkpoint_path, object_md5=None,
+                  use_mmap=True, **kwargs):
+    """
+    Upload the local file `path` as a multipart upload whose progress is
+    saved in the file `checkpoint_path`, resuming the upload recorded there
+    if any: only the parts missing on NOS are uploaded. On error, the
+    multipart upload and the checkpoint are kept to be resumed by the next
+    call; the checkpoint is removed once the upload is completed.
+    """
+    from .checkpoint import Checkpoint, file_fingerprint, to_unicode
+
+    checkpoint = load_upload_checkpoint(client, bucket, key, path,
+                                        checkpoint_path)
+    if checkpoint is not None:
+        part_size = checkpoint.state['part_size']
+    else:
+        fingerprint = file_fingerprint(path)
+        resp = client.create_multipart_upload(bucket, key, **kwargs)
+        checkpoint = Checkpoint(checkpoint_path, {
+            'bucket': to_unicode(bucket),
+            'key': to_unicode(key),
+            'fingerprint': fingerprint,
+            'part_size': part_size,
+            'upload_id': resp[RETURN_KEY.RESPONSE].findtext('UploadId'),
+        })
+        checkpoint.save()
+    upload_id = checkpoint.state['upload_id']
+    done = checkpoint.parts
+    retry_policy = get_retry_policy(client, part_retries)
+    part_client = without_retries(client)
+    check = None
+
+    def send(part):
+        part_num = part[0]
+        if part_num in done:
+            return {'part_num': part_num, 'etag': done[part_num]}
+        info = upload_part(part_client, bucket, key, upload_id, part,
+                           retry_policy, check)
+        checkpoint.add_part(part_num, info['etag'])
+        return info
+
+    # the parts already uploaded are still read, to compute the object MD5
+    md5 = hashlib.md5() if object_md5 is None else None
+    with open(path, 'rb') as fp:
+        if use_mmap:
+            check = part_checker(fp, part_size)
+        info = list(imap_parallel(send,
+                                  iter_parts(fp, part_size, md5, use_mmap),
+                                  max_workers))
+    info.sort(key=lambda i: i['part_num'])
+    resp = client.complete_multipart_upload(
+        bucket, key, upload_id, info,
+        object_md5=object_md5 or md5.hexdigest()
+    )
+    checkpoint.remove()
+
+    return {
+        RETURN_KEY.X_NOS_REQUEST_ID: resp[RETURN_KEY.X_NOS_REQUEST_ID],
+        RETURN_KEY.ETAG: (resp[RETURN_KEY.RESPONSE].findtext('ETag') or
+                          '').strip("'\"")
+    }
+
+
+def iter_stream_parts(source, part_size, md5=None):
+    """
+    Cut `source`, a readable object or an iterable of strings, into parts of
+    `part_size` bytes, the last one being shorter, and yield
+    `(part_num, data)` tuples, feeding every part to the `md5` object when
+    it is given. An empty source yields one empty part.
+    """
+    if hasattr(source, 'read'):
+        chunks = iter(functools.partial(source.read, part_size), '')
+    else:
+        chunks = iter(source)
+
+    def part(part_num, data):
+        if part_num > MAX_PART_NUM:
+            raise BadRequestError(
+                400,
+                'Bad Request',
+                'EntityTooLarge',
+                '',
+                'Request Entity Too Large'
+            )
+        if md5 is not None:
+            md5.update(data)
+        return part_num, data
+
+    part_num = 1
+    pending = []
+    length = 0
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+        elif memoryview is not None and isinstance(chunk, memoryview):
+            chunk = chunk.tobytes()
+        elif not isinstance(chunk, str):
+            chunk = str(chunk)
+        # the parts are cut at an offset walking through the chunk, only
+        # the tail carried into the next part being copied
+        offset = 0
+        if pending:
+            if length + len(chunk) < part_size:
+                pending.append(chunk)
+                length += len(chunk)
+                continue
+            offset = part_size - length
+            pending.append(chunk[:offset])
+            yield part(part_num, ''.join(pending))
+            part_num += 1
+            pending = []
+            length = 0
+        while len(chunk) - offset >= part_size:
+            # a chunk of exactly one part is used as is, without any copy
+            if offset == 0 and len(chunk) == part_size:
+                data = chunk
+            else:
+                data = chunk[offset:offset + part_size]
+            yield part(part_num, data)
+            part_num += 1
+            offset += part_size
+        if offset < len(chunk):
+            pending.append(chunk[offset:] if offset else chunk)
+            length = len(pending[0])
+
+    if length or part_num == 1:
+        yield part(part_num, ''.join(pending))
+
+
+def put_stream(client, bucket, key, source, part_size=PART_SIZE,
+               max_workers=MAX_WORKERS, part_retries=PART_RETRIES, **kwargs):
+    """
+    Upload a source of unknown length, see `Client.put_stream`.
+    """
+    part_size = get_part_size(0, part_size)
+    md5 = hashlib.md5()
+    parts = iter_stream_parts(source, part_size, md5)
+    first = next(parts)
+    second = next(parts, None)
+    if second is None:
+        kwargs['content_md5'] = md5.hexdigest()
+        return client.put_object(bucket, key, first[1], **kwargs)
+
+    return upload_parts(client, bucket, key,
+                        itertools.chain((first, second), parts), md5,
+                        max_workers, part_retries, **kwargs)
+
+
+def iter_ranges(size, part_size):
+    """
+    Yield the inclusive `(start, end)` byte ranges covering `size` bytes.
+    """
+    for start in xrange(0, size, part_size):
+        yield start, min(start + part_size, size) - 1
+
+
+def copy_body(body, fp):
+    """
+    Copy a response body into `fp` chunk by chunk and return the number of
+    bytes written.
+    """
+    written = 0
+    while True:
+        try:
+            data = body.read(CHUNK_SIZE)
+        except Exception as e:
+            raise ConnectionError(str(e), e)
+        if not data:
+            break
+        fp.write(data)
+        written += len(data)
+
+    release_conn = getattr(body, 'release_conn', None)
+    if release_conn is not None:
+        release_conn()
+    return written
+
+
+def download_range(client, bucket, key, path, etag, part, retry_policy):
+    """
+    Fetch the `(start, end)` range of the object and write it at the same
+    offset of the preallocated file `path`, retrying it on transient errors
+    under `retry_policy`.
+    """
+    start, end = part
+
+    def fetch():
+        resp = client.get_object(bucket, key,
+                                 range='bytes=%d-%d' % (start, end))
+        if etag and resp[RETURN_KEY.ETAG] not in ('', etag):
+            raise ClientException(
+                'object %s/%s changed while downloading' % (bucket, key),
+                resp[RETURN_KEY.ETAG]
+            )
+        with open(path, 'r+b') as fp:
+            fp.seek(start)
+            written = copy_body(resp[RETURN_KEY.BODY], fp)
+        if written != end - start + 1:
+            raise ConnectionError(
+                'incomplete range %d-%d of %s/%s' % (start, end,
+                                                     bucket, key),
+                written
+            )
+
+    call_with_retries(retry_policy, fetch, 'range %d-%d of %s/%s' % (
+        start, end, bucket, key
+    ))
+    return part
+
+
+def download_file(client, bucket, key, path, part_size=PART_SIZE,
+                  max_workers=MAX_WORKERS, part_retries=PART_RETRIES,
+                  checkpoint=None):
+    """
+    Download the object into the local file `path`, see
+    `Client.download_file`.
+    """
+    if part_size <= 0:
+        raise ValueError('part_size must be positive: %r' % part_size)
+
+    info = client.head_object(bucket, key)
+    size = info[RETURN_KEY.CONTENT_LENGTH]
+    etag = info[RETURN_KEY.ETAG]
+    if checkpoint is not None and size > part_size:
+        resume_download(client, bucket, key, path, size, etag, part_size,
+                        max_workers, part_retries, checkpoint)
+        return info
+
+    try:
+        if size <= part_size:
+            resp = client.get_object(bucket, key)
+            with open(path, 'wb') as fp:
+                copy_body(resp[RETURN_KEY.BODY], fp)
+        else:
+            with open(path, 'wb') as fp:
+                fp.truncate(size)
+            retry_policy = get_retry_policy(client, part_retries)
+            part_client = without_retries(client)
+            for _ in imap_parallel(
+                lambda part: download_range(part_client, bucket, key, path,
+                                            etag, part, retry_policy),
+                iter_ranges(size, part_size),
+                max_workers
+            ):
+                pass
+    except:
+        exc_info = sys.exc_info()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    return info
+
+
+def resume_download(client, bucket, key, path, size, etag, part_size,
+                    max_workers, part_retries, checkpoint_path):
+    """
+    Download the `size` bytes of the object as ranges, recording the ranges
+    written into the local file `path` in the file `checkpoint_path`, and
+    fetch only the missing ones when the checkpoint was left by a download
+    of the same version of the object. On error, the partial file and the
+    checkpoint are kept to be resumed by the next call; the checkpoint is
+    removed once the download is completed.
+    """
+    from .checkpoint import Checkpoint, to_unicode
+
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if (checkpoint is not None and
+            checkpoint.matches(bucket=bucket, key=key, etag=etag,
+                               size=size) and
+            os.path.isfile(path) and os.path.getsize(path) == size):
+        part_size = checkpoint.state['part_size']
+    else:
+        # the object changed, or the partial file is gone: start over
+        checkpoint = Checkpoint(checkpoint_path, {
+            'bucket': to_unicode(bucket),
+            'key': to_unicode(key),
+            'etag': to_unicode(etag),
+            'size': size,
+            'part_size': part_size,
+        })
+        with open(path, 'wb') as fp:
+            fp.truncate(size)
+        checkpoint.save()
+    done = checkpoint.parts
+    retry_policy = get_retry_policy(client, part_retries)
+    part_client = without_retries(client)
+
+    def fetch(part):
+        part_num, (start, end) = part
+        download_range(part_client, bucket, key, path, etag,
+                       (start, end), retry_policy)
+        checkpoint.add_part(part_num, [start, end])
+
+    ranges = [part for part in enumerate(iter_ranges(size, part_size), 1)
+              if done.get(part[0]) != list(part[1])]
+    for _ in imap_parallel(fetch, ranges, max_workers):
+        pass
+    checkpoint.remove()
+
+
+def iter_batches(iterable, batch_size):
+    """
+    Consume `iterable` lazily and yield lists of at most `batch_size` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def delete_batch(client, bucket, keys, retry_policy):
+    """
+    Delete one batch of keys in quiet mode, retrying it on transient errors
+    under `retry_policy`, and return `(deleted_count, errors)`.
+    """
+    def delete():
+        try:
+            client.delete_objects(bucket, keys, quiet=True)
+        except MultiObjectDeleteException as e:
+            return len(keys) - len(e.errors), e.errors
+        return len(keys), []
+
+    return call_with_retries(retry_policy, delete, '%d deletions of %s' % (
+        len(keys), bucket
+    ))
+
+
+def delete_many(client, bucket, keys, batch_size=MAX_DELETE_KEYS,
+                max_workers=MAX_WORKERS, batch_retries=PART_RETRIES):
+    """
+    Delete every key of the iterable `keys`, see `Client.delete_many`.
+    """
+    if not 0 < batch_size <= MAX_DELETE_KEYS:
+        raise ValueError('batch_size must be between 1 and %d: %r' % (
+            MAX_DELETE_KEYS, batch_size
+        ))
+
+    deleted = 0
+    errors = []
+    retry_policy = get_retry_policy(client, batch_retries)
+    batch_client = without_retries(client)
+    for count, batch_errors in imap_parallel(
+        lambda batch: delete_batch(batch_client, bucket, batch, retry_policy),
+        iter_batches(keys, batch_size),
+        max_workers
+    ):
+        deleted += count
+        errors.extend(batch_errors)
+
+    if errors:
+        raise MultiObjectDeleteException(errors)
+    return {'deleted': deleted}
@@ -1,6 +1,6 @@
 # -*- coding:utf8 -*-
 
-import platform
+from ..compat import LazyString
 
 
 def enum(**enums):
@@ -25,6 +25,7 @@ HTTP_HEADER = enum(
     ETAG='ETag',
     DATE='Date',
     EXPIRES='Expires',
+    IF_NONE_MATCH='If-None-Match',
     USER_AGENT='User-Agent',
     X_NOS_REQUEST_ID='x-nos-request-id',
     X_NOS_COPY_SOURCE='x-nos-copy-source',
@@ -61,7 +62,55 @@ SUB_RESOURCE = set([
 VERSION = '1.0.3'
 CHUNK_SIZE = 65536
 MAX_OBJECT_SIZE = 100 * 1024 * 1024
+MAX_PART_NUM = 10000
+PART_SIZE = 16 * 1024 * 1024
+MAX_WORKERS = 8
+PART_RETRIES = 3
+LIST_PREFETCH_SIZE = 1000
+MAX_DELETE_KEYS = 1000
+PRESIGNED_URL_EXPIRES = 3600
+METADATA_CACHE_TTL = 60
+CONTENT_CACHE_SIZE = 1024 * 1024 * 1024
 TIME_CST_FORMAT = '%a, %d %b %Y %H:%M:%S Asia/Shanghai'
 METADATA_PREFIX = 'x-nos-meta-'
 NOS_HEADER_PREFIX = 'x-nos-'
-USER_AGENT = 'nos-python-sdk/%s python%s %s' % (VERSION, platform.python_version(), ' '.join(platform.uname()))
+_user_agent = None
+
+
+def get_user_agent():
+    """
+    Return the User-Agent header, built on first use because
+    `platform.uname()` may run the `uname` command.
+    """
+    global _user_agent
+    if _user_agent is None:
+        import platform
+        _user_agent = 'nos-python-sdk/%s python%s %s' % (
+            VERSION, platform.python_version(), ' '.join(platform.uname())
+        )
+    return _user_agent
+
+
+def to_str(value):
+    """ Return `value` as a UTF-8 string when it is unicode. """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def parse_last_modified(value):
+    """
+    Return the timestamp of the `LastModified` date of an object listing,
+    such as `2016-05-23T08:07:15.000Z`, or `None` if it can't be parsed.
+    """
+    import calendar
+    import time
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+#: The User-Agent header, kept for compatibility: a stand-in of the string
+#: which is only built on first use, `get_user_agent()` returns the string.
+USER_AGENT = LazyString(get_user_agent)
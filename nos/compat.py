@@ -4,17 +4,118 @@ import sys
 
 PY2 = sys.version_info[0] == 2
 
+
+def import_module(name):
+    """ `importlib.import_module`, which python 2.6 doesn't have. """
+    __import__(name)
+    return sys.modules[name]
+
+
+class LazyModule(object):
+    """
+    Stand-in of a module imported on the first access to one of its
+    attributes, from the first of `names` which can be imported, so that
+    `import nos` doesn't pay for the modules needed by the requests only.
+    """
+    def __init__(self, *names):
+        self._names = names
+        self._module = None
+
+    def __getattr__(self, name):
+        module = self._module
+        if module is None:
+            for module_name in self._names[:-1]:
+                try:
+                    module = import_module(module_name)
+                    break
+                except ImportError:
+                    pass
+            else:
+                module = import_module(self._names[-1])
+            self._module = module
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+
+class LazyString(object):
+    """
+    Stand-in of the string returned by `func()`, which is only called on
+    the first use of the string.
+    """
+    def __init__(self, func):
+        self._func = func
+        self._value = None
+
+    def _get(self):
+        if self._value is None:
+            self._value = self._func()
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __str__(self):
+        return self._get()
+
+    def __repr__(self):
+        return repr(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __hash__(self):
+        return hash(self._get())
+
+    def __eq__(self, other):
+        return self._get() == other
+
+    def __ne__(self, other):
+        return self._get() != other
+
+    def __contains__(self, item):
+        return item in self._get()
+
+    def __add__(self, other):
+        return self._get() + other
+
+    def __radd__(self, other):
+        return other + self._get()
+
+    def __mod__(self, args):
+        return self._get() % args
+
+
 if PY2:
     string_types = basestring,
-    from urllib import quote_plus, urlencode
-    from urlparse import  urlparse
     from itertools import imap as map
+    _urllib = LazyModule('urllib')
+    _urlparse = LazyModule('urlparse')
 else:
     string_types = str, bytes
-    from urllib.parse import quote_plus, urlencode, urlparse
     map = map
+    _urllib = _urlparse = LazyModule('urllib.parse')
 
 try:
-    import xml.etree.cElementTree as ET
-except ImportError:
-    import xml.etree.ElementTree as ET
+    memoryview = memoryview
+except NameError:
+    # python 2.6
+    memoryview = None
+
+ET = LazyModule('xml.etree.cElementTree', 'xml.etree.ElementTree')
+
+
+def quote(s, safe='/'):
+    return _urllib.quote(s, safe)
+
+
+def quote_plus(s, safe=''):
+    return _urllib.quote_plus(s, safe)
+
+
+def urlencode(query, doseq=0):
+    return _urllib.urlencode(query, doseq)
+
+
+def urlparse(url, scheme='', allow_fragments=True):
+    return _urlparse.urlparse(url, scheme, allow_fragments)
@@ -1,23 +1,166 @@
 # -*- coding:utf8 -*-
 
-import certifi
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
 import urllib3
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from urllib3.exceptions import ReadTimeoutError
 from .exceptions import (ConnectionError, ConnectionTimeout,
                          ServiceException, HTTP_EXCEPTIONS)
 from .compat import ET
+from .metrics import record_connection_wait
+
+__all__ = ["Urllib3HttpConnection", "PoolStats"]
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds of a Retry-After header, given either as
+    seconds or as a HTTP date, or `None`.
+    """
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, mktime_tz(date) - time.time())
+
+
+class PoolStats(object):
+    """
+    Live counters of the connection pools of an `Urllib3HttpConnection`.
+
+    `created` counts the new connections, `reused` the connections taken
+    back from a pool, `discarded` the connections closed because the pool
+    was full, the server dropped them or they were idle for too long, and
+    `wait_time` the seconds spent getting a connection from a pool, which
+    grows when `block` is set and every connection is busy.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.wait_time = 0.0
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.iteritems():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        """ Return the counters as a dict. """
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'wait_time': self.wait_time
+            }
+
 
-__all__ = ["Urllib3HttpConnection"]
+class StatsPoolMixin(object):
+    """
+    Connection pool updating a `PoolStats` and closing the connections which
+    have been idle for more than `idle_timeout` seconds.
+    """
+    stats = None
+    idle_timeout = None
+
+    def _new_conn(self):
+        self.stats.add(created=1)
+        return super(StatsPoolMixin, self)._new_conn()
+
+    def _get_conn(self, timeout=None):
+        start = time.time()
+        conn = super(StatsPoolMixin, self)._get_conn(timeout)
+        wait_time = time.time() - start
+        self.stats.add(wait_time=wait_time)
+        record_connection_wait(wait_time)
+
+        idle_since = getattr(conn, '_nos_idle_since', None)
+        if idle_since is None:
+            return conn
+        conn._nos_idle_since = None
+        if conn.sock is None or (
+                self.idle_timeout is not None and
+                time.time() - idle_since > self.idle_timeout):
+            conn.close()
+            self.stats.add(discarded=1)
+            return self._new_conn()
+        self.stats.add(reused=1)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn._nos_idle_since = time.time()
+            if self.pool is not None and self.pool.full():
+                self.stats.add(discarded=1)
+        super(StatsPoolMixin, self)._put_conn(conn)
 
 
 class Urllib3HttpConnection(object):
-    def __init__(self, num_pools=16, enable_ssl=False, **kwargs):
+    def __init__(self, num_pools=16, enable_ssl=False, maxsize=None,
+                 block=None, idle_timeout=None, **kwargs):
+        """
+        :arg num_pools(integer): Number of connection pools, one per bucket
+          host, to cache before discarding the least recently used pool.
+          `16` is set by default.
+        :arg enable_ssl(boolean): Use https while connecting to server.
+        :arg maxsize(integer): Number of connections kept by each pool, which
+          should be the number of threads sending requests to the same
+          bucket. `10` is set by default.
+        :arg block(boolean): Whether a request waits for a free connection
+          when `maxsize` connections are in use, instead of opening one more
+          connection which will be discarded once it is released. `False` is
+          set by default.
+        :arg idle_timeout(float): Number of seconds after which an idle
+          connection is closed instead of being reused. `None` is set by
+          default, which keeps them until the server closes them.
+        """
+        pool_kw = {'num_pools': num_pools}
+        if maxsize is not None:
+            pool_kw['maxsize'] = maxsize
+        if block is not None:
+            pool_kw['block'] = block
         if enable_ssl:
-            self.pool = urllib3.PoolManager(num_pools=num_pools,
-                                            cert_reqs='CERT_REQUIRED',
-                                            ca_certs=certifi.where())
-        else:
-            self.pool = urllib3.PoolManager(num_pools=num_pools)
+            import certifi
+            pool_kw['cert_reqs'] = 'CERT_REQUIRED'
+            pool_kw['ca_certs'] = certifi.where()
+        self.pool = urllib3.PoolManager(**pool_kw)
+
+        self.stats = PoolStats()
+        attrs = {'stats': self.stats, 'idle_timeout': idle_timeout}
+        self.pool.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool',
+                         (StatsPoolMixin, HTTPConnectionPool), attrs),
+            'https': type('HTTPSConnectionPool',
+                          (StatsPoolMixin, HTTPSConnectionPool), attrs)
+        }
+
+    def prewarm(self, url, connections):
+        """
+        Open up to `connections` connections to the host of `url`, at most
+        the `maxsize` of its pool, and keep them in the pool.
+        """
+        try:
+            pool = self.pool.connection_from_url(url)
+            conns = []
+            try:
+                for _ in xrange(min(connections, pool.pool.maxsize)):
+                    conn = pool._get_conn()
+                    conns.append(conn)
+                    conn.connect()
+            finally:
+                for conn in conns:
+                    pool._put_conn(conn)
+        except Exception as e:
+            raise ConnectionError(str(e), e)
 
     def perform_request(self, method, url, body=None, headers={}, timeout=None,
                         preload_content=False):
@@ -61,6 +204,8 @@ class Urllib3HttpConnection(object):
             # we don't care what went wrong
             pass
 
-        raise HTTP_EXCEPTIONS.get(status_code, ServiceException)(
+        e = HTTP_EXCEPTIONS.get(status_code, ServiceException)(
             status_code, error_type, error_code, request_id, message
         )
+        e.retry_after = parse_retry_after(response.getheader('Retry-After'))
+        raise e
@@ -0,0 +1,680 @@
+# -*- coding:utf8 -*-
+
+import base64
+import hashlib
+import hmac
+import httplib
+import json
+import os
+import re
+import threading
+import time
+import urllib2
+import urlparse
+import uuid
+from StringIO import StringIO
+
+import urllib3
+from .connection import Urllib3HttpConnection
+from .compat import ET, memoryview
+from .client.utils import SUB_RESOURCE, NOS_HEADER_PREFIX, METADATA_PREFIX
+
+__all__ = ["Emulator", "EmulatorConnection"]
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def http_date(t):
+    return time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(t))
+
+
+def iso_date(t):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(t))
+
+
+def read_body(body):
+    """ Return the content of a request body as a string. """
+    if body is None:
+        return ''
+    if hasattr(body, 'read'):
+        return body.read()
+    if isinstance(body, unicode):
+        return body.encode('utf-8')
+    if memoryview is not None and isinstance(body, memoryview):
+        return body.tobytes()
+    if isinstance(body, (str, buffer, bytearray)):
+        return str(body)
+    return ''.join(str(chunk) for chunk in body)
+
+
+def to_xml(tag, children):
+    """
+    Serialize an element whose `children` are `(tag, text)` tuples, or
+    `(tag, children)` tuples for nested elements.
+    """
+    def build(parent, children):
+        for child_tag, value in children:
+            element = ET.SubElement(parent, child_tag)
+            if isinstance(value, list):
+                build(element, value)
+            elif isinstance(value, str):
+                # the keys are kept as UTF-8 strings, which ElementTree
+                # can only serialize as unicode
+                element.text = value.decode('utf-8')
+            else:
+                element.text = value if isinstance(value, unicode) \
+                    else str(value)
+    root = ET.Element(tag)
+    build(root, children)
+    return ET.tostring(root)
+
+
+class EmulatorError(Exception):
+    """ An error answered to the request, as NOS does. """
+    def __init__(self, status, code, message):
+        super(EmulatorError, self).__init__(status, code, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class Request(object):
+    """ A request decoded by the `Emulator`. """
+    def __init__(self, method, url, body, headers):
+        self.method = method
+        self.headers = dict((k.lower(), str(v)) for k, v in headers.items())
+        self.body = read_body(body)
+
+        parts = urlparse.urlsplit(url)
+        self.bucket = None
+        if '.' in parts.hostname:
+            self.bucket = parts.hostname.split('.', 1)[0]
+        self.quoted_key = parts.path[1:]
+        self.key = urllib2.unquote(self.quoted_key) or None
+
+        self.params = {}
+        self.sub_resources = []
+        for piece in parts.query.split('&') if parts.query else ():
+            name, _, value = piece.partition('=')
+            self.params[name] = urllib2.unquote(value) if _ else None
+            if name in SUB_RESOURCE:
+                self.sub_resources.append(piece)
+
+    def get_resource(self, sub_resources=True):
+        resource = '/'
+        if self.bucket is not None:
+            resource += '%s/' % self.bucket
+        resource += self.quoted_key
+        if sub_resources and self.sub_resources:
+            resource += '?' + '&'.join(self.sub_resources)
+        return resource
+
+    def get_string_to_sign(self):
+        def header(name):
+            return self.headers.get(name, '').strip().strip("'\"")
+        parts = [
+            self.method,
+            header('content-md5'),
+            header('content-type'),
+            header('expires') or header('date')
+        ]
+        parts.extend('%s:%s' % (k, v.strip().strip("'\""))
+                     for k, v in sorted(self.headers.items())
+                     if k.startswith(NOS_HEADER_PREFIX))
+        parts.append(self.get_resource())
+        return '\n'.join(parts)
+
+
+class Emulator(object):
+    """
+    In-process implementation of the NOS REST API, answering the requests
+    of an `EmulatorConnection` without any network.
+
+    The objects are kept in memory, or in `directory` when it is given so
+    that they outlive the emulator: each bucket is a sub directory holding
+    the content of every object and its metadata in a JSON file, both named
+    after the SHA-1 of the key. The in-progress multipart uploads are only
+    kept in memory. The buckets are created on their first use.
+
+    When `credentials`, a dict of secret keys by access key id, is given,
+    the signature of every request, from its Authorization header or the
+    query string of a presigned url, is checked as NOS does and the
+    requests which are anonymous, expired or wrongly signed are refused.
+    """
+    def __init__(self, credentials=None, directory=None):
+        self.credentials = credentials
+        self.directory = directory
+        self.requests = 0
+        self._buckets = {}
+        self._data = {}
+        self._uploads = {}
+        self._lock = threading.RLock()
+
+    def urlopen(self, method, url, body=None, headers={}):
+        """
+        Answer a request and return its `urllib3.HTTPResponse`, the
+        errors being answered as NOS does, with an XML body.
+        """
+        with self._lock:
+            self.requests += 1
+            request_id = '%016x' % self.requests
+        request = None
+        try:
+            request = Request(method, url, body, headers)
+            self.check_signature(request)
+            with self._lock:
+                status, response_headers, data = self.dispatch(request)
+        except EmulatorError as e:
+            status = e.status
+            response_headers = {'Content-Type': 'application/xml'}
+            data = to_xml('Error', [
+                ('Code', e.code),
+                ('Message', e.message),
+                ('Resource', request.get_resource(False)
+                 if request is not None else ''),
+                ('RequestId', request_id)
+            ])
+
+        response_headers['x-nos-request-id'] = request_id
+        if method == 'HEAD' or status == 304:
+            data = ''
+        else:
+            response_headers.setdefault('Content-Length', str(len(data)))
+        return urllib3.HTTPResponse(
+            body=StringIO(data), headers=response_headers, status=status,
+            reason=httplib.responses.get(status, ''), preload_content=False
+        )
+
+    def check_signature(self, request):
+        if self.credentials is None:
+            return
+
+        if 'Signature' in request.params:
+            access_key_id = request.params.get('NOSAccessKeyId')
+            signature = request.params['Signature']
+            expires = request.params.get('Expires') or '0'
+            if not expires.isdigit() or int(expires) < time.time():
+                raise EmulatorError(403, 'AccessDenied',
+                                    'Request has expired')
+            str_to_sign = '%s\n\n\n%s\n%s' % (
+                request.method, expires, request.get_resource(False)
+            )
+        else:
+            authorization = request.headers.get('authorization', '')
+            if not authorization.startswith('NOS ') or \
+                    ':' not in authorization:
+                raise EmulatorError(403, 'AccessDenied', 'Access Denied')
+            access_key_id, signature = \
+                authorization[4:].strip().rsplit(':', 1)
+            str_to_sign = request.get_string_to_sign()
+
+        secret = self.credentials.get(access_key_id)
+        if secret is None:
+            raise EmulatorError(403, 'InvalidAccessKeyId',
+                                'The access key id does not exist')
+        expected = base64.b64encode(hmac.new(
+            str(secret), str_to_sign, hashlib.sha256
+        ).digest())
+        if signature != expected:
+            raise EmulatorError(403, 'SignatureDoesNotMatch',
+                                'The request signature does not match')
+
+    def dispatch(self, request):
+        method = request.method
+        params = request.params
+        if request.bucket is None:
+            raise EmulatorError(400, 'InvalidRequest',
+                                'Listing the buckets is not supported')
+
+        if request.key is None:
+            if method == 'GET' and 'uploads' in params:
+                return self.list_uploads(request)
+            if method == 'GET':
+                return self.list_objects(request)
+            if method == 'POST' and 'delete' in params:
+                return self.delete_objects(request)
+        elif 'uploadId' in params:
+            if method == 'PUT' and 'partNumber' in params:
+                return self.upload_part(request)
+            if method == 'POST':
+                return self.complete_upload(request)
+            if method == 'DELETE':
+                return self.abort_upload(request)
+            if method == 'GET':
+                return self.list_parts(request)
+        elif method == 'POST' and 'uploads' in params:
+            return self.create_upload(request)
+        elif method == 'PUT':
+            if 'x-nos-copy-source' in request.headers:
+                return self.copy_object(request, False)
+            if 'x-nos-move-source' in request.headers:
+                return self.copy_object(request, True)
+            return self.put_object(request)
+        elif method in ('GET', 'HEAD'):
+            return self.get_object(request)
+        elif method == 'DELETE':
+            return self.delete_object(request)
+        raise EmulatorError(405, 'MethodNotAllowed',
+                            'The specified method is not allowed')
+
+    # storage
+
+    def get_bucket(self, bucket):
+        """ Return the dict of the metadata of the objects of `bucket`. """
+        objects = self._buckets.get(bucket)
+        if objects is None:
+            objects = self._buckets[bucket] = {}
+            path = self._get_path(bucket)
+            if path is not None and os.path.isdir(path):
+                for name in os.listdir(path):
+                    if name.endswith('.json'):
+                        with open(os.path.join(path, name)) as fp:
+                            meta = json.load(fp)
+                        objects[meta['key'].encode('utf-8')] = meta
+        return objects
+
+    def read(self, bucket, key):
+        """ Return the content of an object, or `None`. """
+        if key not in self.get_bucket(bucket):
+            return None
+        path = self._get_path(bucket, key)
+        if path is None:
+            return self._data[(bucket, key)]
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def write(self, bucket, key, data, headers=(), etag=None):
+        """
+        Store an object with the `Content-Type` and the user metadata found
+        in `headers`, and return its metadata.
+        """
+        headers = dict(headers)
+        meta = {
+            'key': key,
+            'size': len(data),
+            'etag': etag or hashlib.md5(data).hexdigest(),
+            'last_modified': time.time(),
+            'content_type': headers.get('content-type',
+                                        'application/octet-stream'),
+            'meta_data': dict((k, v) for k, v in headers.iteritems()
+                              if k.startswith(METADATA_PREFIX))
+        }
+        path = self._get_path(bucket, key)
+        if path is None:
+            self._data[(bucket, key)] = data
+        else:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            for name, content in ((path, data),
+                                  (path + '.json', json.dumps(meta))):
+                with open(name + '.tmp', 'wb') as fp:
+                    fp.write(content)
+                os.rename(name + '.tmp', name)
+        self.get_bucket(bucket)[key] = meta
+        return meta
+
+    def remove(self, bucket, key):
+        """ Remove an object and return whether it existed. """
+        if self.get_bucket(bucket).pop(key, None) is None:
+            return False
+        path = self._get_path(bucket, key)
+        if path is None:
+            del self._data[(bucket, key)]
+        else:
+            os.remove(path + '.json')
+            os.remove(path)
+        return True
+
+    def _get_path(self, bucket, key=None):
+        if self.directory is None:
+            return None
+        if key is None:
+            return os.path.join(self.directory, bucket)
+        return os.path.join(self.directory, bucket,
+                            hashlib.sha1(key).hexdigest())
+
+    def _get_meta(self, request):
+        meta = self.get_bucket(request.bucket).get(request.key)
+        if meta is None:
+            raise EmulatorError(404, 'NoSuchKey',
+                                'The specified key does not exist')
+        return meta
+
+    def _check_md5(self, request, data, header='content-md5'):
+        md5 = request.headers.get(header)
+        if md5 and md5.strip("'\"").lower() != \
+                hashlib.md5(data).hexdigest():
+            raise EmulatorError(400, 'BadDigest',
+                                'The Content-MD5 you specified did not match')
+
+    def _get_upload(self, request):
+        upload = self._uploads.get(request.params['uploadId'])
+        if upload is None or \
+                (upload['bucket'], upload['key']) != (request.bucket,
+                                                      request.key):
+            raise EmulatorError(404, 'NoSuchUpload',
+                                'The specified upload does not exist')
+        return upload
+
+    # objects
+
+    def put_object(self, request):
+        self._check_md5(request, request.body)
+        meta = self.write(request.bucket, request.key, request.body,
+                          request.headers)
+        return 200, {'ETag': '"%s"' % meta['etag']}, ''
+
+    def get_object(self, request):
+        meta = self._get_meta(request)
+        headers = {
+            'ETag': '"%s"' % meta['etag'],
+            'Last-Modified': http_date(meta['last_modified']),
+            'Content-Type': meta['content_type']
+        }
+        headers.update(meta['meta_data'])
+        if request.headers.get('if-none-match', '').strip("'\"") == \
+                meta['etag']:
+            return 304, headers, ''
+
+        size = meta['size']
+        status = 200
+        start, end = 0, size - 1
+        if 'range' in request.headers:
+            match = _RANGE.match(request.headers['range'].replace(' ', ''))
+            if match is None or match.groups() == ('', ''):
+                raise EmulatorError(416, 'InvalidRange',
+                                    'The requested range is not valid')
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+            if start >= size or start > end:
+                raise EmulatorError(416, 'InvalidRange',
+                                    'The requested range cannot be '
+                                    'satisfied')
+            status = 206
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+        headers['Content-Length'] = str(end - start + 1)
+        if request.method == 'HEAD':
+            return status, headers, ''
+        data = self.read(request.bucket, request.key)
+        return status, headers, data[start:end + 1]
+
+    def delete_object(self, request):
+        self._get_meta(request)
+        self.remove(request.bucket, request.key)
+        return 200, {}, ''
+
+    def copy_object(self, request, move):
+        source = request.headers['x-nos-%s-source' % (
+            'move' if move else 'copy'
+        )]
+        src_bucket, _, src_key = source.lstrip('/').partition('/')
+        src_key = urllib2.unquote(src_key)
+        meta = self.get_bucket(src_bucket).get(src_key)
+        if meta is None:
+            raise EmulatorError(404, 'NoSuchKey',
+                                'The specified key does not exist')
+        headers = dict(meta['meta_data'])
+        headers['content-type'] = meta['content_type']
+        self.write(request.bucket, request.key,
+                   self.read(src_bucket, src_key), headers, meta['etag'])
+        if move and (src_bucket, src_key) != (request.bucket, request.key):
+            self.remove(src_bucket, src_key)
+        return 200, {}, ''
+
+    def delete_objects(self, request):
+        self._check_md5(request, request.body)
+        try:
+            root = ET.fromstring(request.body)
+        except Exception:
+            raise EmulatorError(400, 'MalformedXML',
+                                'The XML you provided was not well-formed')
+        quiet = root.findtext('Quiet', 'false').lower() == 'true'
+        children = []
+        for key in root.findall('Object/Key'):
+            key = (key.text or '').encode('utf-8')
+            if self.remove(request.bucket, key):
+                if not quiet:
+                    children.append(('Deleted', [('Key', key)]))
+            else:
+                children.append(('Error', [
+                    ('Key', key),
+                    ('Code', 'NoSuchKey'),
+                    ('Message', 'The specified key does not exist')
+                ]))
+        return 200, {'Content-Type': 'application/xml'}, \
+            to_xml('DeleteResult', children)
+
+    def list_objects(self, request):
+        params = request.params
+        prefix = params.get('prefix') or ''
+        delimiter = params.get('delimiter') or ''
+        marker = params.get('marker') or ''
+        max_keys = int(params.get('max-keys') or 1000)
+
+        children = [
+            ('Name', request.bucket),
+            ('Prefix', prefix),
+            ('Marker', marker),
+            ('MaxKeys', max_keys)
+        ]
+        if delimiter:
+            children.append(('Delimiter', delimiter))
+        objects = self.get_bucket(request.bucket)
+        entries = []
+        last_prefix = None
+        truncated = False
+        for key in sorted(objects):
+            if key <= marker or not key.startswith(prefix):
+                continue
+            common_prefix = None
+            if delimiter:
+                i = key.find(delimiter, len(prefix))
+                if i >= 0:
+                    common_prefix = key[:i + len(delimiter)]
+            if common_prefix is not None:
+                if common_prefix == last_prefix or common_prefix <= marker:
+                    continue
+            if len(entries) >= max_keys:
+                truncated = True
+                break
+            if common_prefix is not None:
+                last_prefix = common_prefix
+                entries.append((common_prefix, ('CommonPrefixes', [
+                    ('Prefix', common_prefix)
+                ])))
+            else:
+                meta = objects[key]
+                entries.append((key, ('Contents', [
+                    ('Key', key),
+                    ('LastModified', iso_date(meta['last_modified'])),
+                    ('ETag', meta['etag']),
+                    ('Size', meta['size']),
+                    ('StorageClass', 'STANDARD')
+                ])))
+
+        children.append(('IsTruncated', str(truncated).lower()))
+        if truncated:
+            children.append(('NextMarker', entries[-1][0]))
+        children.extend(entry for _, entry in entries)
+        return 200, {'Content-Type': 'application/xml'}, \
+            to_xml('ListBucketResult', children)
+
+    # multipart uploads
+
+    def create_upload(self, request):
+        upload_id = uuid.uuid4().hex
+        self._uploads[upload_id] = {
+            'bucket': request.bucket,
+            'key': request.key,
+            'headers': request.headers,
+            'initiated': time.time(),
+            'parts': {}
+        }
+        return 200, {'Content-Type': 'application/xml'}, to_xml(
+            'InitiateMultipartUploadResult', [
+                ('Bucket', request.bucket),
+                ('Key', request.key),
+                ('UploadId', upload_id)
+            ]
+        )
+
+    def upload_part(self, request):
+        upload = self._get_upload(request)
+        part_num = request.params['partNumber'] or ''
+        if not part_num.isdigit() or not 1 <= int(part_num) <= 10000:
+            raise EmulatorError(400, 'InvalidArgument',
+                                'Part number must be between 1 and 10000')
+        self._check_md5(request, request.body)
+        etag = hashlib.md5(request.body).hexdigest()
+        upload['parts'][int(part_num)] = {
+            'data': request.body,
+            'etag': etag,
+            'last_modified': time.time()
+        }
+        return 200, {'ETag': '"%s"' % etag}, ''
+
+    def complete_upload(self, request):
+        upload = self._get_upload(request)
+        try:
+            root = ET.fromstring(request.body)
+        except Exception:
+            raise EmulatorError(400, 'MalformedXML',
+                                'The XML you provided was not well-formed')
+        chunks = []
+        previous = 0
+        for part in root.findall('Part'):
+            part_num = int(part.findtext('PartNumber') or 0)
+            if part_num <= previous:
+                raise EmulatorError(400, 'InvalidPartOrder',
+                                    'The list of parts was not in '
+                                    'ascending order')
+            previous = part_num
+            stored = upload['parts'].get(part_num)
+            if stored is None or stored['etag'] != \
+                    (part.findtext('ETag') or '').strip("'\""):
+                raise EmulatorError(400, 'InvalidPart',
+                                    'One or more of the specified parts '
+                                    'could not be found')
+            chunks.append(stored['data'])
+        if not chunks:
+            raise EmulatorError(400, 'MalformedXML',
+                                'The XML you provided was not well-formed')
+
+        data = ''.join(chunks)
+        self._check_md5(request, data, 'x-nos-object-md5')
+        headers = dict(upload['headers'])
+        headers.update(request.headers)
+        meta = self.write(request.bucket, request.key, data, headers)
+        del self._uploads[request.params['uploadId']]
+        return 200, {'Content-Type': 'application/xml'}, to_xml(
+            'CompleteMultipartUploadResult', [
+                ('Location', request.get_resource(False)),
+                ('Bucket', request.bucket),
+                ('Key', request.key),
+                ('ETag', meta['etag'])
+            ]
+        )
+
+    def abort_upload(self, request):
+        self._get_upload(request)
+        del self._uploads[request.params['uploadId']]
+        return 200, {}, ''
+
+    def list_parts(self, request):
+        upload = self._get_upload(request)
+        marker = int(request.params.get('part-number-marker') or 0)
+        max_parts = int(request.params.get('max-parts') or 1000)
+        numbers = [n for n in sorted(upload['parts']) if n > marker]
+        children = [
+            ('Bucket', request.bucket),
+            ('Key', request.key),
+            ('UploadId', request.params['uploadId']),
+            ('PartNumberMarker', marker),
+            ('MaxParts', max_parts),
+            ('IsTruncated', str(len(numbers) > max_parts).lower())
+        ]
+        numbers = numbers[:max_parts]
+        if numbers:
+            children.append(('NextPartNumberMarker', numbers[-1]))
+        for n in numbers:
+            part = upload['parts'][n]
+            children.append(('Part', [
+                ('PartNumber', n),
+                ('LastModified', iso_date(part['last_modified'])),
+                ('ETag', part['etag']),
+                ('Size', len(part['data']))
+            ]))
+        return 200, {'Content-Type': 'application/xml'}, \
+            to_xml('ListPartsResult', children)
+
+    def list_uploads(self, request):
+        marker = request.params.get('key-marker') or ''
+        upload_id_marker = request.params.get('upload-id-marker') or ''
+        max_uploads = int(request.params.get('max-uploads') or 1000)
+        # the uploads of a key are listed in the order they were initiated
+        uploads = sorted(
+            (upload['key'], upload['initiated'], upload_id, upload)
+            for upload_id, upload in self._uploads.iteritems()
+            if upload['bucket'] == request.bucket and
+            upload['key'] >= marker
+        )
+        if upload_id_marker:
+            ids = [u[2] for u in uploads if u[0] == marker]
+            skip = ids.index(upload_id_marker) + 1 \
+                if upload_id_marker in ids else len(ids)
+        else:
+            skip = len([u for u in uploads if u[0] == marker])
+        uploads = uploads[skip:]
+        children = [
+            ('Bucket', request.bucket),
+            ('KeyMarker', marker),
+            ('UploadIdMarker', upload_id_marker),
+            ('MaxUploads', max_uploads),
+            ('IsTruncated', str(len(uploads) > max_uploads).lower())
+        ]
+        uploads = uploads[:max_uploads]
+        if uploads:
+            children.append(('NextKeyMarker', uploads[-1][0]))
+            children.append(('NextUploadIdMarker', uploads[-1][2]))
+        for key, initiated, upload_id, upload in uploads:
+            children.append(('Upload', [
+                ('Key', key),
+                ('UploadId', upload_id),
+                ('StorageClass', 'STANDARD'),
+                ('Initiated', iso_date(initiated))
+            ]))
+        return 200, {'Content-Type': 'application/xml'}, \
+            to_xml('ListMultipartUploadsResult', children)
+
+
+class EmulatorConnection(Urllib3HttpConnection):
+    """
+    Connection class sending the requests of a `Transport` to an in-process
+    `Emulator` instead of NOS, for tests and benchmarks:
+
+        client = nos.Client('id', 'secret',
+                            connection_class=EmulatorConnection,
+                            emulator=Emulator({'id': 'secret'}))
+
+    A new empty in-memory `Emulator` is used when none is given.
+    """
+    def __init__(self, emulator=None, **kwargs):
+        super(EmulatorConnection, self).__init__(**kwargs)
+        self.emulator = emulator if emulator is not None else Emulator()
+
+    def prewarm(self, url, connections):
+        pass
+
+    def perform_request(self, method, url, body=None, headers={}, timeout=None,
+                        preload_content=False):
+        if not isinstance(url, str):
+            url = url.encode('utf-8')
+        response = self.emulator.urlopen(method, url, body, headers)
+        if not (200 <= response.status < 300):
+            self._raise_error(response)
+        return response.status, response.getheaders(), response
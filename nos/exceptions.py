@@ -8,9 +8,11 @@ __all__ = [
     "InvalidObjectName",
     "XmlParseError",
     "SerializationError",
+    "FileChangedError",
     "ConnectionError",
     "ConnectionTimeout",
     "MultiObjectDeleteException",
+    "NotModifiedError",
     "BadRequestError",
     "ForbiddenError",
     "NotFoundError",
@@ -57,8 +59,11 @@ class ClientException(NOSException):
 
 class ServiceException(NOSException):
     """
-    Exception raised when NOS returns a non-OK (>=400) HTTP status code.
+    Exception raised when NOS returns a non-OK (not 2XX) HTTP status code.
     """
+    #: The number of seconds of the Retry-After header of the response.
+    retry_after = None
+
     @property
     def status_code(self):
         return self.args[0]
@@ -165,6 +170,12 @@ class SerializationError(ClientException):
     """
 
 
+class FileChangedError(ClientException):
+    """
+    Error raised when a local file was truncated while it was uploaded.
+    """
+
+
 class ConnectionError(ClientException):
     """
     Error raised when there was an exception while talking to NOS server.
@@ -211,6 +222,10 @@ class MultiObjectDeleteException(ServiceException):
         )
 
 
+class NotModifiedError(ServiceException):
+    """ Exception representing a 304 status code. """
+
+
 class BadRequestError(ServiceException):
     """ Exception representing a 400 status code. """
 
@@ -253,6 +268,7 @@ class ServiceUnavailableError(ServiceException):
 
 # more generic mappings from status_code to python exceptions
 HTTP_EXCEPTIONS = {
+    304: NotModifiedError,
     400: BadRequestError,
     403: ForbiddenError,
     404: NotFoundError,
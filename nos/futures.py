@@ -0,0 +1,255 @@
+# -*- coding:utf8 -*-
+
+import logging
+import sys
+import threading
+import Queue
+
+from .client import Client
+from .client.utils import MAX_WORKERS
+
+__all__ = ["Future", "ThreadedClient"]
+
+logger = logging.getLogger('nos')
+
+_STOP = object()
+
+
+class Future(object):
+    """
+    The pending result of an operation submitted to `ThreadedClient`.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait at most `timeout` seconds for the operation and return whether it
+        is done.
+        """
+        self._event.wait(timeout)
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait at most `timeout` seconds for the operation and return its
+        result, or raise its exception. Raise `RuntimeError` on timeout.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait at most `timeout` seconds for the operation and return its
+        exception, or `None`. Raise `RuntimeError` on timeout.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+
+    def add_done_callback(self, fn):
+        """
+        Call `fn(future)` once the operation is done, in the worker thread
+        which finished it, or immediately if it is already done.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        self._invoke(fn)
+
+    def _wait(self, timeout):
+        if not self.wait(timeout):
+            raise RuntimeError('operation not done after %s seconds' %
+                               timeout)
+
+    def _set(self, result, exc_info):
+        with self._lock:
+            self._result = result
+            self._exc_info = exc_info
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._invoke(fn)
+
+    def _invoke(self, fn):
+        try:
+            fn(self)
+        except Exception:
+            logger.exception('exception calling callback for %r', self)
+
+
+class ThreadedClient(object):
+    """
+    Thread-pool convenience around `nos.Client`.
+
+    Every operation returns a `Future` at once and is performed, with the
+    blocking `Client` method, by a pool of `max_workers` long-lived threads
+    sharing a single `Client`, so signing, error mapping and the HTTP
+    connection pool are the same as `Client`'s. This is not asyncio: each
+    request still holds a worker thread and a pooled connection while it
+    runs, so the number of requests in flight is bounded by `max_workers`.
+    Use it as a context manager, or call `close` to stop the workers.
+
+        import nos.futures
+
+        with nos.futures.ThreadedClient(access_key_id, access_key_secret) as client:
+            futures = [client.head_object(bucket, key) for key in keys]
+            sizes = [f.result()['content_length'] for f in futures]
+
+    The `body` returned by `get_object` is still read in the calling thread.
+    """
+    def __init__(self, access_key_id=None, access_key_secret=None,
+                 max_workers=MAX_WORKERS, **kwargs):
+        """
+        :arg access_key_id(string): The access key ID. `None` is set by
+          default.
+        :arg access_key_secret(string): The secret access key. `None` is set by
+          default.
+        :arg max_workers(integer): The number of operations performed
+          concurrently. `8` is set by default.
+        :arg kwargs: Other optional parameters of `nos.Client`.
+        """
+        self.client = Client(
+            access_key_id=access_key_id,
+            access_key_secret=access_key_secret,
+            **kwargs
+        )
+        self.max_workers = max(1, int(max_workers))
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Call `func(*args, **kwargs)` in a worker thread and return a `Future`.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('cannot submit to a closed ThreadedClient')
+            if len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._work)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+            self._tasks.put((future, func, args, kwargs))
+        return future
+
+    def close(self, wait=True):
+        """
+        Stop the workers once the submitted operations are done.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._tasks.put(_STOP)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is _STOP:
+                return
+            future, func, args, kwargs = task
+            try:
+                result = func(*args, **kwargs)
+            except:
+                future._set(None, sys.exc_info())
+            else:
+                future._set(result, None)
+
+    def delete_object(self, bucket, key):
+        """ `Client.delete_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.delete_object, bucket, key)
+
+    def delete_objects(self, bucket, keys, quiet=False):
+        """ `Client.delete_objects` in a worker thread, return a `Future`. """
+        return self.submit(self.client.delete_objects, bucket, keys, quiet)
+
+    def get_object(self, bucket, key, **kwargs):
+        """ `Client.get_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.get_object, bucket, key, **kwargs)
+
+    def head_object(self, bucket, key):
+        """ `Client.head_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.head_object, bucket, key)
+
+    def list_objects(self, bucket, **kwargs):
+        """ `Client.list_objects` in a worker thread, return a `Future`. """
+        return self.submit(self.client.list_objects, bucket, **kwargs)
+
+    def put_object(self, bucket, key, body, **kwargs):
+        """ `Client.put_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.put_object, bucket, key, body,
+                           **kwargs)
+
+    def copy_object(self, src_bucket, src_key, dest_bucket, dest_key):
+        """ `Client.copy_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.copy_object, src_bucket, src_key,
+                           dest_bucket, dest_key)
+
+    def move_object(self, src_bucket, src_key, dest_bucket, dest_key):
+        """ `Client.move_object` in a worker thread, return a `Future`. """
+        return self.submit(self.client.move_object, src_bucket, src_key,
+                           dest_bucket, dest_key)
+
+    def create_multipart_upload(self, bucket, key, **kwargs):
+        """
+        `Client.create_multipart_upload` in a worker thread, return a `Future`.
+        """
+        return self.submit(self.client.create_multipart_upload, bucket, key,
+                           **kwargs)
+
+    def upload_part(self, bucket, key, part_num, upload_id, body, **kwargs):
+        """ `Client.upload_part` in a worker thread, return a `Future`. """
+        return self.submit(self.client.upload_part, bucket, key, part_num,
+                           upload_id, body, **kwargs)
+
+    def complete_multipart_upload(self, bucket, key, upload_id, info,
+                                  **kwargs):
+        """
+        `Client.complete_multipart_upload` in a worker thread, return a `Future`.
+        """
+        return self.submit(self.client.complete_multipart_upload, bucket, key,
+                           upload_id, info, **kwargs)
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        """
+        `Client.abort_multipart_upload` in a worker thread, return a `Future`.
+        """
+        return self.submit(self.client.abort_multipart_upload, bucket, key,
+                           upload_id)
+
+    def list_parts(self, bucket, key, upload_id, **kwargs):
+        """ `Client.list_parts` in a worker thread, return a `Future`. """
+        return self.submit(self.client.list_parts, bucket, key, upload_id,
+                           **kwargs)
+
+    def list_multipart_uploads(self, bucket, **kwargs):
+        """
+        `Client.list_multipart_uploads` in a worker thread, return a `Future`.
+        """
+        return self.submit(self.client.list_multipart_uploads, bucket,
+                           **kwargs)
@@ -0,0 +1,179 @@
+# -*- coding:utf8 -*-
+
+import collections
+import sys
+import threading
+import time
+import Queue
+
+from .retry import RetryBudget
+
+__all__ = ["HedgePolicy"]
+
+
+class LatencyTracker(object):
+    """
+    Sliding window of the latencies of the last `size` requests.
+    """
+    def __init__(self, size=1000):
+        self._latencies = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, p):
+        """ Return the `p` percentile of the window, or `None` if empty. """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1,
+                             int(len(latencies) * p / 100.0))]
+
+
+class HedgePolicy(object):
+    """
+    Send a second copy of a slow GET or HEAD request of an object and use
+    whichever answers first.
+
+    The copy is sent when the first request has not returned its headers
+    after `delay` seconds or, when `percentile` is given and at least
+    `min_samples` latencies have been measured, after the `percentile` of
+    the recent latencies. Every copy takes a token of `budget`, which is
+    refilled by the successful requests, so that hedging can't multiply the
+    load: by default at most one request out of ten is hedged.
+
+    The request which loses is not interrupted, its response is closed as
+    soon as it arrives.
+    """
+    def __init__(self, delay=0.05, percentile=None, min_samples=100,
+                 budget=None, methods=('GET', 'HEAD', )):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget if budget is not None else RetryBudget(10, 0.1)
+        self.methods = methods
+        self.latencies = LatencyTracker()
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._workers = Workers()
+
+    def should_hedge(self, method, key, body):
+        return method in self.methods and key is not None and body is None
+
+    def get_delay(self):
+        """ Return the number of seconds to wait before hedging. """
+        if (self.percentile is not None and
+                len(self.latencies) >= self.min_samples):
+            return self.latencies.percentile(self.percentile)
+        return self.delay
+
+    def perform(self, send):
+        """
+        Call `send()`, and call it once more in parallel if it is too slow,
+        returning the first result or raising the last error.
+
+        Both calls run on the reused threads of the policy, as the calling
+        thread must stay free to return the result of the copy while the
+        first call is still blocked. When the budget has no token left for a
+        copy, `send()` is simply called on the calling thread.
+        """
+        if self.budget.tokens < 1:
+            start = time.time()
+            result = send()
+            self.latencies.add(time.time() - start)
+            self.budget.release()
+            return result
+
+        results = Queue.Queue()
+
+        def attempt(hedge):
+            start = time.time()
+            try:
+                result = send()
+            except:
+                results.put((hedge, False, sys.exc_info()))
+            else:
+                results.put((hedge, True, result))
+                if not hedge:
+                    self.latencies.add(time.time() - start)
+
+        self._workers.submit(attempt, False)
+        pending = 1
+        try:
+            outcome = results.get(True, self.get_delay())
+        except Queue.Empty:
+            if self.budget.acquire():
+                with self._lock:
+                    self.hedged += 1
+                self._workers.submit(attempt, True)
+                pending += 1
+            outcome = results.get()
+        pending -= 1
+
+        while not outcome[1] and pending:
+            outcome = results.get()
+            pending -= 1
+
+        hedge, ok, value = outcome
+        if pending:
+            self._workers.submit(lambda: discard(results.get()))
+        if not ok:
+            raise value[0], value[1], value[2]
+        if hedge:
+            with self._lock:
+                self.hedge_wins += 1
+        self.budget.release()
+        return value
+
+
+class Workers(object):
+    """
+    Daemon threads running the attempts of hedged requests, reused from one
+    request to the next so that a thread is only started when none is idle.
+    There are thus as many threads as the most attempts ever in progress at
+    once.
+    """
+    def __init__(self):
+        self._tasks = Queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = 0
+        self.started = 0
+
+    def submit(self, func, *args):
+        with self._lock:
+            self._tasks.put((func, args))
+            if self._idle:
+                self._idle -= 1
+                return
+            self.started += 1
+        t = threading.Thread(target=self._work)
+        t.daemon = True
+        t.start()
+
+    def _work(self):
+        while True:
+            func, args = self._tasks.get()
+            try:
+                func(*args)
+            except Exception:
+                pass
+            with self._lock:
+                self._idle += 1
+
+
+def discard(outcome):
+    """ Close the response of the request which lost the race. """
+    _, ok, value = outcome
+    if not ok:
+        return
+    body = value[2]
+    close = getattr(body, 'close', None)
+    if close is not None:
+        close()
@@ -0,0 +1,161 @@
+# -*- coding:utf8 -*-
+
+import threading
+import time
+
+__all__ = ["Hooks", "RequestInfo", "EVENTS"]
+
+#: The events of the lifecycle of a request, in order.
+EVENTS = ('before_sign', 'before_send', 'after_headers', 'after_body',
+          'on_retry', 'on_error')
+
+
+class RequestInfo(object):
+    """
+    The request passed to every hook, which may update it.
+
+    * `before_sign`: `method`, `bucket`, `key`, `params`, `headers` and the
+      serialized `body` can be changed before the url and the signature are
+      computed;
+    * `before_send`: `url` and the signed `headers` are set, `attempt` counts
+      the attempts from 1. Setting `response` to a
+      `(status, headers, body)` tuple answers the attempt without sending
+      it;
+    * `after_headers`: `status`, `response_headers` and `response_body` are
+      set, the latter can be replaced;
+    * `after_body`: the response body has been read up to its end or closed,
+      `received` bytes in `body_time` seconds;
+    * `on_retry`: the attempt failed with `exception` and will be retried
+      after `delay` seconds;
+    * `on_error`: the request failed with `exception`.
+
+    `context` is a dict left to the hooks, to pass data from one event to
+    the next.
+    """
+    __slots__ = ('method', 'bucket', 'key', 'params', 'headers', 'body',
+                 'url', 'attempt', 'response', 'status', 'response_headers',
+                 'response_body', 'received', 'body_time', 'exception',
+                 'delay', 'context')
+
+    def __init__(self, method, bucket, key, params, headers, body):
+        self.method = method
+        self.bucket = bucket
+        self.key = key
+        self.params = params
+        self.headers = headers
+        self.body = body
+        self.url = None
+        self.attempt = 0
+        self.response = None
+        self.status = None
+        self.response_headers = None
+        self.response_body = None
+        self.received = 0
+        self.body_time = 0.0
+        self.exception = None
+        self.delay = None
+        self.context = {}
+
+
+class Hooks(object):
+    """
+    Callbacks of the lifecycle events of the requests of a `Transport`.
+
+    Every callback is called as `callback(request_info)`. When no callback
+    is registered, `active` is false and a request only pays for checking
+    it.
+    """
+    def __init__(self):
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self.active = False
+
+    def add(self, event, callback):
+        """ Register `callback` for `event`, one of `EVENTS`. """
+        if event not in EVENTS:
+            raise ValueError('unknown event: %r' % event)
+        with self._lock:
+            self._callbacks[event] = self._callbacks.get(event, ()) + \
+                    (callback, )
+            self.active = True
+
+    def remove(self, event, callback):
+        with self._lock:
+            callbacks = list(self._callbacks.get(event, ()))
+            callbacks.remove(callback)
+            if callbacks:
+                self._callbacks[event] = tuple(callbacks)
+            else:
+                self._callbacks.pop(event, None)
+            self.active = bool(self._callbacks)
+
+    def has(self, event):
+        return event in self._callbacks
+
+    def fire(self, event, request):
+        for callback in self._callbacks.get(event, ()):
+            callback(request)
+
+
+class ObservedBody(object):
+    """
+    Response body calling `on_done(elapsed, received)` once, with the time
+    spent reading it and its size, when it has been read up to its end,
+    released or closed.
+
+    Reading, iterating and `stream()` are all accounted; the other
+    attributes are those of the wrapped body.
+    """
+    def __init__(self, body, on_done):
+        self._body = body
+        self._on_done = on_done
+        self._elapsed = 0.0
+        self._received = 0
+
+    def __getattr__(self, name):
+        return getattr(self._body, name)
+
+    def read(self, amt=None):
+        start = time.time()
+        data = self._body.read() if amt is None else self._body.read(amt)
+        self._elapsed += time.time() - start
+        self._received += len(data)
+        if not data or amt is None:
+            self._done()
+        return data
+
+    def __iter__(self):
+        return self._observe(iter(self._body))
+
+    def stream(self, *args, **kwargs):
+        return self._observe(self._body.stream(*args, **kwargs))
+
+    def _observe(self, chunks):
+        while True:
+            start = time.time()
+            try:
+                data = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                self._elapsed += time.time() - start
+            self._received += len(data)
+            yield data
+        self._done()
+
+    def release_conn(self):
+        self._done()
+        release_conn = getattr(self._body, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+
+    def close(self):
+        self._done()
+        close = getattr(self._body, 'close', None)
+        if close is not None:
+            close()
+
+    def _done(self):
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done(self._elapsed, self._received)
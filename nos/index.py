@@ -0,0 +1,233 @@
+# -*- coding:utf8 -*-
+
+import sqlite3
+import sys
+import threading
+import time
+
+from .client.utils import parse_last_modified, to_str
+
+__all__ = ["ListingIndex"]
+
+#: Number of listed objects written to the index in one transaction.
+BATCH_SIZE = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    mtime INTEGER,
+    PRIMARY KEY (bucket, key)
+);
+CREATE TABLE IF NOT EXISTS refreshes (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+'''
+
+COLUMNS = ('key', 'size', 'etag', 'last_modified', 'mtime')
+
+
+def prefix_end(prefix):
+    """
+    Return the smallest key greater than all the keys starting with
+    `prefix`, or `None` if there is none.
+    """
+    prefix = prefix.decode('utf-8')
+    while prefix and ord(prefix[-1]) == sys.maxunicode:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return (prefix[:-1] + unichr(ord(prefix[-1]) + 1)).encode('utf-8')
+
+
+def key_range(prefix='', marker=None, end=None):
+    """
+    Return the SQL condition and parameters selecting the keys starting with
+    `prefix`, greater than `marker` and lower than `end`.
+    """
+    if marker is not None and marker >= prefix:
+        sql, params = ['key > ?'], [marker]
+    else:
+        sql, params = ['key >= ?'], [prefix]
+    upper = prefix_end(prefix) if prefix else None
+    if end is not None and (upper is None or end < upper):
+        upper = end
+    if upper is not None:
+        sql.append('key < ?')
+        params.append(upper)
+    return ' AND '.join(sql), params
+
+
+class ListingIndex(object):
+    """
+    Local copy of the listings of buckets, kept in a SQLite database, which
+    answers prefix scans, size totals and existence checks without any
+    request to NOS.
+
+    The index is filled and kept up to date by `refresh`, which lists a
+    prefix, or the range of keys of a prefix between a marker and an end
+    key, and replaces the indexed entries of that range with the listed
+    ones, so that a part of a huge bucket can be refreshed on its own. The
+    entries are the dicts of `Client.iter_objects`, with the `mtime`
+    timestamp of `last_modified`. The keys are returned as UTF-8 strings,
+    in the order of NOS listings.
+
+        index = ListingIndex('/var/cache/nos-index.db')
+        index.refresh(client, 'bucket', prefix='logs/2016/')
+        index.total('bucket', prefix='logs/')
+
+    `path` defaults to a database in memory. An index can be shared by
+    several threads.
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def refresh(self, client, bucket, prefix='', marker=None, end=None):
+        """
+        List the objects of `bucket` whose key starts with `prefix`, from
+        `marker` excluded up to `end` excluded, and make them the entries of
+        the index in that range, entries of deleted objects being removed.
+        Return a dict of the numbers of entries `listed` and `removed`.
+        """
+        bucket, prefix = to_str(bucket), to_str(prefix or '')
+        marker, end = to_str(marker), to_str(end)
+        lower = (marker, True) if marker is not None and marker >= prefix \
+            else (prefix, False)
+        result = {'listed': 0, 'removed': 0}
+        batch = []
+        for entry in client.iter_objects(bucket, prefix=prefix or None,
+                                         marker=marker):
+            key = to_str(entry['key'])
+            if end is not None and key >= end:
+                break
+            batch.append((bucket, key, entry['size'], entry['etag'],
+                          entry['last_modified'],
+                          parse_last_modified(entry['last_modified'])))
+            if len(batch) >= BATCH_SIZE:
+                self._write(bucket, lower, batch, result)
+                lower, batch = (key, True), []
+        self._write(bucket, lower, batch, result, key_range(prefix, None, end))
+        if marker is None and end is None:
+            with self._lock:
+                with self._db:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?)',
+                        (bucket, prefix, time.time())
+                    )
+        return result
+
+    def _write(self, bucket, lower, rows, result, tail=None):
+        """
+        Write the listed `rows`, whose keys follow `lower`, a `(key,
+        excluded)` tuple, and remove the entries between them, which are
+        gone from the listing. When `tail` is given, a condition returned
+        by `key_range`, the entries after the last row within it are
+        removed too.
+        """
+        keys = [row[1] for row in rows]
+        gaps = zip(keys, keys[1:])
+        first = 'key > ?' if lower[1] else 'key >= ?'
+        with self._lock:
+            with self._db:
+                if keys:
+                    result['removed'] += self._db.execute(
+                        'DELETE FROM objects WHERE bucket = ? AND %s AND '
+                        'key < ?' % first, (bucket, lower[0], keys[0])
+                    ).rowcount
+                if gaps:
+                    result['removed'] += self._db.executemany(
+                        'DELETE FROM objects WHERE bucket = ? AND key > ? '
+                        'AND key < ?', [(bucket, a, b) for a, b in gaps]
+                    ).rowcount
+                if tail is not None:
+                    if keys:
+                        first, lower = 'key > ?', (keys[-1], True)
+                    condition, params = tail
+                    result['removed'] += self._db.execute(
+                        'DELETE FROM objects WHERE bucket = ? AND %s AND %s'
+                        % (first, condition), [bucket, lower[0]] + params
+                    ).rowcount
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+        result['listed'] += len(rows)
+
+    def refreshed_at(self, bucket, prefix=''):
+        """
+        Return the time of the last refresh of the whole `prefix`, or `None`
+        if it has never been refreshed.
+        """
+        row = self._query_one(
+            'SELECT refreshed_at FROM refreshes WHERE bucket = ? AND '
+            'prefix = ?', (to_str(bucket), to_str(prefix or ''))
+        )
+        return row and row[0]
+
+    def get(self, bucket, key):
+        """ Return the entry of an object, or `None` if it isn't indexed. """
+        row = self._query_one(
+            'SELECT %s FROM objects WHERE bucket = ? AND key = ?' %
+            ', '.join(COLUMNS), (to_str(bucket), to_str(key))
+        )
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def exists(self, bucket, key):
+        return self._query_one(
+            'SELECT 1 FROM objects WHERE bucket = ? AND key = ?',
+            (to_str(bucket), to_str(key))
+        ) is not None
+
+    def total(self, bucket, prefix=''):
+        """
+        Return a dict of the `count` and the total `size` of the indexed
+        objects whose key starts with `prefix`.
+        """
+        condition, params = key_range(to_str(prefix or ''))
+        count, size = self._query_one(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects '
+            'WHERE bucket = ? AND ' + condition, [to_str(bucket)] + params
+        )
+        return {'count': count, 'size': size}
+
+    def iter_objects(self, bucket, prefix='', marker=None, end=None,
+                     batch_size=BATCH_SIZE):
+        """
+        Yield the entries of the objects whose key starts with `prefix`,
+        from `marker` excluded up to `end` excluded, in key order. They are
+        read `batch_size` at a time, so that the index can be changed while
+        they are consumed.
+        """
+        bucket, prefix = to_str(bucket), to_str(prefix or '')
+        marker, end = to_str(marker), to_str(end)
+        while True:
+            condition, params = key_range(prefix, marker, end)
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT %s FROM objects WHERE bucket = ? AND %s '
+                    'ORDER BY key LIMIT ?' % (', '.join(COLUMNS), condition),
+                    [bucket] + params + [batch_size]
+                ).fetchall()
+            for row in rows:
+                yield dict(zip(COLUMNS, row))
+            if len(rows) < batch_size:
+                return
+            marker = rows[-1][0]
+
+    def _query_one(self, sql, params):
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
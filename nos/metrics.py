@@ -0,0 +1,244 @@
+# -*- coding:utf8 -*-
+
+import bisect
+import threading
+import time
+
+from .hooks import ObservedBody
+
+__all__ = ["Metrics", "Histogram"]
+
+#: Upper bounds of the buckets of the latency histograms, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+_local = threading.local()
+
+
+def get_operation(method, key, params, headers):
+    """
+    Return the name of the `Client` method sending a request.
+    """
+    if 'delete' in params:
+        return 'delete_objects'
+    if 'uploads' in params:
+        if key is None:
+            return 'list_multipart_uploads'
+        return 'create_multipart_upload'
+    if 'partNumber' in params:
+        return 'upload_part'
+    if 'uploadId' in params:
+        return {
+            'POST': 'complete_multipart_upload',
+            'DELETE': 'abort_multipart_upload'
+        }.get(method, 'list_parts')
+    if key is None:
+        return 'list_objects'
+    if method == 'PUT':
+        if 'x-nos-copy-source' in headers:
+            return 'copy_object'
+        if 'x-nos-move-source' in headers:
+            return 'move_object'
+        return 'put_object'
+    return {
+        'GET': 'get_object',
+        'HEAD': 'head_object',
+        'DELETE': 'delete_object'
+    }.get(method, method.lower())
+
+
+def record_connection_wait(seconds):
+    """
+    Add the time spent getting a connection from a pool to the request
+    being timed in the current thread, if any.
+    """
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.connection_wait += seconds
+
+
+class Histogram(object):
+    """
+    Thread-safe cumulative histogram, in the Prometheus fashion.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Return a dict with the `count` and `sum` of the observed values, and
+        the cumulative `buckets` as a list of `(upper_bound, count)`.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        count = 0
+        for bound, n in zip(self.buckets + (float('inf'), ), counts):
+            count += n
+            cumulative.append((bound, count))
+        return {'count': count, 'sum': total, 'buckets': cumulative}
+
+
+class Metrics(object):
+    """
+    Timings and volumes of the requests of a `Transport`, per operation.
+
+    Every request is broken into the following histograms, in seconds:
+
+    * `signing`: building the url and the signed headers;
+    * `connection_wait`: getting a connection from the pool, not measured
+      for the hedged requests which are sent by other threads;
+    * `first_byte`: sending the request and receiving the response headers;
+    * `body`: reading the response body, measured when it is read up to its
+      end or closed;
+    * `duration`: the whole request, including the retries but not the
+      reading of the body.
+
+    The counters `bytes_sent`, `bytes_received` and `retries` are kept per
+    operation and `requests` per operation and final status, the name of the
+    exception for failed requests. Use `snapshot` to read them in code, or
+    `export_prometheus` to expose them.
+    """
+    HISTOGRAMS = ('signing', 'connection_wait', 'first_byte', 'body',
+                  'duration')
+    COUNTERS = ('bytes_sent', 'bytes_received', 'retries')
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix='nos'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, operation):
+        with self._lock:
+            h = self._histograms.get((name, operation))
+            if h is None:
+                h = self._histograms[(name, operation)] = \
+                        Histogram(self.buckets)
+            return h
+
+    def incr(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, labels)] = \
+                    self._counters.get((name, labels), 0) + value
+
+    def start(self, operation):
+        """ Return the `RequestTimer` of a new request. """
+        return RequestTimer(self, operation)
+
+    def snapshot(self):
+        """
+        Return `{'histograms': {(name, operation): histogram_snapshot},
+        'counters': {(name, labels): value}}`.
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            'histograms': dict((k, h.snapshot())
+                               for k, h in histograms.iteritems()),
+            'counters': counters
+        }
+
+    def export_prometheus(self):
+        """ Return the metrics in the Prometheus text exposition format. """
+        snapshot = self.snapshot()
+        lines = []
+        by_name = {}
+        for (name, operation), h in sorted(snapshot['histograms'].items()):
+            by_name.setdefault(name, []).append((operation, h))
+        for name in self.HISTOGRAMS:
+            if name not in by_name:
+                continue
+            metric = '%s_request_%s_seconds' % (self.prefix, name)
+            lines.append('# TYPE %s histogram' % metric)
+            for operation, h in by_name[name]:
+                for bound, count in h['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_bucket{operation="%s",le="%s"} %d' % (
+                        metric, operation, le, count
+                    ))
+                lines.append('%s_sum{operation="%s"} %r' % (
+                    metric, operation, h['sum']
+                ))
+                lines.append('%s_count{operation="%s"} %d' % (
+                    metric, operation, h['count']
+                ))
+
+        by_name = {}
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name in self.COUNTERS + ('requests', ):
+            if name not in by_name:
+                continue
+            metric = '%s_%s_total' % (self.prefix, name)
+            lines.append('# TYPE %s counter' % metric)
+            for labels, value in by_name[name]:
+                lines.append('%s{%s} %d' % (metric, ','.join(
+                    '%s="%s"' % (k, v) for k, v in labels
+                ), value))
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimer(object):
+    """
+    Measures of one request, recorded into `Metrics` once its headers have
+    been received and once its body has been read.
+    """
+    def __init__(self, metrics, operation):
+        self.metrics = metrics
+        self.operation = operation
+        self.start = time.time()
+        self.attempt_start = self.start
+        self.signing = 0.0
+        self.connection_wait = 0.0
+        self.attempts = 0
+
+    def attempt(self):
+        """ Mark the beginning of an attempt, made in the current thread. """
+        self.attempts += 1
+        self.connection_wait = 0.0
+        self.attempt_start = time.time()
+        _local.timer = self
+
+    def finish(self, status, bytes_sent, body=None):
+        """
+        Record the request, which ended with `status` or the name of an
+        exception, and return its `body` wrapped to time its reading.
+        """
+        _local.timer = None
+        now = time.time()
+        metrics = self.metrics
+        operation = self.operation
+        labels = (('operation', operation), )
+        metrics.histogram('signing', operation).observe(self.signing)
+        metrics.histogram('connection_wait', operation).observe(
+            self.connection_wait
+        )
+        metrics.histogram('first_byte', operation).observe(
+            max(0.0, now - self.attempt_start - self.connection_wait)
+        )
+        metrics.histogram('duration', operation).observe(now - self.start)
+        metrics.incr('bytes_sent', labels, bytes_sent)
+        if self.attempts > 1:
+            metrics.incr('retries', labels, self.attempts - 1)
+        metrics.incr('requests', labels + (('status', status), ))
+        if body is None:
+            return None
+        return ObservedBody(body, self.record_body)
+
+    def record_body(self, elapsed, received):
+        self.metrics.histogram('body', self.operation).observe(elapsed)
+        self.metrics.incr('bytes_received',
+                          (('operation', self.operation), ), received)
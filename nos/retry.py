@@ -0,0 +1,151 @@
+# -*- coding:utf8 -*-
+
+import random
+import threading
+import time
+
+from .exceptions import ConnectionError, ConnectionTimeout, ServiceException
+
+__all__ = ["RetryPolicy", "RetryBudget"]
+
+
+class RetryBudget(object):
+    """
+    Token bucket limiting the retries of all the requests sharing it.
+
+    Every retry takes one token and is refused when the bucket is empty,
+    every successful request gives back `refill_ratio` token, up to
+    `capacity` tokens. When NOS is degraded the retries thus drop to
+    `refill_ratio` of the successful requests instead of multiplying the
+    load.
+    """
+    def __init__(self, capacity=100, refill_ratio=0.1):
+        self.capacity = float(capacity)
+        self.refill_ratio = refill_ratio
+        self.tokens = self.capacity
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Take a token for a retry and return whether there was one. """
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def release(self):
+        """ Give back a part of a token after a successful request. """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.refill_ratio)
+
+
+class RetryPolicy(object):
+    """
+    Decide whether and when a failed request of a `Transport` is sent again.
+
+    The delay before the retry `n` (counted from 0) is
+    `backoff_factor * 2 ** n` capped to `backoff_max` seconds, and then:
+
+    * with `jitter='full'`, a random value between 0 and that delay;
+    * with `jitter='decorrelated'`, a random value between `backoff_factor`
+      and three times the previous delay, capped to `backoff_max`.
+
+    The `Retry-After` hint of a response is used instead of the computed
+    delay when it is longer. When a `budget` is given, a retry also needs a
+    token of it. When a `deadline` is given, the request, including all its
+    attempts and delays, never lasts more than `deadline` seconds: the
+    timeout of each attempt is reduced to the remaining time and no retry
+    is done when its delay would exceed it.
+    """
+    def __init__(self, max_retries=2, backoff_factor=0.0, backoff_max=120,
+                 jitter=None, retry_on_status=(500, 501, 503, ),
+                 retry_on_timeout=False, budget=None, deadline=None,
+                 sleep=time.sleep):
+        if jitter not in (None, 'full', 'decorrelated'):
+            raise ValueError('unknown jitter: %r' % jitter)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_on_status = retry_on_status
+        self.retry_on_timeout = retry_on_timeout
+        self.budget = budget
+        self.deadline = deadline
+        self.sleep = sleep
+
+    def start(self):
+        """ Return the `RetryState` of a new request. """
+        return RetryState(self)
+
+    def is_retryable(self, e):
+        if isinstance(e, ConnectionTimeout):
+            return self.retry_on_timeout
+        if isinstance(e, ConnectionError):
+            return True
+        if isinstance(e, ServiceException):
+            return e.status_code in self.retry_on_status
+        return False
+
+    def get_backoff(self, attempt, previous):
+        """
+        Return the delay before the retry `attempt`, `previous` being the
+        delay before the previous one.
+        """
+        if self.jitter == 'decorrelated':
+            low = self.backoff_factor
+            return min(self.backoff_max,
+                       random.uniform(low, max(low, previous * 3)))
+        delay = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        if self.jitter == 'full':
+            return random.uniform(0, delay)
+        return delay
+
+
+class RetryState(object):
+    """
+    Attempts of one request under a `RetryPolicy`.
+    """
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 0
+        self.delay = policy.backoff_factor
+        self.deadline_at = None
+        if policy.deadline is not None:
+            self.deadline_at = time.time() + policy.deadline
+
+    def get_timeout(self, timeout):
+        """
+        Return the timeout of the next attempt, reduced to the time left
+        before the deadline.
+        """
+        if self.deadline_at is None:
+            return timeout
+        remaining = max(self.deadline_at - time.time(), 0.001)
+        return min(timeout, remaining) if timeout else remaining
+
+    def next_delay(self, e):
+        """
+        Return the number of seconds to wait before retrying after the
+        exception `e`, or `None` if the request should not be retried.
+        """
+        policy = self.policy
+        if self.attempt >= policy.max_retries or not policy.is_retryable(e):
+            return None
+
+        delay = policy.get_backoff(self.attempt, self.delay)
+        retry_after = getattr(e, 'retry_after', None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, policy.backoff_max))
+        if (self.deadline_at is not None and
+                time.time() + delay >= self.deadline_at):
+            return None
+        if policy.budget is not None and not policy.budget.acquire():
+            return None
+
+        self.attempt += 1
+        self.delay = delay
+        return delay
+
+    def succeeded(self):
+        if self.policy.budget is not None:
+            self.policy.budget.release()
@@ -4,12 +4,12 @@ try:
     import simplejson as json
 except ImportError:
     import json
-import uuid
+import sys
 from datetime import date, datetime
-from decimal import Decimal
 
 from .exceptions import SerializationError
 from .compat import string_types
+from .body import get_buffer
 
 __all__ = ["JSONSerializer"]
 
@@ -18,9 +18,14 @@ class JSONSerializer(object):
     def default(self, data):
         if isinstance(data, (date, datetime)):
             return data.isoformat()
-        elif isinstance(data, Decimal):
+
+        # decimal and uuid are slow to import, their instances can only
+        # exist if the application has imported them already
+        decimal = sys.modules.get('decimal')
+        if decimal is not None and isinstance(data, decimal.Decimal):
             return float(data)
-        elif isinstance(data, uuid.UUID):
+        uuid = sys.modules.get('uuid')
+        if uuid is not None and isinstance(data, uuid.UUID):
             return str(data)
         raise TypeError("Unable to serialize %r (type: %s)" % (data, type(data)))
 
@@ -36,6 +41,11 @@ class JSONSerializer(object):
         if isinstance(data, file):
             return data
 
+        # send bytes-like objects and file segments without copying them
+        data_buffer = get_buffer(data)
+        if data_buffer is not None:
+            return data_buffer
+
         try:
             return json.dumps(data, default=self.default, ensure_ascii=False)
         except (ValueError, TypeError) as e:
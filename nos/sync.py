@@ -0,0 +1,234 @@
+# -*- coding:utf8 -*-
+
+import hashlib
+import logging
+import os
+import re
+
+from .client.transfer import imap_parallel
+from .client.utils import (CHUNK_SIZE, MAX_WORKERS, parse_last_modified,
+                           to_str)
+
+__all__ = ["sync_up", "sync_down"]
+
+logger = logging.getLogger('nos')
+
+_MD5_ETAG = re.compile(r'^[0-9a-fA-F]{32}$')
+
+
+def normalize_prefix(prefix):
+    """ Return the key prefix of a directory, ending with a slash. """
+    prefix = to_str(prefix or '').lstrip('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return prefix
+
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fp:
+        for data in iter(lambda: fp.read(CHUNK_SIZE), ''):
+            md5.update(data)
+    return md5.hexdigest()
+
+
+class LocalFile(object):
+    """
+    A file of the local tree, whose MD5 is computed on first use only.
+    """
+    def __init__(self, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self._md5 = None
+
+    @property
+    def md5(self):
+        if self._md5 is None:
+            self._md5 = file_md5(self.path)
+        return self._md5
+
+
+def scan_directory(directory, prefix):
+    """
+    Return the regular files under `directory` as a dict of `LocalFile` by
+    object key, the key being `prefix` followed by the relative path with
+    slashes.
+    """
+    directory = to_str(directory)
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in names:
+            path = os.path.join(root, name)
+            if not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            rel = os.path.relpath(path, directory).replace(os.sep, '/')
+            files[prefix + rel] = LocalFile(path, st.st_size, st.st_mtime)
+    return files
+
+
+def scan_bucket(client, bucket, prefix):
+    """
+    Return the objects under `prefix` as a dict of listing entries by key,
+    leaving out the keys ending with a slash, which are directory markers.
+    """
+    objects = {}
+    for entry in client.iter_objects(bucket, prefix=prefix or None):
+        key = to_str(entry['key'])
+        if key.endswith('/') or not key.startswith(prefix):
+            continue
+        entry['key'] = key
+        objects[key] = entry
+    return objects
+
+
+def is_same(local, remote, checksum, local_is_source):
+    """
+    Whether the local file and the object hold the same content.
+
+    The sizes are compared first. Then, when `checksum` is true and the
+    ETag of the object is a plain MD5, as for the objects uploaded at once
+    or with their object MD5, it is compared with the MD5 of the file.
+    Otherwise the copy is considered up to date when it is not older than
+    its source.
+    """
+    if local.size != remote['size']:
+        return False
+    if checksum and _MD5_ETAG.match(remote['etag']):
+        return local.md5 == remote['etag'].lower()
+    remote_mtime = parse_last_modified(remote['last_modified'])
+    if remote_mtime is None:
+        return False
+    # the listing dates have a resolution of one second
+    if local_is_source:
+        return int(local.mtime) <= remote_mtime
+    return remote_mtime <= int(local.mtime)
+
+
+def sync_up(client, directory, bucket, prefix='', delete=False,
+            checksum=True, dry_run=False, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Make the objects under `prefix` in `bucket` mirror the local
+    `directory`, uploading only the files which are missing or differ.
+
+    The tree is compared with the listing of the prefix: files of another
+    size are uploaded, and so are files of the same size whose MD5 differs
+    from the ETag of their object when `checksum` is true (the files are
+    then read once to be hashed). When the ETag isn't a plain MD5, or when
+    `checksum` is false, a file is uploaded when it was modified after its
+    object. The files are compared and uploaded by `max_workers` threads,
+    and the other `kwargs`, such as `part_size` or `meta_data`, are passed
+    to `Client.upload_file`. When `delete` is true, the objects without a
+    local file are deleted afterwards with `Client.delete_many`. Nothing is
+    changed when `dry_run` is true.
+
+    Return a dict of the sorted keys `uploaded`, `deleted` and `unchanged`.
+    """
+    prefix = normalize_prefix(prefix)
+    local = scan_directory(directory, prefix)
+    remote = scan_bucket(client, bucket, prefix)
+
+    def run(key):
+        f = local[key]
+        if key in remote and is_same(f, remote[key], checksum, True):
+            return 'unchanged', key
+        if not dry_run:
+            options = dict(kwargs)
+            if f._md5 is not None:
+                # already computed by the comparison
+                options['object_md5'] = f._md5
+            client.upload_file(bucket, key, f.path, **options)
+        return 'uploaded', key
+
+    result = {'uploaded': [], 'deleted': [], 'unchanged': []}
+    for action, key in imap_parallel(run, sorted(local), max_workers):
+        result[action].append(key)
+
+    if delete:
+        result['deleted'] = sorted(set(remote) - set(local))
+        if result['deleted'] and not dry_run:
+            client.delete_many(bucket, result['deleted'])
+
+    for keys in result.itervalues():
+        keys.sort()
+    return result
+
+
+def sync_down(client, bucket, prefix, directory, delete=False,
+              checksum=True, dry_run=False, max_workers=MAX_WORKERS,
+              **kwargs):
+    """
+    Make the local `directory` mirror the objects under `prefix` in
+    `bucket`, downloading only the objects which are missing or differ.
+
+    The objects are compared with the files as in `sync_up`, a file being
+    downloaded when its object was modified after it. Each object is
+    downloaded into a temporary file by `Client.download_file`, with the
+    other `kwargs`, which then replaces the local file and gets the
+    modification time of the object. The objects are compared and
+    downloaded by `max_workers` threads. When `delete` is true, the files
+    without an object are removed afterwards. Nothing is changed when
+    `dry_run` is true.
+
+    Return a dict of the sorted keys `downloaded`, `deleted` and
+    `unchanged`.
+    """
+    prefix = normalize_prefix(prefix)
+    directory = to_str(directory)
+    local = scan_directory(directory, prefix) \
+        if os.path.isdir(directory) else {}
+    remote = scan_bucket(client, bucket, prefix)
+    for key in remote.keys():
+        if set(key[len(prefix):].split('/')) & set(['', '.', '..']):
+            # a key such as `a//b` or `../b` can't be mapped to a file of
+            # the directory
+            logger.warning('skip object %s/%s', bucket, key)
+            del remote[key]
+
+    def run(key):
+        entry = remote[key]
+        if key in local and is_same(local[key], entry, checksum, False):
+            return 'unchanged', key
+        if not dry_run:
+            path = os.path.join(directory, *key[len(prefix):].split('/'))
+            download(client, bucket, key, path, entry, kwargs)
+        return 'downloaded', key
+
+    result = {'downloaded': [], 'deleted': [], 'unchanged': []}
+    for action, key in imap_parallel(run, sorted(remote), max_workers):
+        result[action].append(key)
+
+    if delete:
+        result['deleted'] = sorted(set(local) - set(remote))
+        if not dry_run:
+            for key in result['deleted']:
+                os.remove(local[key].path)
+
+    for keys in result.itervalues():
+        keys.sort()
+    return result
+
+
+def download(client, bucket, key, path, entry, kwargs):
+    """
+    Download an object into a temporary file which then replaces `path`, so
+    that the previous file is kept if the download fails.
+    """
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            # created meanwhile by another thread
+            if not os.path.isdir(parent):
+                raise
+    tmp_path = path + '.nos-sync'
+    client.download_file(bucket, key, tmp_path, **kwargs)
+    mtime = parse_last_modified(entry['last_modified'])
+    if mtime is not None:
+        os.utime(tmp_path, (mtime, mtime))
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
@@ -1,13 +1,14 @@
 # -*- coding:utf8 -*-
+import functools
 import time
 
-from .connection import Urllib3HttpConnection
 from .serializer import JSONSerializer
-from .exceptions import (NOSException, ServiceException, ConnectionError,
-                         ConnectionTimeout, InvalidObjectName,
-                         InvalidBucketName, FileOpenModeError,
-                         BadRequestError)
-from .client.auth import RequestMetaData
+from .exceptions import (NOSException, InvalidObjectName, InvalidBucketName,
+                         FileOpenModeError, BadRequestError)
+from .client.auth import RequestMetaData, RequestSigner
+from .retry import RetryPolicy
+from .metrics import get_operation
+from .hooks import Hooks, RequestInfo, ObservedBody
 from .client.utils import MAX_OBJECT_SIZE
 
 __all__ = ["Transport"]
@@ -25,10 +26,11 @@ class Transport(object):
     Main interface is the `perform_request` method.
     """
     def __init__(self, access_key_id=None, access_key_secret=None,
-                 connection_class=Urllib3HttpConnection,
+                 connection_class=None,
                  serializer=JSONSerializer(), end_point='nos-eastchina1.126.net',
                  max_retries=2, retry_backoff_factor=0.0, retry_on_status=(500, 501, 503, ),
                  retry_on_timeout=False, timeout=None, enable_ssl=False,
+                 retry_policy=None, hedge_policy=None, metrics=None,
                  **kwargs):
         self.access_key_id = access_key_id
         self.access_key_secret = access_key_secret
@@ -39,13 +41,60 @@ class Transport(object):
         self.timeout = timeout
         self.end_point = end_point
         self.enable_ssl = enable_ssl
+        self.signer = RequestSigner(access_key_id, access_key_secret)
+        if retry_policy is None:
+            retry_policy = RetryPolicy(
+                max_retries=max_retries,
+                backoff_factor=retry_backoff_factor,
+                backoff_max=self.BACKOFF_MAX,
+                retry_on_status=retry_on_status,
+                retry_on_timeout=retry_on_timeout
+            )
+        self.retry_policy = retry_policy
+        self.hedge_policy = hedge_policy
+        self.metrics = metrics
+        self.hooks = Hooks()
 
         # data serializer
         self.serializer = serializer
         # store all strategies...
         kwargs.setdefault('enable_ssl', self.enable_ssl)
+        if connection_class is None:
+            # urllib3 is only imported by the first transport
+            from .connection import Urllib3HttpConnection as connection_class
         self.connection = connection_class(**kwargs)
 
+    def prewarm(self, bucket, connections):
+        """
+        Open `connections` connections to the host of `bucket` ahead of the
+        first requests.
+        """
+        bucket = bucket.encode('utf-8') \
+                if isinstance(bucket, unicode) else bucket
+        if not bucket:
+            raise InvalidBucketName()
+        self.connection.prewarm(
+            '%s://%s.%s/' % ('https' if self.enable_ssl else 'http',
+                             bucket, self.end_point),
+            connections
+        )
+
+    def __after_headers(self, request, status, headers, body):
+        request.status = status
+        request.response_headers = headers
+        request.response_body = body
+        request.exception = None
+        self.hooks.fire('after_headers', request)
+        body = request.response_body
+        if body is None or not self.hooks.has('after_body'):
+            return body
+
+        def on_done(elapsed, received):
+            request.body_time = elapsed
+            request.received = received
+            self.hooks.fire('after_body', request)
+        return ObservedBody(body, on_done)
+
     def perform_request(self, method, bucket=None, key=None, params={},
                         body=None, headers={}, timeout=None):
         method = method.encode('utf-8') \
@@ -60,9 +109,15 @@ class Transport(object):
         if key is not None and key == '':
             raise InvalidObjectName()
 
+        timer = None
+        if self.metrics is not None:
+            timer = self.metrics.start(
+                get_operation(method, key, params, headers)
+            )
+
+        length = 0
         if body is not None:
             body = self.serializer.dumps(body)
-            length = 0
             if isinstance(body, file):
                 if 'b' not in body.mode.lower():
                     raise FileOpenModeError()
@@ -83,6 +138,16 @@ class Transport(object):
                     'Request Entity Too Large'
                 )
 
+        hooks = self.hooks
+        request = None
+        if hooks.active:
+            request = RequestInfo(method, bucket, key, params, headers, body)
+            hooks.fire('before_sign', request)
+            method, bucket, key = request.method, request.bucket, request.key
+            params, headers = request.params, request.headers
+            body = request.body
+
+        sign_start = time.time()
         meta_data = RequestMetaData(
             access_key_id=self.access_key_id,
             access_key_secret=self.access_key_secret,
@@ -93,38 +158,61 @@ class Transport(object):
             params=params,
             body=body,
             headers=headers,
-            enable_ssl=self.enable_ssl
+            enable_ssl=self.enable_ssl,
+            signer=self.signer
         )
         url = meta_data.get_url()
         headers = meta_data.get_headers()
-
-        for attempt in xrange(self.max_retries + 1):
+        if timer is not None:
+            timer.signing = time.time() - sign_start
+        if request is not None:
+            request.url = url
+            request.headers = headers
+
+        hedge_policy = self.hedge_policy
+        if hedge_policy is not None and \
+                not hedge_policy.should_hedge(method, key, body):
+            hedge_policy = None
+
+        retry_state = self.retry_policy.start()
+        while True:
+            send = functools.partial(
+                self.connection.perform_request, method, url, body, headers,
+                timeout=retry_state.get_timeout(timeout or self.timeout)
+            )
+            if timer is not None:
+                timer.attempt()
+            response = None
             try:
-                status, headers, body = self.connection.perform_request(
-                    method, url, body, headers,
-                    timeout=(timeout or self.timeout)
-                )
+                if request is not None:
+                    request.attempt += 1
+                    hooks.fire('before_send', request)
+                    response, request.response = request.response, None
+
+                if response is not None:
+                    status, headers, body = response
+                elif hedge_policy is not None:
+                    status, headers, body = hedge_policy.perform(send)
+                else:
+                    status, headers, body = send()
 
             except NOSException as e:
-                retry = False
-                if isinstance(e, ConnectionTimeout):
-                    retry = self.retry_on_timeout
-                elif isinstance(e, ConnectionError):
-                    retry = True
-                elif (isinstance(e, ServiceException) and
-                      e.status_code in self.retry_on_status):
-                    retry = True
-
-                if retry:
-                    # raise exception on last retry
-                    if attempt >= self.max_retries:
-                        raise
-                    else:
-                        backoff_value = self.retry_backoff_factor * (2 ** attempt)
-                        time.sleep(min(self.BACKOFF_MAX, backoff_value))
-                        continue
-                else:
+                delay = retry_state.next_delay(e)
+                if request is not None:
+                    request.exception = e
+                    request.delay = delay
+                    hooks.fire('on_retry' if delay is not None else 'on_error',
+                               request)
+                if delay is None:
+                    if timer is not None:
+                        timer.finish(e.__class__.__name__, length)
                     raise
+                self.retry_policy.sleep(delay)
 
             else:
+                retry_state.succeeded()
+                if timer is not None:
+                    body = timer.finish(status, length, body)
+                if request is not None:
+                    body = self.__after_headers(request, status, headers, body)
                 return status, headers, body
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+# -*- coding:utf8 -*-
+
+"""
+Benchmark of the `Client` operations against a local stand-in server.
+
+The stand-in server is an `Emulator` served over HTTP by a separate process,
+so that the requests go through the real connection pools, sockets and
+signature checks while the client process only measures its own work. For
+every object size and concurrency level, the operations `put`, `multipart`
+(`upload_file`), `get`, `head`, `list` (`iter_objects`) and `delete` are
+run and reported with their ops/s, throughput, p50/p99 latency, CPU time of
+the client process per request and peak RSS of the client process. Every
+benchmark runs in a fresh client process forked from a parent which holds
+no object data, so that its peak RSS is its own and not the high-water mark
+of the benchmarks run before it:
+
+    python -m test_nos.benchmarks.bench_client \\
+        --sizes 1K,1M,16M --concurrency 1,8 --save baseline.json
+    python -m test_nos.benchmarks.bench_client \\
+        --sizes 1K,1M,16M --concurrency 1,8 --compare baseline.json
+
+With `--compare`, the results are checked against a baseline saved by
+`--save` and the command fails when the ops/s of a benchmark dropped, or
+its p99 latency grew, by more than `--tolerance`. The baselines are only
+comparable on the same machine. `baseline.json`, next to this module, is
+the baseline of the default options on the development machine.
+
+The default sizes stop at 16M: the stand-in server reads every object in
+memory to answer it, so that the 1G objects, at a concurrency of 8, would
+take several GB of memory in the server process. Objects of 1G or more are
+stored by the stand-in server in a temporary directory, and can be
+benchmarked with, for instance, `--sizes 1K,1M,16M,1G --concurrency 1`; see
+`--max-bytes` to bound the volume written for each benchmark.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+import nos
+from nos.connection import Urllib3HttpConnection
+from nos.emulator import Emulator
+from nos.client.transfer import imap_parallel
+from nos.client.utils import MAX_OBJECT_SIZE
+
+ACCESS_KEY_ID = 'a' * 32
+ACCESS_KEY_SECRET = 's' * 32
+BUCKET = 'bench'
+END_POINT = 'nos.bench'
+READ_SIZE = 1024 * 1024
+TRANSFERS = ('put', 'multipart', 'get')
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+def format_size(size):
+    for unit in ('G', 'M', 'K'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return '%d%s' % (size // UNITS[unit], unit)
+    return str(size)
+
+
+def get_peak_rss():
+    """
+    Return the peak resident set size of this process, in bytes, which is
+    only meaningful in a process running a single benchmark.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # answer with a single write, without waiting for delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def handle_request(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        response = self.server.emulator.urlopen(
+            self.command,
+            'http://%s%s' % (self.headers.getheader('Host'), self.path),
+            body, dict(self.headers.items())
+        )
+        data = response.read()
+        self.send_response(response.status)
+        for k, v in response.getheaders().iteritems():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(queue, directory):
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    server.emulator = Emulator({ACCESS_KEY_ID: ACCESS_KEY_SECRET}, directory)
+    queue.put(server.server_address)
+    server.serve_forever()
+
+
+class StandInConnection(Urllib3HttpConnection):
+    """
+    Connection sending the requests of every bucket host to the stand-in
+    server at `address`, with the bucket host in the Host header.
+    """
+    def __init__(self, address, **kwargs):
+        super(StandInConnection, self).__init__(**kwargs)
+        self.address = '%s:%d' % address
+
+    def perform_request(self, method, url, body=None, headers={}, timeout=None,
+                        preload_content=False):
+        parts = urlparse.urlsplit(url)
+        headers = dict(headers, Host=parts.netloc)
+        url = urlparse.urlunsplit(('http', self.address, parts.path,
+                                   parts.query, ''))
+        return super(StandInConnection, self).perform_request(
+            method, url, body, headers, timeout, preload_content
+        )
+
+
+def write_file(directory, size):
+    """ Write the file of `size` bytes uploaded by `multipart`. """
+    path = os.path.join(directory, format_size(size))
+    chunk = os.urandom(min(size, READ_SIZE))
+    with open(path, 'wb') as fp:
+        for offset in xrange(0, size, len(chunk)):
+            fp.write(chunk[:size - offset])
+    return path
+
+
+class Workload(object):
+    """
+    The objects of one size written and read by the benchmarks, `path`
+    being the file uploaded by `multipart`, if any.
+    """
+    def __init__(self, client, size, count, part_size, path=None):
+        self.client = client
+        self.size = size
+        self.count = count
+        self.part_size = part_size
+        self.prefix = 'bench/%s/' % format_size(size)
+        self.data = None
+        self.path = path
+
+    def prepare(self, name):
+        """ Generate the data uploaded by `put`, before it is timed. """
+        if name == 'put':
+            self.data = os.urandom(self.size)
+
+    def key(self, i):
+        return '%s%08d' % (self.prefix, i)
+
+    def put(self, i):
+        self.client.put_object(BUCKET, self.key(i), self.data)
+
+    def multipart(self, i):
+        self.client.upload_file(BUCKET, self.key(i), self.path,
+                                part_size=self.part_size, max_workers=4)
+
+    def get(self, i):
+        body = self.client.get_object(BUCKET, self.key(i))['body']
+        while body.read(READ_SIZE):
+            pass
+        body.release_conn()
+
+    def head(self, i):
+        self.client.head_object(BUCKET, self.key(i))
+
+    def list(self, i):
+        for _ in self.client.iter_objects(BUCKET, prefix=self.prefix,
+                                          limit=100):
+            pass
+
+    def delete(self, i):
+        self.client.delete_object(BUCKET, self.key(i))
+
+    def operations(self):
+        """ Yield the name and count of each benchmark. """
+        if self.size <= MAX_OBJECT_SIZE:
+            yield 'put', self.count
+        if self.path is not None:
+            yield 'multipart', self.count
+        yield 'get', self.count
+        yield 'head', self.count
+        yield 'list', max(1, self.count // 10)
+        yield 'delete', self.count
+
+
+def run(func, count, concurrency):
+    """
+    Call `func(i)` for `i` in `range(count)` with `concurrency` threads and
+    return the latencies, the elapsed time and the CPU time.
+    """
+    def timed(i):
+        start = time.time()
+        func(i)
+        return time.time() - start
+
+    cpu = sum(os.times()[:2])
+    start = time.time()
+    latencies = sorted(imap_parallel(timed, xrange(count), concurrency))
+    elapsed = time.time() - start
+    return latencies, elapsed, sum(os.times()[:2]) - cpu
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100.0))]
+
+
+def make_client(address, concurrency):
+    return nos.Client(
+        ACCESS_KEY_ID, ACCESS_KEY_SECRET, end_point=END_POINT,
+        connection_class=StandInConnection, address=address,
+        maxsize=concurrency * 4
+    )
+
+
+def run_case(queue, address, workload, name, count, concurrency):
+    """
+    Run the benchmark `name` of `workload` in this child process and put
+    its result in `queue`.
+    """
+    workload.client = make_client(address, concurrency)
+    workload.prepare(name)
+    latencies, elapsed, cpu = run(getattr(workload, name), count,
+                                  concurrency)
+    size = workload.size
+    queue.put({
+        'operation': name,
+        'size': size,
+        'concurrency': concurrency,
+        'count': count,
+        'ops_per_sec': count / elapsed,
+        'mb_per_sec': (count * size / elapsed / UNITS['M']
+                       if name in TRANSFERS else 0.0),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_ms_per_op': cpu / count * 1000,
+        'peak_rss_mb': get_peak_rss() / float(UNITS['M'])
+    })
+
+
+def run_in_child(address, workload, name, count, concurrency):
+    """ Run a benchmark in a fresh process and return its result. """
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(
+        target=run_case,
+        args=(queue, address, workload, name, count, concurrency)
+    )
+    child.start()
+    child.join()
+    if child.exitcode != 0:
+        raise RuntimeError('benchmark %s of %s failed' % (
+            name, format_size(workload.size)
+        ))
+    return queue.get(True, 10)
+
+
+def bench(sizes, concurrency_levels, count, max_bytes, part_size,
+          operations=None):
+    directory = tempfile.mkdtemp(prefix='nos-bench-')
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve,
+        args=(queue, os.path.join(directory, 'server')
+              if max(sizes) >= UNITS['G'] else None)
+    )
+    server.daemon = True
+    server.start()
+    results = []
+    try:
+        address = queue.get(True, 10)
+        paths = dict((size, write_file(directory, size))
+                     for size in sizes if size > part_size)
+        for concurrency in concurrency_levels:
+            for size in sizes:
+                n = max(concurrency, min(count, max_bytes // size))
+                workload = Workload(None, size, n, part_size, paths.get(size))
+                for name, n in workload.operations():
+                    if operations and name not in operations:
+                        continue
+                    result = run_in_child(address, workload, name, n,
+                                          concurrency)
+                    results.append(result)
+                    print_result(result)
+    finally:
+        server.terminate()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def result_key(result):
+    return '%s/%s/%d' % (result['operation'], format_size(result['size']),
+                         result['concurrency'])
+
+
+def print_result(result):
+    print('%-24s %10.1f ops/s %9.1f MB/s  p50 %9.2f ms  p99 %9.2f ms  '
+          'cpu %8.3f ms/op  rss %7.1f MB' % (
+              result_key(result), result['ops_per_sec'],
+              result['mb_per_sec'], result['p50_ms'], result['p99_ms'],
+              result['cpu_ms_per_op'], result['peak_rss_mb']
+          ))
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the descriptions of the results which regressed compared with
+    the `baseline` results.
+    """
+    previous = dict((result_key(r), r) for r in baseline)
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        base = previous.get(key)
+        if base is None:
+            continue
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append('%s: %.1f ops/s instead of %.1f' % (
+                key, result['ops_per_sec'], base['ops_per_sec']
+            ))
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append('%s: p99 %.2f ms instead of %.2f' % (
+                key, result['p99_ms'], base['p99_ms']
+            ))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Client against a local stand-in server.'
+    )
+    parser.add_argument('--sizes', default='1K,1M,16M',
+                        help='comma separated object sizes, up to 1G')
+    parser.add_argument('--concurrency', default='1,8',
+                        help='comma separated numbers of threads')
+    parser.add_argument('--count', type=int, default=200,
+                        help='requests of each benchmark')
+    parser.add_argument('--max-bytes', type=parse_size, default='256M',
+                        help='bytes written by each benchmark, which '
+                        'reduces the count of the large sizes')
+    parser.add_argument('--part-size', type=parse_size, default='8M',
+                        help='part size of the multipart uploads')
+    parser.add_argument('--operations',
+                        help='comma separated operations to run')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='JSON baseline to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed regression ratio, 0.2 by default')
+    args = parser.parse_args(argv)
+
+    results = bench(
+        [parse_size(s) for s in args.sizes.split(',')],
+        [int(c) for c in args.concurrency.split(',')],
+        args.count, args.max_bytes, args.part_size,
+        args.operations.split(',') if args.operations else None
+    )
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump({
+                'sdk_version': nos.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results
+            }, fp, indent=2, sort_keys=True, separators=(',', ': '))
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
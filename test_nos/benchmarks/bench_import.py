@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding:utf8 -*-
+
+"""
+Benchmark of the time spent by `import nos` in a fresh interpreter.
+
+Each run imports `nos` in a new process and reports the time spent in the
+import statement, and the modules which should be loaded on first use only
+but were loaded by the import. The command fails when the fastest run
+exceeds the budget, in milliseconds, or when a lazy module was loaded:
+
+    python -m test_nos.benchmarks.bench_import [--runs 20] [--budget 30]
+
+The package is compiled first so that the compilation to bytecode is not
+measured.
+"""
+
+from __future__ import print_function
+
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+
+import nos
+
+#: Modules loaded on first use only.
+LAZY_MODULES = ('urllib3', 'certifi', 'xml.etree.ElementTree',
+                'xml.etree.cElementTree', 'urllib', 'urllib2', 'platform',
+                'uuid', 'decimal', 'cgi', 'tempfile', 'nos.connection',
+                'nos.client.cache')
+
+CHILD = '''
+import json, sys, time
+start = time.time()
+import nos
+elapsed = time.time() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': [m for m in %r if sys.modules.get(m) is not None]
+}))
+''' % (LAZY_MODULES, )
+
+
+def measure():
+    """ Import `nos` in a new interpreter and return its measures. """
+    output = subprocess.check_output([sys.executable, '-c', CHILD])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def bench(runs):
+    compileall.compile_dir(os.path.dirname(nos.__file__), quiet=True)
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        result = measure()
+        times.append(result['elapsed'] * 1000)
+        loaded.update(result['loaded'])
+    times.sort()
+    print('import nos: min %.2f ms  median %.2f ms  max %.2f ms' % (
+        times[0], times[len(times) // 2], times[-1]
+    ))
+    return times, sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure the time spent by `import nos`.'
+    )
+    parser.add_argument('--runs', type=int, default=20,
+                        help='number of interpreters, 20 by default')
+    parser.add_argument('--budget', type=float, default=30.0,
+                        help='maximum time in ms, 30 by default')
+    args = parser.parse_args(argv)
+
+    times, loaded = bench(args.runs)
+    status = 0
+    if loaded:
+        print('loaded by import nos: %s' % ', '.join(loaded))
+        status = 1
+    if times[0] > args.budget:
+        print('over budget: %.2f ms > %.2f ms' % (times[0], args.budget))
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
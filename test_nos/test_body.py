@@ -0,0 +1,83 @@
+# -*- coding:utf8 -*-
+
+import array
+import hashlib
+import mmap
+import os
+import tempfile
+from mock import patch
+from nos import Client
+from nos.body import FileSegment, get_buffer, map_file
+from nos.emulator import Emulator, EmulatorConnection
+from nos.serializer import JSONSerializer
+
+from .test_cases import TestCase
+
+
+class TestBody(TestCase):
+    def setUp(self):
+        super(TestBody, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        self.data = os.urandom(3 * mmap.ALLOCATIONGRANULARITY + 100)
+        os.write(fd, self.data)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        super(TestBody, self).tearDown()
+
+    def test_map_file(self):
+        offset = mmap.ALLOCATIONGRANULARITY + 10
+        data = map_file(self.path, offset, 5000)
+        self.assertEquals(5000, len(data))
+        self.assertEquals(self.data[offset:offset + 5000], str(data))
+        with open(self.path, 'rb') as fp:
+            fp.seek(7)
+            self.assertEquals(self.data[100:], str(map_file(fp, 100)))
+            self.assertEquals(7, fp.tell())
+        self.assertEquals('', str(map_file(self.path, len(self.data))))
+        self.assertRaises(ValueError, map_file, self.path, 10, len(self.data))
+
+    def test_get_buffer(self):
+        self.assertEquals('abc', str(get_buffer(bytearray('abc'))))
+        self.assertEquals('bc', get_buffer(memoryview('abc')[1:]).tobytes())
+        self.assertEquals('AB', str(get_buffer(array.array('B', [65, 66]))))
+        segment = FileSegment(self.path, 100, 10)
+        self.assertEquals(10, len(segment))
+        self.assertEquals(self.data[100:110], str(get_buffer(segment)))
+        self.assertEquals(len(self.data) - 100,
+                          len(FileSegment(self.path, 100)))
+        self.assertEquals(None, get_buffer({'a': 1}))
+
+        buf = JSONSerializer().dumps(bytearray('abc'))
+        self.assertTrue(isinstance(buf, buffer))
+        self.assertEquals('{"a": 1}', JSONSerializer().dumps({'a': 1}))
+
+        # python 2.6 has no memoryview
+        with patch('nos.body.memoryview', None):
+            self.assertEquals(None, get_buffer({'a': 1}))
+            self.assertEquals('{"a": 1}', JSONSerializer().dumps({'a': 1}))
+
+    def test_upload(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}))
+        resp = client.put_object('bucket', 'array', bytearray(self.data))
+        self.assertEquals(hashlib.md5(self.data).hexdigest(), resp['etag'])
+
+        upload_id = client.create_multipart_upload(
+            'bucket', 'parts'
+        )['response'].findtext('UploadId')
+        part_size = mmap.ALLOCATIONGRANULARITY + 1
+        info = []
+        with open(self.path, 'rb') as fp:
+            for part_num, offset in enumerate(
+                    xrange(0, len(self.data), part_size), 1):
+                resp = client.upload_part(
+                    'bucket', 'parts', part_num, upload_id,
+                    FileSegment(fp, offset,
+                                min(part_size, len(self.data) - offset))
+                )
+                info.append({'part_num': part_num, 'etag': resp['etag']})
+        client.complete_multipart_upload('bucket', 'parts', upload_id, info)
+        self.assertEquals(self.data,
+                          client.get_object('bucket', 'parts')['body'].read())
@@ -1,11 +1,36 @@
 # -*- coding:utf8 -*-
 
-from mock import Mock
-from nos.client.auth import RequestMetaData
+import urllib2
+from mock import Mock, patch
+from nos.client.auth import RequestMetaData, RequestSigner, presign_urls
 
 from ..test_cases import TestCase
 
 
+class TestRequestSigner(TestCase):
+    @patch('time.time')
+    def test_get_date(self, mock_time):
+        signer = RequestSigner('', '')
+        mock_time.return_value = 1463990835.2
+        self.assertEquals('Mon, 23 May 2016 16:07:15 Asia/Shanghai',
+                          signer.get_date())
+        mock_time.return_value = 1463990835.9
+        self.assertEquals('Mon, 23 May 2016 16:07:15 Asia/Shanghai',
+                          signer.get_date())
+        mock_time.return_value = 1463990836.0
+        self.assertEquals('Mon, 23 May 2016 16:07:16 Asia/Shanghai',
+                          signer.get_date())
+
+    def test_get_authorization(self):
+        signer = RequestSigner('', '')
+        for _ in xrange(2):
+            self.assertEquals(
+                'NOS :riPI9XPTbHodbLyLC+vlLgZm3PFPoEQHMo+5RLj3qC0=',
+                signer.get_authorization('12345')
+            )
+        self.assertRaises(AttributeError, setattr, signer, 'other', 1)
+
+
 class TestRequestMetaData(TestCase):
     def test_get_url(self):
         meta_data = RequestMetaData('', '', 'GET')
@@ -28,11 +53,31 @@ class TestRequestMetaData(TestCase):
         self.assertEquals('NOS :riPI9XPTbHodbLyLC+vlLgZm3PFPoEQHMo+5RLj3qC0=',
                           meta_data.headers['Authorization'])
 
+        body = Mock(spec=file)
+        meta_data = RequestMetaData('', '', 'PUT', body=body,
+                                    headers={'Content-MD5': '12345'})
+        self.assertEquals('12345', meta_data.headers['Content-MD5'])
+        self.assertFalse(body.read.called)
+
         meta_data = RequestMetaData('test', 'object', 'GET', 'aaa', 'bbb',
                                     params={'upload': None, 'a': 12345})
         self.assertEquals('http://aaa.nos.netease.com/bbb?a=12345&upload',
                           meta_data.url)
 
+    @patch('time.time', Mock(return_value=1463990835.2))
+    def test_shared_signer(self):
+        signer = RequestSigner('test', 'object')
+        headers = {'x-nos-meta-a': 'b'}
+        meta_data = RequestMetaData('test', 'object', 'GET', 'aaa', 'bbb',
+                                    headers=headers, signer=signer)
+        self.assertEquals(signer, meta_data.signer)
+        self.assertEquals(
+            meta_data.headers['Authorization'],
+            RequestMetaData('test', 'object', 'GET', 'aaa', 'bbb',
+                            headers=headers).headers['Authorization']
+        )
+        self.assertEquals({'x-nos-meta-a': 'b'}, headers)
+
     def test_get_string_to_sign(self):
         meta_data = RequestMetaData('', '', 'GET')
         meta_data.headers = {
@@ -63,3 +108,27 @@ class TestRequestMetaData(TestCase):
             '/test/ob%262%21?uploadId=1221334&delete',
             meta_data._get_canonicalized_resource()
         )
+
+
+class TestPresignUrls(TestCase):
+    def test_presign_urls(self):
+        signer = RequestSigner('id', 'secret')
+        keys = ['a/b c.txt', u'特殊'.encode('utf-8')]
+        urls = list(presign_urls(signer, 'GET', 'bucket', keys, 1463990835,
+                                 end_point='nos.netease.com'))
+        for key, url in zip(keys, urls):
+            meta_data = RequestMetaData('id', 'secret', 'GET', 'bucket', key,
+                                        headers={'Expires': '1463990835'})
+            signature = meta_data.headers['Authorization'].split(':')[1]
+            self.assertEquals(
+                '%s?NOSAccessKeyId=id&Expires=1463990835&Signature=%s' % (
+                    meta_data.get_url(), urllib2.quote(signature, '')
+                ),
+                url
+            )
+
+    def test_presign_urls_anonymous(self):
+        urls = presign_urls(RequestSigner(None, None), 'GET', 'bucket',
+                            [u'a b'], 1463990835, enable_ssl=True)
+        self.assertEquals(['https://bucket.nos.netease.com/a%20b'],
+                          list(urls))
@@ -0,0 +1,267 @@
+# -*- coding:utf8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from StringIO import StringIO
+from mock import Mock, patch
+from nos import Client
+from nos.client.cache import MetadataCache, ContentCache
+from nos.emulator import Emulator, EmulatorConnection
+from nos.exceptions import NotModifiedError, NotFoundError
+
+from ..test_cases import TestCase
+
+
+class HeadTransport(object):
+    def __init__(self, **kwargs):
+        self.etag = 'v1'
+        self.exists = True
+        self.calls = []
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        self.calls.append((method, key, dict(headers)))
+        if method != 'HEAD':
+            self.etag = 'v2'
+            resp = Mock()
+            resp.read = Mock(return_value='<a></a>')
+            return 200, {}, resp
+        if not self.exists:
+            raise NotFoundError(404, 'Not Found', '', '', '')
+        if headers.get('If-None-Match') == '"%s"' % self.etag:
+            raise NotModifiedError(304, 'Not Modified', '', '', '')
+        return 200, {'ETag': '"%s"' % self.etag, 'Content-Length': 5}, None
+
+    def methods(self):
+        return [c[0] for c in self.calls]
+
+
+class TestMetadataCache(TestCase):
+    def test_lru(self):
+        cache = MetadataCache(2)
+        cache.set('bucket', 'a', {'etag': 'a'})
+        cache.set('bucket', 'b', {'etag': 'b'})
+        cache.get('bucket', 'a')
+        cache.set('bucket', 'c', {'etag': 'c'})
+        self.assertEquals(2, len(cache))
+        self.assertEquals(({'etag': 'a'}, True), cache.get('bucket', 'a'))
+        self.assertEquals((None, False), cache.get('bucket', 'b'))
+        self.assertEquals(({'etag': 'c'}, True), cache.get(u'bucket', u'c'))
+        cache.invalidate(u'bucket', 'c')
+        self.assertEquals((None, False), cache.get('bucket', 'c'))
+        self.assertRaises(ValueError, MetadataCache, 0)
+
+    def test_ttl(self):
+        cache = MetadataCache(10, ttl=5)
+        with patch('time.time', Mock(return_value=100.0)):
+            cache.set('bucket', 'key', {'etag': 'a'})
+        with patch('time.time', Mock(return_value=104.0)):
+            self.assertEquals(({'etag': 'a'}, True),
+                              cache.get('bucket', 'key'))
+        with patch('time.time', Mock(return_value=105.0)):
+            self.assertEquals(({'etag': 'a'}, False),
+                              cache.get('bucket', 'key'))
+
+
+class TestClientMetadataCache(TestCase):
+    def test_disabled_by_default(self):
+        client = Client(transport_class=HeadTransport)
+        self.assertEquals(None, client.metadata_cache)
+        client.head_object('bucket', 'key')
+        client.head_object('bucket', 'key')
+        self.assertEquals(['HEAD', 'HEAD'], client.transport.methods())
+
+    def test_hit_and_revalidate(self):
+        client = Client(transport_class=HeadTransport, metadata_cache_size=10,
+                        metadata_cache_ttl=5)
+        with patch('time.time', Mock(return_value=100.0)):
+            info = client.head_object('bucket', 'key')
+            self.assertEquals('v1', info['etag'])
+            self.assertEquals(info, client.head_object(u'bucket', u'key'))
+        self.assertEquals(1, len(client.transport.calls))
+
+        with patch('time.time', Mock(return_value=106.0)):
+            self.assertEquals(info, client.head_object('bucket', 'key'))
+        self.assertEquals({'If-None-Match': '"v1"'},
+                          client.transport.calls[-1][2])
+        with patch('time.time', Mock(return_value=110.0)):
+            client.head_object('bucket', 'key')
+        self.assertEquals(2, len(client.transport.calls))
+
+    def test_invalidation(self):
+        client = Client(transport_class=HeadTransport, metadata_cache_size=10)
+        client.head_object('bucket', 'key')
+        client.put_object('bucket', 'key', 'hello')
+        self.assertEquals('v2', client.head_object('bucket', 'key')['etag'])
+
+        client.head_object('bucket', 'key2')
+        client.move_object('bucket', 'key2', 'bucket', 'key3')
+        client.head_object('bucket', 'key3')
+        client.copy_object('bucket', 'key', 'bucket', 'key3')
+        client.delete_object('bucket', 'key')
+        client.delete_objects('bucket', ['key3'])
+        self.assertEquals(0, len(client.metadata_cache))
+
+        client.head_object('bucket', 'key')
+        client.transport.exists = False
+        with patch('time.time', Mock(return_value=1e10)):
+            self.assertRaises(NotFoundError, client.head_object,
+                              'bucket', 'key')
+        self.assertEquals(0, len(client.metadata_cache))
+
+
+class GetTransport(object):
+    def __init__(self, **kwargs):
+        self.objects = {}
+        self.calls = []
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        self.calls.append((method, key, dict(headers)))
+        if method == 'PUT':
+            self.objects[key] = body
+            return 200, {}, None
+        if method == 'DELETE':
+            self.objects.pop(key, None)
+            return 200, {}, None
+        if key not in self.objects:
+            raise NotFoundError(404, 'Not Found', '', '', '')
+        data = self.objects[key]
+        etag = hashlib.md5(data).hexdigest()
+        if headers.get('If-None-Match') == '"%s"' % etag:
+            raise NotModifiedError(304, 'Not Modified', '', 'req304', '')
+        return 200, {'ETag': '"%s"' % etag, 'Content-Length': len(data),
+                     'x-nos-request-id': 'req'}, StringIO(data)
+
+
+class TestContentCache(TestCase):
+    def setUp(self):
+        super(TestContentCache, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestContentCache, self).tearDown()
+
+    def store(self, cache, key, data):
+        writer = cache.writer('bucket', key, {
+            'etag': hashlib.md5(data).hexdigest(),
+            'content_length': len(data)
+        })
+        writer.write(data)
+        writer.commit()
+
+    def test_eviction(self):
+        cache = ContentCache(self.directory, max_bytes=10)
+        self.store(cache, 'a', 'aaaa')
+        self.store(cache, 'b', 'bbbb')
+        cache.open('bucket', 'a', hashlib.md5('aaaa').hexdigest()).close()
+        self.store(cache, 'c', 'cccc')
+        self.assertEquals(8, cache.size)
+        self.assertEquals(None, cache.get('bucket', 'b'))
+        self.assertEquals(hashlib.md5('aaaa').hexdigest(),
+                          cache.get('bucket', 'a')['etag'])
+
+        self.store(cache, 'a', 'AAAAA')
+        self.assertEquals(9, cache.size)
+        self.assertEquals(None, cache.writer('bucket', 'd', {
+            'etag': 'etag', 'content_length': 11
+        }))
+
+        cache = ContentCache(self.directory, max_bytes=10)
+        self.assertEquals(9, cache.size)
+        self.assertEquals(2, len(cache))
+
+    def test_shared_directory(self):
+        first = ContentCache(self.directory, max_bytes=10)
+        second = ContentCache(self.directory, max_bytes=10)
+        self.store(first, 'a', 'aaaa')
+        old = time.time() - 60
+        os.utime(os.path.join(first._entry_dir('bucket', 'a'),
+                              hashlib.md5('aaaa').hexdigest()), (old, old))
+        self.store(second, 'b', 'bbbb')
+        # the entry of the other process is only seen by the next scan
+        self.assertEquals(4, second.size)
+        with patch('nos.client.cache.RESCAN_INTERVAL', 0):
+            self.store(second, 'c', 'cccc')
+        self.assertEquals(8, second.size)
+        self.assertEquals(None, first.get('bucket', 'a'))
+        self.assertEquals(hashlib.md5('bbbb').hexdigest(),
+                          first.get('bucket', 'b')['etag'])
+
+    def test_scan_only_over_budget(self):
+        cache = ContentCache(self.directory, max_bytes=10)
+        with patch.object(cache, '_load', wraps=cache._load) as load:
+            self.store(cache, 'a', 'aaaa')
+            self.store(cache, 'b', 'bbbb')
+            self.assertEquals(0, load.call_count)
+            self.store(cache, 'c', 'cccc')
+            self.assertEquals(1, load.call_count)
+        self.assertEquals(8, cache.size)
+
+    def test_get_object(self):
+        client = Client(transport_class=GetTransport,
+                        content_cache_dir=self.directory)
+        client.put_object('bucket', 'key', 'hello world')
+        resp = client.get_object('bucket', 'key')
+        self.assertEquals('req', resp['x_nos_request_id'])
+        self.assertEquals('hello', resp['body'].read(5))
+        self.assertEquals(' world', resp['body'].read(100))
+
+        resp = client.get_object('bucket', 'key')
+        self.assertEquals('req304', resp['x_nos_request_id'])
+        self.assertEquals(11, resp['content_length'])
+        self.assertEquals('hello world', resp['body'].read())
+        resp['body'].close()
+        self.assertEquals({'If-None-Match': '"%s"' % resp['etag']},
+                          client.transport.calls[-1][2])
+
+        client.get_object('bucket', 'key', range='bytes=0-1')
+        self.assertEquals({'Range': 'bytes=0-1'},
+                          client.transport.calls[-1][2])
+
+        client.put_object('bucket', 'key', 'changed')
+        self.assertEquals(0, len(client.content_cache))
+        resp = client.get_object('bucket', 'key')
+        resp['body'].close()
+        self.assertEquals(0, len(client.content_cache))
+
+        client.transport.objects.clear()
+        self.assertRaises(NotFoundError, client.get_object, 'bucket', 'key')
+
+    def tmp_files(self):
+        return [name for _, _, names in os.walk(self.directory)
+                for name in names if name.endswith('.tmp')]
+
+    def test_get_object_streamed(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}),
+                        content_cache_dir=self.directory)
+        client.put_object('bucket', 'key', 'hello\nworld')
+        body = client.get_object('bucket', 'key')['body']
+        self.assertEquals('hello\nworld', ''.join(body.stream(4)))
+        body.release_conn()
+        self.assertEquals(1, len(client.content_cache))
+
+        resp = client.get_object('bucket', 'key')
+        self.assertEquals(['hello\n', 'world'], list(resp['body']))
+        resp['body'].release_conn()
+        body = client.get_object('bucket', 'key')['body']
+        self.assertEquals('hello\nworld', ''.join(body.stream(4)))
+        body.release_conn()
+
+        client.put_object('bucket', 'key', 'a\nb')
+        body = client.get_object('bucket', 'key')['body']
+        self.assertEquals(['a\n', 'b'], list(body))
+        body.release_conn()
+        self.assertEquals(3, client.content_cache.size)
+
+        client.put_object('bucket', 'key', 'x' * 100)
+        body = client.get_object('bucket', 'key')['body']
+        next(body.stream(10))
+        body.release_conn()
+        self.assertEquals(0, len(client.content_cache))
+        self.assertEquals([], self.tmp_files())
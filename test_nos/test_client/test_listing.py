@@ -0,0 +1,182 @@
+# -*- coding:utf8 -*-
+
+from StringIO import StringIO
+from nos import Client
+import time
+from nos.client import listing
+from nos.emulator import Emulator, EmulatorConnection
+from nos.exceptions import ForbiddenError, XmlParseError
+
+from ..test_cases import TestCase
+
+
+class Body(StringIO):
+    """ Response body recording how its connection was given back. """
+    closed_early = False
+    released = False
+
+    def close(self):
+        self.closed_early = True
+
+    def release_conn(self):
+        self.released = True
+
+
+class PagedTransport(object):
+    def __init__(self, keys=(), page_size=2, next_marker=True, **kwargs):
+        self.keys = sorted(keys)
+        self.page_size = page_size
+        self.next_marker = next_marker
+        self.markers = []
+        self.bodies = []
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        marker = params.get('marker', '')
+        self.markers.append(marker)
+        if marker == 'forbidden':
+            raise ForbiddenError(403, 'Forbidden', '', '', '')
+        keys = [k for k in self.keys if k > marker]
+        page, rest = keys[:self.page_size], keys[self.page_size:]
+        xml = ['<ListBucketResult><IsTruncated>%s</IsTruncated>' %
+               str(bool(rest)).lower()]
+        if rest and self.next_marker:
+            xml.append('<NextMarker>%s</NextMarker>' % page[-1])
+        for k in page:
+            xml.append('<Contents><Key>%s</Key><Size>3</Size>'
+                       '<ETag>"e-%s"</ETag></Contents>' % (k, k))
+        xml.append('</ListBucketResult>')
+        self.bodies.append(Body(''.join(xml)))
+        return 200, {}, self.bodies[-1]
+
+
+class TestListing(TestCase):
+    def test_listing_stream(self):
+        body = StringIO(
+            '<ListBucketResult><IsTruncated>true</IsTruncated>'
+            '<Contents><Key>a/1</Key><Size>10</Size><Etag>x</Etag>'
+            '<LastModified>2016</LastModified></Contents>'
+            '<CommonPrefixes><Prefix>b/</Prefix></CommonPrefixes>'
+            '<NextMarker>b/</NextMarker>'
+            '</ListBucketResult>'
+        )
+        stream = listing.ListingStream(200, {}, body, listing.OBJECTS)
+        self.assertEquals([
+            {'key': 'a/1', 'size': 10, 'etag': 'x',
+             'last_modified': '2016', 'storage_class': ''},
+            {'prefix': 'b/'}
+        ], list(stream))
+        self.assertEquals({'IsTruncated': 'true', 'NextMarker': 'b/'},
+                          stream.info)
+        self.assertEquals('b/', listing.OBJECTS.next_marker(stream.info, 'a'))
+        self.assertEquals(None, listing.OBJECTS.next_marker({}, 'a'))
+
+    def test_listing_stream_parts(self):
+        body = StringIO(
+            '<ListPartsResult><Part><PartNumber>2</PartNumber>'
+            '<ETag>"e2"</ETag><Size>5</Size></Part></ListPartsResult>'
+        )
+        self.assertEquals(
+            [{'part_num': 2, 'etag': 'e2', 'size': 5, 'last_modified': ''}],
+            list(listing.ListingStream(200, {}, body, listing.PARTS))
+        )
+
+    def test_listing_stream_release(self):
+        xml = ('<ListPartsResult><Part><PartNumber>1</PartNumber></Part>'
+               '<Part><PartNumber>2</PartNumber></Part></ListPartsResult>')
+        body = Body(xml)
+        self.assertEquals(2, len(list(
+            listing.ListingStream(200, {}, body, listing.PARTS)
+        )))
+        self.assertTrue(body.released)
+        self.assertFalse(body.closed_early)
+
+        body = Body(xml)
+        entries = iter(listing.ListingStream(200, {}, body, listing.PARTS))
+        next(entries)
+        entries.close()
+        self.assertTrue(body.released)
+        self.assertTrue(body.closed_early)
+
+        body = Body(xml)
+        listing.ListingStream(200, {}, body, listing.PARTS).close()
+        self.assertTrue(body.closed_early)
+
+    def test_iter_multipart_uploads_markers(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}))
+        expected = []
+        for key in ['a', 'b', 'b', 'b', 'c']:
+            resp = client.create_multipart_upload('bucket', key)
+            expected.append((key, resp['response'].findtext('UploadId')))
+            # the uploads of a key are ordered by their initiation
+            time.sleep(0.001)
+        uploads = [(u['key'], u['upload_id']) for u in
+                   client.iter_multipart_uploads('bucket', limit=2)]
+        # the second page starts in the middle of the uploads of b
+        self.assertEquals(expected, uploads)
+
+        resp = client.list_multipart_uploads(
+            'bucket', key_marker='b', upload_id_marker=expected[2][1]
+        )['response']
+        self.assertEquals([i for _, i in expected[3:]],
+                          [e.text for e in resp.iter('UploadId')])
+        self.assertEquals(expected[3:], [
+            (u['key'], u['upload_id']) for u in
+            client.iter_multipart_uploads('bucket', key_marker='b',
+                                          upload_id_marker=expected[2][1])
+        ])
+        self.assertEquals(expected[4:], [
+            (u['key'], u['upload_id']) for u in
+            client.iter_multipart_uploads('bucket', key_marker='b')
+        ])
+
+    def test_listing_stream_error(self):
+        stream = listing.ListingStream(200, {}, StringIO('<a><b>'),
+                                       listing.UPLOADS)
+        self.assertRaises(XmlParseError, list, stream)
+
+    def test_list_objects_stream(self):
+        client = Client(transport_class=PagedTransport, keys=['a', 'b'])
+        resp = client.list_objects('bucket', stream=True)['response']
+        self.assertIsInstance(resp, listing.ListingStream)
+        self.assertEquals(['a', 'b'], [i['key'] for i in resp])
+
+    def test_iter_objects(self):
+        keys = ['k%02d' % i for i in xrange(7)]
+        client = Client(transport_class=PagedTransport, keys=keys)
+        objects = list(client.iter_objects('bucket', prefix='k'))
+        self.assertEquals(keys, [i['key'] for i in objects])
+        self.assertEquals('e-k03', objects[3]['etag'])
+        self.assertEquals(['', 'k01', 'k03', 'k05'],
+                          client.transport.markers)
+
+    def test_iter_objects_without_next_marker(self):
+        keys = ['k%02d' % i for i in xrange(5)]
+        client = Client(transport_class=PagedTransport, keys=keys,
+                        next_marker=False)
+        self.assertEquals(keys, [i['key'] for i in
+                                 client.iter_objects('bucket', limit=2)])
+
+    def test_iter_objects_stop_early(self):
+        # more keys than the prefetched entries, so that the producer can't
+        # reach the end of the listing
+        keys = ['k%04d' % i for i in xrange(3000)]
+        client = Client(transport_class=PagedTransport, keys=keys,
+                        page_size=500)
+        objects = client.iter_objects('bucket')
+        self.assertEquals('k0000', next(objects)['key'])
+        objects.close()
+        # the producer notices that the consumer is gone within 0.1 second
+        bodies = client.transport.bodies
+        for _ in xrange(50):
+            if bodies[-1].closed_early and bodies[-1].released:
+                break
+            time.sleep(0.01)
+        self.assertTrue(bodies[-1].closed_early)
+        self.assertTrue(all(b.released for b in bodies))
+
+    def test_iter_objects_error(self):
+        client = Client(transport_class=PagedTransport, keys=['a'])
+        self.assertRaises(ForbiddenError, list,
+                          client.iter_objects('bucket', marker='forbidden'))
@@ -2,6 +2,8 @@
 
 from datetime import datetime
 from StringIO import StringIO
+from mock import Mock, patch
+from nos import Client
 from ..test_cases import ClinetTestCase
 from nos.client.nos_client import parse_xml
 from nos.exceptions import XmlParseError, InvalidBucketName, InvalidObjectName
@@ -39,6 +41,9 @@ class TestClient(ClinetTestCase):
     def test_put_object(self):
         self.client.put_object('bucket', 'key', 'hello', storage_class='cheap')
         self.assert_url_called('PUT', 'bucket', 'key')
+        self.client.put_object('bucket', 'key', 'hello', content_md5='12345')
+        calls = self.assert_url_called('PUT', 'bucket', 'key', 2)
+        self.assertEquals({'Content-MD5': '12345'}, calls[1][2])
 
     def test_copy_object(self):
         self.client.copy_object('bucket', 'key2', 'bucket', 'key')
@@ -60,6 +65,24 @@ class TestClient(ClinetTestCase):
         self.assertRaises(InvalidObjectName, self.client.move_object,
                           'bucket', '', 'bucket', 'key')
 
+    @patch('time.time', Mock(return_value=1463990775.5))
+    def test_generate_presigned_url(self):
+        client = Client('id', 'secret', end_point='nos.netease.com')
+        url = client.generate_presigned_url('GET', u'bucket', u'key',
+                                            expires=60)
+        self.assertTrue(url.startswith(
+            'http://bucket.nos.netease.com/key?NOSAccessKeyId=id&'
+            'Expires=1463990835&Signature='
+        ))
+        self.assertEquals(
+            [url], client.generate_presigned_urls('GET', 'bucket', ['key'],
+                                                  expires=60)
+        )
+        self.assertRaises(InvalidBucketName, client.generate_presigned_url,
+                          'GET', '', 'key')
+        self.assertRaises(InvalidObjectName, client.generate_presigned_urls,
+                          'GET', 'bucket', ['key', ''])
+
     def test_create_multipart_upload(self):
         self.client.create_multipart_upload('bucket', 'key',
                                             storage_class='cheap')
@@ -68,6 +91,10 @@ class TestClient(ClinetTestCase):
     def test_upload_part(self):
         self.client.upload_part('bucket', 'key', 1, '21', 'hello')
         self.assert_url_called('PUT', 'bucket', 'key')
+        self.client.upload_part('bucket', 'key', 1, '21', 'hello',
+                                content_md5='12345')
+        calls = self.assert_url_called('PUT', 'bucket', 'key', 2)
+        self.assertEquals({'Content-MD5': '12345'}, calls[1][2])
 
     def test_complete_multipart_upload(self):
         self.client.complete_multipart_upload(
@@ -0,0 +1,509 @@
+# -*- coding:utf8 -*-
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from StringIO import StringIO
+from mock import Mock, patch
+from nos import Client
+from nos.client import transfer
+from nos.client.utils import MAX_OBJECT_SIZE
+from nos.emulator import Emulator, EmulatorConnection
+from nos.retry import RetryBudget, RetryPolicy
+from nos.exceptions import (ServiceException, ConnectionError,
+                            ForbiddenError, BadRequestError,
+                            FileChangedError, MultiObjectDeleteException)
+
+from ..test_cases import TestCase
+
+
+class MultipartTransport(object):
+    def __init__(self, failures=None, **kwargs):
+        self.failures = failures or {}
+        self.parts = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        with self.lock:
+            self.calls.append((method, bucket, key, dict(params),
+                               dict(headers), body))
+        resp = Mock()
+        h = {'x-nos-request-id': 'req', 'ETag': '"etag"'}
+        if 'partNumber' in params:
+            part_num = int(params['partNumber'])
+            with self.lock:
+                failures = self.failures.get(part_num)
+                if failures:
+                    raise failures.pop(0)
+                self.parts[part_num] = body
+            h['ETag'] = '"etag%s"' % part_num
+        elif 'uploads' in params:
+            resp.read = Mock(return_value=(
+                '<InitiateMultipartUploadResult><UploadId>up1</UploadId>'
+                '</InitiateMultipartUploadResult>'
+            ))
+        elif method == 'POST':
+            resp.read = Mock(return_value=(
+                '<CompleteMultipartUploadResult><ETag>"done"</ETag>'
+                '</CompleteMultipartUploadResult>'
+            ))
+        else:
+            resp.read = Mock(return_value='')
+        return 200, h, resp
+
+    def methods(self):
+        return [(c[0], sorted(c[3].keys())) for c in self.calls]
+
+
+class ObjectTransport(object):
+    def __init__(self, data='', failures=None, **kwargs):
+        self.data = data
+        self.etag = 'etag'
+        self.failures = failures or {}
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        h = {'x-nos-request-id': 'req', 'ETag': '"%s"' % self.etag,
+             'Content-Length': len(self.data)}
+        if method == 'HEAD':
+            return 200, h, None
+
+        data = self.data
+        if 'Range' in headers:
+            start, end = headers['Range'][len('bytes='):].split('-')
+            with self.lock:
+                self.ranges.append(int(start))
+                failures = self.failures.get(int(start))
+                if failures:
+                    raise failures.pop(0)
+            data = data[int(start):int(end) + 1]
+        h['Content-Length'] = len(data)
+        return 200, h, StringIO(data)
+
+
+class DeleteTransport(object):
+    def __init__(self, **kwargs):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def perform_request(self, method, bucket=None, key=None, params={},
+                        body=None, headers={}, timeout=None):
+        keys = re.findall('<Key>(.*?)</Key>', body)
+        with self.lock:
+            self.batches.append(keys)
+        errors = ''.join(
+            '<Error><Key>%s</Key><Code>AccessDenied</Code></Error>' % k
+            for k in keys if k.startswith('bad')
+        )
+        return 200, {}, StringIO('<DeleteResult>%s</DeleteResult>' % errors)
+
+
+class TestTransfer(TestCase):
+    def setUp(self):
+        super(TestTransfer, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        self.data = ''.join(chr(i % 256) for i in xrange(1000))
+        os.write(fd, self.data)
+        os.close(fd)
+        # no delay before the retries of the parts
+        self.backoff = patch('nos.client.transfer.PART_RETRY_BACKOFF', 0)
+        self.backoff.start()
+
+    def tearDown(self):
+        self.backoff.stop()
+        os.remove(self.path)
+        super(TestTransfer, self).tearDown()
+
+    def test_imap_parallel(self):
+        self.assertEquals(
+            range(0, 200, 2),
+            sorted(transfer.imap_parallel(lambda i: i * 2, xrange(100), 4))
+        )
+
+    def test_imap_parallel_error(self):
+        def func(i):
+            if i == 5:
+                raise KeyError(i)
+            return i
+        self.assertRaises(KeyError, list,
+                          transfer.imap_parallel(func, xrange(100), 3))
+
+    def test_call_with_retries(self):
+        budget = RetryBudget(capacity=2, refill_ratio=0)
+        client = Client(retry_policy=RetryPolicy(budget=budget))
+        with patch('nos.client.transfer.PART_RETRY_BACKOFF', 1):
+            policy = transfer.get_retry_policy(client, 5)
+        self.assertTrue(policy.budget is budget)
+        delays = []
+        policy.sleep = delays.append
+        errors = [ConnectionError('', ''),
+                  ServiceException(502, 'Bad Gateway', '', '', '')]
+
+        def func():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        self.assertEquals('ok', transfer.call_with_retries(policy, func, ''))
+        self.assertEquals(2, len(delays))
+        self.assertTrue(0 <= delays[0] <= 1 and 0 <= delays[1] <= 2)
+
+        # the budget of the transport is empty
+        errors.append(ConnectionError('', ''))
+        self.assertRaises(ConnectionError, transfer.call_with_retries,
+                          policy, func, '')
+        self.assertRaises(ForbiddenError, transfer.call_with_retries,
+                          policy, Mock(side_effect=ForbiddenError(
+                              403, 'Forbidden', '', '', '')), '')
+
+    def test_get_part_size(self):
+        self.assertEquals(10, transfer.get_part_size(100, 10))
+        self.assertEquals(2, transfer.get_part_size(10001, 1))
+        self.assertRaises(ValueError, transfer.get_part_size, 100, 0)
+        self.assertRaises(BadRequestError, transfer.get_part_size,
+                          100, MAX_OBJECT_SIZE + 1)
+
+    def test_upload_small_file(self):
+        client = Client(transport_class=MultipartTransport)
+        resp = client.upload_file('bucket', 'key', self.path)
+        self.assertEquals('etag', resp['etag'])
+        self.assertEquals([('PUT', [])], client.transport.methods())
+        self.assertEquals(self.data, str(client.transport.calls[0][5]))
+
+        client.upload_file('bucket', 'key', self.path, object_md5='12345')
+        self.assertEquals({'Content-MD5': '12345'},
+                          client.transport.calls[1][4])
+
+    def test_upload_multipart(self):
+        client = Client(transport_class=MultipartTransport)
+        resp = client.upload_file('bucket', 'key', self.path, part_size=128,
+                                  max_workers=3)
+        self.assertEquals('done', resp['etag'])
+        parts = client.transport.parts
+        self.assertEquals(range(1, 9), sorted(parts.keys()))
+        self.assertEquals(self.data, ''.join(str(parts[i]) for i in sorted(parts)))
+        methods = client.transport.methods()
+        self.assertEquals(('POST', ['uploads']), methods[0])
+        self.assertEquals(('POST', ['uploadId']), methods[-1])
+        self.assertEquals(hashlib.md5(self.data).hexdigest(),
+                          client.transport.calls[-1][4]['x-nos-Object-md5'])
+
+    def test_upload_multipart_retry_part(self):
+        client = Client(transport_class=MultipartTransport, failures={
+            2: [ConnectionError('', ''),
+                ServiceException(503, 'Service Unavailable', '', '', '')]
+        })
+        client.upload_file('bucket', 'key', self.path, part_size=128)
+        self.assertEquals(8, len(client.transport.parts))
+        self.assertEquals(10, len([
+            m for m in client.transport.methods()
+            if m == ('PUT', ['partNumber', 'uploadId'])
+        ]))
+
+    def test_upload_part_without_transport_retries(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}))
+        perform_request = EmulatorConnection.perform_request
+        sent = []
+
+        def fail_part(conn, method, url, *args, **kwargs):
+            if 'partNumber=2' in url:
+                sent.append(url)
+                raise ServiceException(503, 'Service Unavailable', '', '', '')
+            return perform_request(conn, method, url, *args, **kwargs)
+        with patch.object(EmulatorConnection, 'perform_request', fail_part):
+            self.assertRaises(ServiceException, client.upload_file,
+                              'bucket', 'key', self.path, part_size=128,
+                              part_retries=1)
+        self.assertEquals(2, len(sent))
+        self.assertEquals(2, client.transport.retry_policy.max_retries)
+
+    def test_upload_multipart_abort(self):
+        client = Client(transport_class=MultipartTransport, failures={
+            3: [ForbiddenError(403, 'Forbidden', '', '', '')]
+        })
+        self.assertRaises(ForbiddenError, client.upload_file,
+                          'bucket', 'key', self.path, part_size=128)
+        self.assertEquals(('DELETE', ['uploadId']),
+                          client.transport.methods()[-1])
+
+    def test_upload_truncated_file(self):
+        for use_mmap in (True, False):
+            client = Client(transport_class=MultipartTransport)
+            perform_request = client.transport.perform_request
+
+            def truncate(method, bucket=None, key=None, params={}, **kwargs):
+                if 'partNumber' in params:
+                    with open(self.path, 'r+b') as fp:
+                        fp.truncate(200)
+                return perform_request(method, bucket, key, params, **kwargs)
+            client.transport.perform_request = truncate
+            self.assertRaises(FileChangedError, client.upload_file,
+                              'bucket', 'key', self.path, part_size=128,
+                              max_workers=2, use_mmap=use_mmap)
+            self.assertEquals(('DELETE', ['uploadId']),
+                              client.transport.methods()[-1])
+            with open(self.path, 'wb') as fp:
+                fp.write(self.data)
+
+        client = Client(transport_class=MultipartTransport)
+        client.upload_file('bucket', 'key', self.path, part_size=128,
+                           use_mmap=False)
+        parts = client.transport.parts
+        self.assertEquals(self.data, ''.join(parts[i] for i in sorted(parts)))
+
+    def test_upload_checkpoint_resume(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}))
+        checkpoint = self.path + '.checkpoint'
+        upload_part = client.upload_part
+        sent = []
+
+        def crash(bucket, key, part_num, upload_id, data):
+            if part_num == 3:
+                raise ForbiddenError(403, 'Forbidden', '', '', '')
+            return upload_part(bucket, key, part_num, upload_id, data)
+
+        with patch.object(client, 'upload_part', side_effect=crash):
+            self.assertRaises(ForbiddenError, client.upload_file, 'bucket',
+                              'key', self.path, part_size=128, max_workers=1,
+                              checkpoint=checkpoint)
+        with open(checkpoint) as fp:
+            state = json.load(fp)
+        self.assertEquals(128, state['part_size'])
+        self.assertEquals(['1', '2'], sorted(state['parts']))
+        self.assertEquals(1, len(list(
+            client.iter_multipart_uploads('bucket')
+        )))
+
+        def count(bucket, key, part_num, upload_id, data):
+            sent.append(part_num)
+            return upload_part(bucket, key, part_num, upload_id, data)
+
+        # the part size of the checkpoint wins over the new one
+        with patch.object(client, 'upload_part', side_effect=count):
+            resp = client.upload_file('bucket', 'key', self.path,
+                                      part_size=256, checkpoint=checkpoint)
+        self.assertEquals(range(3, 9), sorted(sent))
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertEquals(resp['etag'],
+                          client.head_object('bucket', 'key')['etag'])
+        self.assertEquals(self.data,
+                          client.get_object('bucket', 'key')['body'].read())
+        self.assertEquals([], list(client.iter_multipart_uploads('bucket')))
+
+    def test_upload_checkpoint_stale(self):
+        client = Client('id', 'secret', connection_class=EmulatorConnection,
+                        emulator=Emulator({'id': 'secret'}))
+        checkpoint = self.path + '.checkpoint'
+        upload_part = client.upload_part
+
+        def crash(bucket, key, part_num, upload_id, data):
+            if part_num == 2:
+                raise ForbiddenError(403, 'Forbidden', '', '', '')
+            return upload_part(bucket, key, part_num, upload_id, data)
+
+        with patch.object(client, 'upload_part', side_effect=crash):
+            self.assertRaises(ForbiddenError, client.upload_file, 'bucket',
+                              'key', self.path, part_size=128, max_workers=1,
+                              checkpoint=checkpoint)
+        with open(checkpoint) as fp:
+            old_upload_id = json.load(fp)['upload_id']
+
+        # the file changed: its upload is aborted and a new one started
+        self.data = self.data[::-1]
+        with open(self.path, 'wb') as fp:
+            fp.write(self.data)
+        os.utime(self.path, (0, 0))
+        client.upload_file('bucket', 'key', self.path, part_size=128,
+                           checkpoint=checkpoint)
+        self.assertEquals(self.data,
+                          client.get_object('bucket', 'key')['body'].read())
+        self.assertEquals([], list(client.iter_multipart_uploads('bucket')))
+
+        # the upload of a checkpoint vanished on NOS: a new one is started
+        with patch.object(client, 'upload_part', side_effect=crash):
+            self.assertRaises(ForbiddenError, client.upload_file, 'bucket',
+                              'key', self.path, part_size=128, max_workers=1,
+                              checkpoint=checkpoint)
+        with open(checkpoint) as fp:
+            upload_id = json.load(fp)['upload_id']
+        self.assertNotEquals(old_upload_id, upload_id)
+        client.abort_multipart_upload('bucket', 'key', upload_id)
+        client.upload_file('bucket', 'key', self.path, part_size=128,
+                           checkpoint=checkpoint)
+        self.assertEquals(self.data,
+                          client.get_object('bucket', 'key')['body'].read())
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_iter_stream_parts(self):
+        chunks = ['ab', u'c', 'defgh', bytearray('ij'), '']
+        self.assertEquals([(1, 'abcd'), (2, 'efgh'), (3, 'ij')],
+                          list(transfer.iter_stream_parts(chunks, 4)))
+        md5 = hashlib.md5()
+        self.assertEquals(
+            [(1, self.data[:400]), (2, self.data[400:800]),
+             (3, self.data[800:])],
+            list(transfer.iter_stream_parts(StringIO(self.data), 400, md5))
+        )
+        self.assertEquals(hashlib.md5(self.data).hexdigest(), md5.hexdigest())
+        self.assertEquals([(1, '')],
+                          list(transfer.iter_stream_parts(iter([]), 4)))
+        self.assertEquals([(1, 'abcd')],
+                          list(transfer.iter_stream_parts(['abcd'], 4)))
+
+        # chunks spanning several parts, with a tail carried over
+        chunks = [self.data[:10], self.data[10:950], self.data[950:]]
+        parts = list(transfer.iter_stream_parts(chunks, 128))
+        self.assertEquals(range(1, 9), [p[0] for p in parts])
+        self.assertEquals([128] * 7 + [104], [len(p[1]) for p in parts])
+        self.assertEquals(self.data, ''.join(p[1] for p in parts))
+
+    def test_put_stream(self):
+        client = Client(transport_class=MultipartTransport)
+        client.put_stream('bucket', 'key', iter([self.data[:10]]),
+                          meta_data={'x-nos-meta-a': 'b'})
+        self.assertEquals([('PUT', [])], client.transport.methods())
+        self.assertEquals(hashlib.md5(self.data[:10]).hexdigest(),
+                          client.transport.calls[0][4]['Content-MD5'])
+
+        client = Client(transport_class=MultipartTransport)
+        resp = client.put_stream('bucket', 'key', StringIO(self.data),
+                                 part_size=128, max_workers=3)
+        self.assertEquals('done', resp['etag'])
+        parts = client.transport.parts
+        self.assertEquals(self.data, ''.join(parts[i] for i in sorted(parts)))
+        self.assertEquals(hashlib.md5(self.data).hexdigest(),
+                          client.transport.calls[-1][4]['x-nos-Object-md5'])
+
+    def test_put_stream_errors(self):
+        def source():
+            yield self.data
+            raise IOError('broken pipe')
+        client = Client(transport_class=MultipartTransport)
+        self.assertRaises(IOError, client.put_stream, 'bucket', 'key',
+                          source(), part_size=128)
+        self.assertEquals(('DELETE', ['uploadId']),
+                          client.transport.methods()[-1])
+
+        client = Client(transport_class=MultipartTransport)
+        with patch('nos.client.transfer.MAX_PART_NUM', 3):
+            self.assertRaises(BadRequestError, client.put_stream, 'bucket',
+                              'key', iter([self.data]), part_size=128)
+        self.assertEquals(('DELETE', ['uploadId']),
+                          client.transport.methods()[-1])
+
+    def test_iter_ranges(self):
+        self.assertEquals([(0, 3), (4, 7), (8, 9)],
+                          list(transfer.iter_ranges(10, 4)))
+        self.assertEquals([], list(transfer.iter_ranges(0, 4)))
+
+    def test_download_small_file(self):
+        client = Client(transport_class=ObjectTransport, data=self.data)
+        resp = client.download_file('bucket', 'key', self.path + '.down')
+        self.assertEquals(1000, resp['content_length'])
+        with open(self.path + '.down', 'rb') as fp:
+            self.assertEquals(self.data, fp.read())
+        os.remove(self.path + '.down')
+        self.assertEquals([], client.transport.ranges)
+
+    def test_download_ranges(self):
+        client = Client(transport_class=ObjectTransport, data=self.data,
+                        failures={256: [ConnectionError('', '')]})
+        client.download_file('bucket', 'key', self.path + '.down',
+                             part_size=128, max_workers=3)
+        with open(self.path + '.down', 'rb') as fp:
+            self.assertEquals(self.data, fp.read())
+        os.remove(self.path + '.down')
+        self.assertEquals(sorted(range(0, 1000, 128) + [256]),
+                          sorted(client.transport.ranges))
+
+    def test_download_error_removes_file(self):
+        client = Client(transport_class=ObjectTransport, data=self.data,
+                        failures={384: [ForbiddenError(403, 'Forbidden',
+                                                       '', '', '')]})
+        self.assertRaises(ForbiddenError, client.download_file,
+                          'bucket', 'key', self.path + '.down', part_size=128)
+        self.assertFalse(os.path.exists(self.path + '.down'))
+
+    def test_download_checkpoint_resume(self):
+        client = Client(transport_class=ObjectTransport, data=self.data,
+                        failures={384: [ConnectionError('', '')] * 2})
+        path = self.path + '.down'
+        checkpoint = path + '.checkpoint'
+        self.assertRaises(ConnectionError, client.download_file, 'bucket',
+                          'key', path, part_size=128, max_workers=1,
+                          part_retries=1, checkpoint=checkpoint)
+        self.assertEquals(1000, os.path.getsize(path))
+        with open(checkpoint) as fp:
+            state = json.load(fp)
+        self.assertEquals('etag', state['etag'])
+        self.assertEquals({'1': [0, 127], '2': [128, 255], '3': [256, 383]},
+                          state['parts'])
+
+        # the part size of the checkpoint wins over the new one
+        client.transport.ranges = []
+        client.download_file('bucket', 'key', path, part_size=256,
+                             checkpoint=checkpoint)
+        self.assertEquals(range(384, 1000, 128),
+                          sorted(client.transport.ranges))
+        with open(path, 'rb') as fp:
+            self.assertEquals(self.data, fp.read())
+        self.assertFalse(os.path.exists(checkpoint))
+        os.remove(path)
+
+    def test_download_checkpoint_changed(self):
+        client = Client(transport_class=ObjectTransport, data=self.data,
+                        failures={384: [ForbiddenError(403, 'Forbidden',
+                                                       '', '', '')]})
+        path = self.path + '.down'
+        checkpoint = path + '.checkpoint'
+        self.assertRaises(ForbiddenError, client.download_file, 'bucket',
+                          'key', path, part_size=128, max_workers=1,
+                          checkpoint=checkpoint)
+
+        # the object changed: every range is fetched again
+        client.transport.data = self.data = self.data[::-1]
+        client.transport.etag = 'new'
+        client.transport.ranges = []
+        client.download_file('bucket', 'key', path, part_size=128,
+                             checkpoint=checkpoint)
+        self.assertEquals(range(0, 1000, 128),
+                          sorted(client.transport.ranges))
+        with open(path, 'rb') as fp:
+            self.assertEquals(self.data, fp.read())
+        self.assertFalse(os.path.exists(checkpoint))
+        os.remove(path)
+
+    def test_iter_batches(self):
+        self.assertEquals([[0, 1, 2], [3, 4, 5], [6]],
+                          list(transfer.iter_batches(iter(xrange(7)), 3)))
+
+    def test_delete_many(self):
+        client = Client(transport_class=DeleteTransport)
+        keys = ('key%04d' % i for i in xrange(2500))
+        self.assertEquals({'deleted': 2500},
+                          client.delete_many('bucket', keys))
+        self.assertEquals([500, 1000, 1000],
+                          sorted(len(i) for i in client.transport.batches))
+
+    def test_delete_many_errors(self):
+        client = Client(transport_class=DeleteTransport)
+        keys = ['bad%d' % i if i % 10 == 0 else 'key%d' % i
+                for i in xrange(100)]
+        try:
+            client.delete_many('bucket', keys, batch_size=7, max_workers=4)
+        except MultiObjectDeleteException as e:
+            self.assertEquals(sorted(k for k in keys if k.startswith('bad')),
+                              sorted(i['key'] for i in e.errors))
+        else:
+            self.fail('MultiObjectDeleteException not raised')
+        self.assertEquals(15, len(client.transport.batches))
+        self.assertRaises(ValueError, client.delete_many, 'bucket', keys,
+                          batch_size=1001)
@@ -1,14 +1,35 @@
 # -*- coding:utf8 -*-
 
+import threading
+import BaseHTTPServer
+import SocketServer
 from mock import Mock, patch
 import urllib3
 from urllib3.exceptions import ReadTimeoutError
-from nos.exceptions import ConnectionTimeout, ConnectionError, BadRequestError
-from nos.connection import Urllib3HttpConnection
+from nos.exceptions import (ConnectionTimeout, ConnectionError,
+                            BadRequestError, ServiceUnavailableError)
+from nos.connection import Urllib3HttpConnection, parse_retry_after
 
 from .test_cases import TestCase
 
 
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
 class TestUrllib3Connection(TestCase):
     def _get_mock_connection(self, connection_params={},
                              status_code=200, response_body='{}'):
@@ -37,6 +58,12 @@ class TestUrllib3Connection(TestCase):
         Urllib3HttpConnection(num_pools=1)
         mock_pool_manager.assert_called_once_with(num_pools=1)
 
+    @patch('urllib3.PoolManager')
+    def test_pool_size(self, mock_pool_manager):
+        Urllib3HttpConnection(maxsize=32, block=True)
+        mock_pool_manager.assert_called_once_with(num_pools=16, maxsize=32,
+                                                  block=True)
+
     def test_pool(self):
         con = Urllib3HttpConnection()
         self.assertIsInstance(con.pool, urllib3.poolmanager.PoolManager)
@@ -66,6 +93,31 @@ class TestUrllib3Connection(TestCase):
         con.perform_request('GET', '/')
         mock_raise_error.assert_called_once()
 
+    def test_parse_retry_after(self):
+        self.assertEquals(None, parse_retry_after(None))
+        self.assertEquals(None, parse_retry_after('soon'))
+        self.assertEquals(120, parse_retry_after('120'))
+        with patch('time.time', Mock(return_value=1463990830)):
+            self.assertEquals(
+                5, parse_retry_after('Mon, 23 May 2016 08:07:15 GMT')
+            )
+
+    def test_raise_error_retry_after(self):
+        response = Mock()
+        response.status = 503
+        response.reason = 'Service Unavailable'
+        response.getheader = Mock(side_effect=lambda name, default=None: {
+            'Retry-After': '3'
+        }.get(name, default))
+        response.read = Mock(return_value='')
+        con = Urllib3HttpConnection()
+        try:
+            con._raise_error(response)
+        except ServiceUnavailableError as e:
+            self.assertEquals(3, e.retry_after)
+        else:
+            self.fail('ServiceUnavailableError not raised')
+
     def test_raise_error_with_no_data(self):
         response = Mock()
         response.status = 400
@@ -91,3 +143,59 @@ class TestUrllib3Connection(TestCase):
 ''')
         con = Urllib3HttpConnection()
         self.assertRaises(BadRequestError, con._raise_error, response)
+
+
+class TestPoolStats(TestCase):
+    def setUp(self):
+        super(TestPoolStats, self).setUp()
+        self.server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        t = threading.Thread(target=self.server.serve_forever,
+                             args=(0.05, ))
+        t.daemon = True
+        t.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(TestPoolStats, self).tearDown()
+
+    def get(self, con):
+        _, _, resp = con.perform_request('GET', self.url)
+        self.assertEquals('ok', resp.read())
+        resp.release_conn()
+
+    def test_reuse(self):
+        con = Urllib3HttpConnection()
+        for _ in xrange(3):
+            self.get(con)
+        stats = con.stats.snapshot()
+        self.assertEquals((1, 2, 0), (stats['created'], stats['reused'],
+                                      stats['discarded']))
+
+    def test_idle_timeout(self):
+        con = Urllib3HttpConnection(idle_timeout=10)
+        self.get(con)
+        with patch('time.time', Mock(return_value=1e10)):
+            self.get(con)
+        stats = con.stats.snapshot()
+        self.assertEquals((2, 0, 1), (stats['created'], stats['reused'],
+                                      stats['discarded']))
+
+    def test_prewarm(self):
+        con = Urllib3HttpConnection(maxsize=3)
+        con.prewarm(self.url, 5)
+        self.assertEquals(3, con.stats.created)
+        for _ in xrange(3):
+            self.get(con)
+        self.assertEquals(3, con.stats.created)
+        self.assertEquals(3, con.stats.reused)
+
+    def test_discard_when_full(self):
+        con = Urllib3HttpConnection(maxsize=1)
+        pool = con.pool.connection_from_url(self.url)
+        conns = [pool._get_conn(), pool._get_conn()]
+        for conn in conns:
+            pool._put_conn(conn)
+        stats = con.stats.snapshot()
+        self.assertEquals((2, 1), (stats['created'], stats['discarded']))
@@ -0,0 +1,185 @@
+# -*- coding:utf8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+from mock import Mock, patch
+from nos import Client
+from nos.emulator import Emulator, EmulatorConnection
+from nos.exceptions import (NotFoundError, ForbiddenError, BadRequestError,
+                            NotModifiedError, ServiceException,
+                            MultiObjectDeleteException)
+
+from .test_cases import TestCase
+
+
+class TestEmulator(TestCase):
+    def setUp(self):
+        super(TestEmulator, self).setUp()
+        self.emulator = Emulator(credentials={'id': 'secret'})
+        self.client = self.get_client()
+
+    def get_client(self, secret='secret', **kwargs):
+        return Client('id', secret, connection_class=EmulatorConnection,
+                      emulator=self.emulator, **kwargs)
+
+    def test_objects(self):
+        client = self.client
+        resp = client.put_object('bucket', u'dir/中文 key', 'hello world',
+                                 meta_data={'x-nos-meta-a': 'b'})
+        self.assertEquals(hashlib.md5('hello world').hexdigest(),
+                          resp['etag'])
+
+        info = client.head_object('bucket', u'dir/中文 key')
+        self.assertEquals(11, info['content_length'])
+        self.assertEquals(resp['etag'], info['etag'])
+
+        resp = client.get_object('bucket', u'dir/中文 key')
+        self.assertEquals('hello world', resp['body'].read())
+        resp = client.get_object('bucket', u'dir/中文 key', range='bytes=6-')
+        self.assertEquals('world', resp['body'].read())
+        self.assertEquals('bytes 6-10/11', resp['content_range'])
+        resp = client.get_object('bucket', u'dir/中文 key', range='bytes=-3')
+        self.assertEquals('rld', resp['body'].read())
+        self.assertRaises(ServiceException, client.get_object, 'bucket',
+                          u'dir/中文 key', range='bytes=20-')
+        self.assertRaises(NotModifiedError, client.transport.perform_request,
+                          'GET', 'bucket', 'dir/中文 key',
+                          headers={'If-None-Match': '"%s"' % info['etag']})
+
+        client.copy_object('bucket', u'dir/中文 key', 'other', 'copy')
+        client.move_object('other', 'copy', 'other', 'moved')
+        self.assertEquals('hello world',
+                          client.get_object('other', 'moved')['body'].read())
+        self.assertRaises(NotFoundError, client.head_object, 'other', 'copy')
+
+        client.delete_object('other', 'moved')
+        self.assertRaises(NotFoundError, client.get_object, 'other', 'moved')
+        self.assertRaises(BadRequestError, client.put_object, 'bucket', 'k',
+                          'data', content_md5='0' * 32)
+
+    def test_listing(self):
+        client = self.client
+        for key in ('a', 'b/1', 'b/2', 'c/1', 'd'):
+            client.put_object('bucket', key, key)
+
+        self.assertEquals(
+            ['a', 'b/', 'c/', 'd'],
+            [o.get('key', o.get('prefix')) for o in client.iter_objects(
+                'bucket', delimiter='/', limit=2
+            )]
+        )
+        self.assertEquals(
+            ['b/2'],
+            [o['key'] for o in client.iter_objects('bucket', prefix='b/',
+                                                   marker='b/1')]
+        )
+
+        client.delete_many('bucket', ['a', 'b/1'], batch_size=1)
+        self.assertRaises(MultiObjectDeleteException, client.delete_objects,
+                          'bucket', ['a', 'd'])
+        self.assertEquals(['b/2', 'c/1'],
+                          [o['key'] for o in client.iter_objects('bucket')])
+
+    def test_listing_unicode_keys(self):
+        client = self.client
+        for key in (u'中文/1', u'中文/2', 'd'):
+            client.put_object('bucket', key, 'data')
+        self.assertEquals(
+            [u'中文/1', u'中文/2'],
+            [o['key'] for o in client.iter_objects('bucket', prefix=u'中文/',
+                                                   limit=1)]
+        )
+        self.assertEquals(
+            ['d', u'中文/'],
+            [o.get('key', o.get('prefix')) for o in client.iter_objects(
+                'bucket', delimiter='/'
+            )]
+        )
+
+        client.delete_objects('bucket', [u'中文/1', 'd'])
+        self.assertRaises(MultiObjectDeleteException, client.delete_objects,
+                          'bucket', [u'中文/1', u'中文/2'])
+        self.assertEquals([], [o for o in client.iter_objects('bucket')])
+
+    def test_multipart(self):
+        client = self.client
+        upload_id = client.create_multipart_upload(
+            'bucket', 'big', meta_data={'x-nos-meta-a': 'b'}
+        )['response'].findtext('UploadId')
+        info = []
+        for part_num, data in ((1, 'aaa'), (2, 'bbb'), (3, 'ccc')):
+            resp = client.upload_part('bucket', 'big', part_num, upload_id,
+                                      data)
+            info.append({'part_num': part_num, 'etag': resp['etag']})
+
+        self.assertEquals([1, 2, 3], [p['part_num'] for p in client.iter_parts(
+            'bucket', 'big', upload_id, limit=2
+        )])
+        uploads = client.iter_multipart_uploads('bucket')
+        self.assertEquals([upload_id], [u['upload_id'] for u in uploads])
+        self.assertRaises(BadRequestError, client.complete_multipart_upload,
+                          'bucket', 'big', upload_id, info[::-1])
+        self.assertRaises(BadRequestError, client.complete_multipart_upload,
+                          'bucket', 'big', upload_id, info, object_md5='0')
+
+        client.complete_multipart_upload(
+            'bucket', 'big', upload_id, info,
+            object_md5=hashlib.md5('aaabbbccc').hexdigest()
+        )
+        self.assertEquals('aaabbbccc',
+                          client.get_object('bucket', 'big')['body'].read())
+        self.assertRaises(NotFoundError, client.abort_multipart_upload,
+                          'bucket', 'big', upload_id)
+        self.assertEquals([], list(client.iter_multipart_uploads('bucket')))
+
+    def test_transfer(self):
+        directory = tempfile.mkdtemp()
+        try:
+            source = os.path.join(directory, 'source')
+            with open(source, 'wb') as fp:
+                fp.write(os.urandom(1000))
+            self.client.upload_file('bucket', 'file', source, part_size=300)
+            target = os.path.join(directory, 'target')
+            self.client.download_file('bucket', 'file', target, part_size=300)
+            with open(source, 'rb') as a, open(target, 'rb') as b:
+                self.assertEquals(a.read(), b.read())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_signature(self):
+        self.client.put_object('bucket', 'key', 'data')
+        self.assertRaises(ForbiddenError, self.get_client('wrong').head_object,
+                          'bucket', 'key')
+        self.assertRaises(ForbiddenError, Client(
+            connection_class=EmulatorConnection, emulator=self.emulator
+        ).head_object, 'bucket', 'key')
+
+        with patch('time.time', Mock(return_value=1000.0)):
+            url = self.client.generate_presigned_url('GET', 'bucket', 'key',
+                                                     expires=60)
+            resp = self.emulator.urlopen('GET', url)
+            self.assertEquals((200, 'data'), (resp.status, resp.read()))
+            resp = self.emulator.urlopen('GET', url.replace('key?', 'kez?'))
+            self.assertEquals(403, resp.status)
+        with patch('time.time', Mock(return_value=1061.0)):
+            resp = self.emulator.urlopen('GET', url)
+        self.assertEquals(403, resp.status)
+
+    def test_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.emulator = Emulator(directory=directory)
+            self.get_client().put_object('bucket', 'key', 'data')
+            self.get_client().put_object('bucket', 'gone', 'data')
+            self.get_client().delete_object('bucket', 'gone')
+
+            self.emulator = Emulator(directory=directory)
+            client = self.get_client()
+            self.assertEquals(['key'], [o['key'] for o in
+                                        client.iter_objects('bucket')])
+            resp = client.get_object('bucket', 'key')
+            self.assertEquals('data', resp['body'].read())
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,68 @@
+# -*- coding:utf8 -*-
+
+import sys
+from nos.futures import ThreadedClient, Future
+from nos.exceptions import InvalidBucketName
+
+from .test_cases import TestCase, DummyTransport
+
+
+class TestFuture(TestCase):
+    def test_result(self):
+        future = Future()
+        self.assertFalse(future.done())
+        self.assertFalse(future.wait(0))
+        called = []
+        future.add_done_callback(called.append)
+        future._set(1, None)
+        self.assertTrue(future.done())
+        self.assertEquals(1, future.result())
+        self.assertEquals(None, future.exception())
+        self.assertEquals([future], called)
+        future.add_done_callback(called.append)
+        self.assertEquals([future, future], called)
+
+    def test_exception(self):
+        future = Future()
+        try:
+            raise KeyError('key')
+        except KeyError:
+            future._set(None, sys.exc_info())
+        self.assertRaises(KeyError, future.result)
+        self.assertIsInstance(future.exception(), KeyError)
+
+    def test_timeout(self):
+        future = Future()
+        self.assertRaises(RuntimeError, future.result, 0.01)
+        self.assertRaises(RuntimeError, future.exception, 0.01)
+
+
+class TestThreadedClient(TestCase):
+    def setUp(self):
+        super(TestThreadedClient, self).setUp()
+        self.client = ThreadedClient(transport_class=DummyTransport,
+                                  max_workers=4)
+
+    def tearDown(self):
+        self.client.close()
+        super(TestThreadedClient, self).tearDown()
+
+    def test_operations(self):
+        futures = [self.client.head_object('bucket', 'key%s' % i)
+                   for i in xrange(20)]
+        futures.append(self.client.delete_object('bucket', 'key'))
+        futures.append(self.client.list_objects('bucket', limit=10))
+        for f in futures:
+            f.result()
+        self.assertEquals(22, self.client.client.transport.call_count)
+        self.assertTrue(len(self.client._threads) <= 4)
+
+    def test_error(self):
+        future = self.client.copy_object('', 'key', 'bucket', 'key')
+        self.assertRaises(InvalidBucketName, future.result)
+
+    def test_close(self):
+        with ThreadedClient(transport_class=DummyTransport) as client:
+            future = client.put_object('bucket', 'key', 'hello')
+        self.assertTrue(future.done())
+        self.assertRaises(RuntimeError, client.head_object, 'bucket', 'key')
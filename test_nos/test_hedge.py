@@ -0,0 +1,107 @@
+# -*- coding:utf8 -*-
+
+import threading
+import time
+from mock import Mock
+from nos.hedge import HedgePolicy, LatencyTracker
+from nos.retry import RetryBudget
+from nos.transport import Transport
+from nos.exceptions import NotFoundError
+
+from .test_cases import TestCase
+
+
+class SlowSend(object):
+    """ First call answers after `first_delay`, the next ones at once. """
+    def __init__(self, first_delay):
+        self.first_delay = first_delay
+        self.calls = 0
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            time.sleep(self.first_delay)
+        body = Mock()
+        self.bodies.append(body)
+        return 200, {'call': call}, body
+
+
+class TestHedgePolicy(TestCase):
+    def test_fast_request_not_hedged(self):
+        policy = HedgePolicy(delay=1)
+        send = SlowSend(0)
+        self.assertEquals({'call': 1}, policy.perform(send)[1])
+        self.assertEquals((1, 0), (send.calls, policy.hedged))
+        self.assertEquals(1, len(policy.latencies))
+
+    def test_slow_request_hedged(self):
+        policy = HedgePolicy(delay=0.01)
+        send = SlowSend(0.3)
+        self.assertEquals({'call': 2}, policy.perform(send)[1])
+        self.assertEquals((1, 1), (policy.hedged, policy.hedge_wins))
+        time.sleep(0.5)
+        send.bodies[-1].close.assert_called_once_with()
+
+    def test_budget(self):
+        policy = HedgePolicy(delay=0.01, budget=RetryBudget(1, 0))
+        policy.perform(SlowSend(0.05))
+        send = SlowSend(0.05)
+        self.assertEquals({'call': 1}, policy.perform(send)[1])
+        self.assertEquals((1, 1), (send.calls, policy.hedged))
+
+    def test_threads_reused(self):
+        policy = HedgePolicy(delay=1)
+        for i in xrange(5):
+            policy.perform(SlowSend(0))
+            time.sleep(0.01)
+        self.assertEquals(1, policy._workers.started)
+
+    def test_empty_budget_on_calling_thread(self):
+        policy = HedgePolicy(delay=0.01, budget=RetryBudget(1, 0))
+        policy.budget.acquire()
+        threads = []
+
+        def send():
+            threads.append(threading.current_thread())
+            return 200, {}, None
+        policy.perform(send)
+        self.assertEquals([threading.current_thread()], threads)
+        self.assertEquals(0, policy._workers.started)
+
+    def test_error(self):
+        policy = HedgePolicy(delay=0.01)
+
+        def send():
+            raise NotFoundError(404, '', '', '', '')
+        self.assertRaises(NotFoundError, policy.perform, send)
+
+    def test_percentile_delay(self):
+        policy = HedgePolicy(delay=1, percentile=90, min_samples=10)
+        for i in xrange(9):
+            policy.latencies.add(i * 0.01)
+        self.assertEquals(1, policy.get_delay())
+        policy.latencies.add(0.09)
+        self.assertEquals(0.09, policy.get_delay())
+
+    def test_latency_tracker(self):
+        tracker = LatencyTracker(size=3)
+        self.assertEquals(None, tracker.percentile(50))
+        for i in xrange(5):
+            tracker.add(i)
+        self.assertEquals(3, len(tracker))
+        self.assertEquals(3, tracker.percentile(50))
+
+    def test_transport(self):
+        policy = HedgePolicy(delay=0.01)
+        transport = Transport(hedge_policy=policy)
+        transport.connection.perform_request = SlowSend(0.3)
+        self.assertEquals({'call': 2},
+                          transport.perform_request('GET', 'bucket', 'key')[1])
+        transport.connection.perform_request = SlowSend(0.1)
+        transport.perform_request('PUT', 'bucket', 'key', body='data')
+        transport.perform_request('GET', 'bucket')
+        self.assertEquals(1, policy.hedged)
@@ -0,0 +1,105 @@
+# -*- coding:utf8 -*-
+
+from StringIO import StringIO
+from mock import Mock
+from nos.exceptions import ServiceUnavailableError, NotFoundError
+from nos.hooks import Hooks
+from nos.retry import RetryPolicy
+from nos.transport import Transport
+
+from .test_cases import TestCase
+
+
+class StreamBody(StringIO):
+    def stream(self, amt=2 ** 16):
+        for data in iter(lambda: self.read(amt), ''):
+            yield data
+
+
+class TestHooks(TestCase):
+    def test_registration(self):
+        hooks = Hooks()
+        callback = Mock()
+        self.assertFalse(hooks.active)
+        hooks.add('before_send', callback)
+        self.assertTrue(hooks.active)
+        self.assertTrue(hooks.has('before_send'))
+        hooks.fire('before_send', 'request')
+        callback.assert_called_once_with('request')
+        hooks.remove('before_send', callback)
+        self.assertFalse(hooks.active)
+        self.assertRaises(ValueError, hooks.add, 'after_everything', callback)
+
+    def test_lifecycle(self):
+        events = []
+        transport = Transport(retry_policy=RetryPolicy(sleep=Mock()))
+        transport.connection.perform_request = Mock(side_effect=[
+            ServiceUnavailableError(503, '', '', '', ''),
+            (200, {'ETag': '"etag"'}, StringIO('hello'))
+        ])
+
+        def record(event):
+            def callback(request):
+                events.append((event, request.attempt, request.status,
+                               request.received))
+            return callback
+        for event in ('before_sign', 'before_send', 'after_headers',
+                      'after_body', 'on_retry', 'on_error'):
+            transport.hooks.add(event, record(event))
+
+        def add_header(request):
+            request.headers = dict(request.headers, **{'x-nos-trace': '1'})
+        transport.hooks.add('before_sign', add_header)
+
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals('hello', body.read())
+        self.assertEquals([
+            ('before_sign', 0, None, 0),
+            ('before_send', 1, None, 0),
+            ('on_retry', 1, None, 0),
+            ('before_send', 2, None, 0),
+            ('after_headers', 2, 200, 0),
+            ('after_body', 2, 200, 5),
+        ], events)
+        self.assertEquals(
+            '1', transport.connection.perform_request.call_args[0][3][
+                'x-nos-trace'
+            ]
+        )
+
+        del events[:]
+        transport.connection.perform_request = Mock(
+            side_effect=NotFoundError(404, '', '', '', '')
+        )
+        self.assertRaises(NotFoundError, transport.perform_request,
+                          'HEAD', 'bucket', 'key')
+        self.assertEquals('on_error', events[-1][0])
+
+    def test_short_circuit(self):
+        transport = Transport()
+        transport.connection.perform_request = Mock()
+
+        def cached(request):
+            request.response = (200, {}, StringIO('cached'))
+        transport.hooks.add('before_send', cached)
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals('cached', body.read())
+        self.assertFalse(transport.connection.perform_request.called)
+
+    def test_after_body_streamed(self):
+        received = []
+        transport = Transport()
+        transport.hooks.add('after_body',
+                            lambda request: received.append(request.received))
+        transport.connection.perform_request = Mock(
+            return_value=(200, {}, StreamBody('hello world'))
+        )
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals(['hello', ' worl', 'd'], list(body.stream(5)))
+        self.assertEquals([11], received)
+
+        transport.connection.perform_request.return_value = \
+            (200, {}, StreamBody('a\nb'))
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals(['a\n', 'b'], [line for line in body])
+        self.assertEquals([11, 3], received)
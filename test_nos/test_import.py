@@ -0,0 +1,51 @@
+# -*- coding:utf8 -*-
+
+import json
+import subprocess
+import sys
+
+from nos.compat import LazyModule
+from nos.client.utils import USER_AGENT, get_user_agent
+from .benchmarks.bench_import import LAZY_MODULES, bench
+
+from .test_cases import TestCase
+
+#: Generous ceiling of `import nos`, in milliseconds, for slow test hosts.
+IMPORT_BUDGET = 300
+
+CHILD = '''
+import json, sys
+import nos
+loaded = [m for m in %r if sys.modules.get(m) is not None]
+nos.Client('id', 'secret').transport.connection
+print(json.dumps([loaded, 'urllib3' in sys.modules]))
+''' % (LAZY_MODULES, )
+
+
+class TestLazyImport(TestCase):
+    def test_import_nos(self):
+        loaded, transport_loaded = json.loads(
+            subprocess.check_output([sys.executable, '-c', CHILD])
+        )
+        self.assertEquals([], loaded)
+        self.assertTrue(transport_loaded)
+
+    def test_lazy_module(self):
+        module = LazyModule('nos.no_such_module', 'json')
+        self.assertEquals('[1]', module.dumps([1]))
+        self.assertRaises(ImportError, getattr,
+                          LazyModule('nos.no_such_module'), 'dumps')
+
+    def test_user_agent(self):
+        self.assertTrue(get_user_agent().startswith('nos-python-sdk/'))
+        self.assertTrue(get_user_agent() is get_user_agent())
+        self.assertEquals(get_user_agent(), USER_AGENT)
+        self.assertEquals(get_user_agent(), str(USER_AGENT))
+        self.assertEquals('UA: ' + get_user_agent(), 'UA: ' + USER_AGENT)
+        self.assertTrue(USER_AGENT.startswith('nos-python-sdk/'))
+
+    def test_import_time(self):
+        times, loaded = bench(5)
+        self.assertEquals([], loaded)
+        self.assertTrue(times[0] < IMPORT_BUDGET,
+                        'import nos took %.2f ms' % times[0])
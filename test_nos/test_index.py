@@ -0,0 +1,107 @@
+# -*- coding:utf8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+from mock import patch
+from nos import Client
+from nos.emulator import Emulator, EmulatorConnection
+from nos.index import ListingIndex, key_range, prefix_end
+
+from .test_cases import TestCase
+
+
+class TestListingIndex(TestCase):
+    def setUp(self):
+        super(TestListingIndex, self).setUp()
+        self.client = Client('id', 'secret',
+                             connection_class=EmulatorConnection,
+                             emulator=Emulator({'id': 'secret'}))
+        self.keys = ['a/1', 'a/2', 'a/3', 'b/1', 'b/2', 'c']
+        for key in self.keys:
+            self.client.put_object('bucket', key, key * 10)
+        self.index = ListingIndex()
+
+    def tearDown(self):
+        self.index.close()
+        super(TestListingIndex, self).tearDown()
+
+    def indexed(self, prefix=''):
+        return [o['key'] for o in self.index.iter_objects('bucket', prefix)]
+
+    def test_key_range(self):
+        self.assertEquals('a0', prefix_end('a/'))
+        self.assertEquals(None, prefix_end(''))
+        self.assertEquals('\xe4\xb8\xaf', prefix_end('\xe4\xb8\xae'))
+        self.assertEquals(('key >= ? AND key < ?', ['a/', 'a0']),
+                          key_range('a/'))
+        self.assertEquals(('key > ? AND key < ?', ['a/1', 'a/3']),
+                          key_range('a/', 'a/1', 'a/3'))
+        self.assertEquals(('key >= ?', ['']), key_range())
+
+    def test_refresh(self):
+        with patch('nos.index.BATCH_SIZE', 2):
+            result = self.index.refresh(self.client, 'bucket')
+        self.assertEquals({'listed': 6, 'removed': 0}, result)
+        self.assertEquals(self.keys, self.indexed())
+        self.assertTrue(self.index.refreshed_at('bucket') > 0)
+        self.assertEquals(None, self.index.refreshed_at('bucket', 'a/'))
+
+        entry = self.index.get('bucket', 'a/2')
+        self.assertEquals(30, entry['size'])
+        self.assertEquals(hashlib.md5('a/2' * 10).hexdigest(), entry['etag'])
+        self.assertTrue(entry['mtime'] > 0)
+        self.assertTrue(self.index.exists('bucket', 'c'))
+        self.assertFalse(self.index.exists('bucket', 'd'))
+        self.assertFalse(self.index.exists('other', 'c'))
+        self.assertEquals({'count': 3, 'size': 90},
+                          self.index.total('bucket', 'a/'))
+        self.assertEquals({'count': 0, 'size': 0},
+                          self.index.total('other'))
+        self.assertEquals(['a/2', 'a/3'], [
+            o['key'] for o in self.index.iter_objects(
+                'bucket', 'a/', marker='a/1', batch_size=1)
+        ])
+
+    def test_refresh_changes(self):
+        self.index.refresh(self.client, 'bucket')
+        self.client.delete_objects('bucket', ['a/1', 'a/3', 'b/1'])
+        self.client.put_object('bucket', 'a/2', 'new')
+        self.client.put_object('bucket', 'a/4', 'new')
+
+        # only the range b/ is refreshed
+        result = self.index.refresh(self.client, 'bucket', 'b/')
+        self.assertEquals({'listed': 1, 'removed': 1}, result)
+        self.assertEquals(['a/1', 'a/2', 'a/3', 'b/2', 'c'], self.indexed())
+
+        # from a/1 up to a/3 excluded
+        result = self.index.refresh(self.client, 'bucket', 'a/',
+                                    marker='a/1', end='a/3')
+        self.assertEquals({'listed': 1, 'removed': 0}, result)
+        self.assertEquals(3, self.index.get('bucket', 'a/2')['size'])
+        self.assertEquals(['a/1', 'a/2', 'a/3', 'b/2', 'c'], self.indexed())
+
+        with patch('nos.index.BATCH_SIZE', 1):
+            result = self.index.refresh(self.client, 'bucket', 'a/')
+        self.assertEquals({'listed': 2, 'removed': 2}, result)
+        self.assertEquals(['a/2', 'a/4', 'b/2', 'c'], self.indexed())
+
+        self.client.delete_objects('bucket', ['a/2', 'a/4'])
+        result = self.index.refresh(self.client, 'bucket', 'a/')
+        self.assertEquals({'listed': 0, 'removed': 2}, result)
+        self.assertEquals(['b/2', 'c'], self.indexed())
+
+    def test_persistent(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'index.db')
+            index = ListingIndex(path)
+            index.refresh(self.client, 'bucket', u'b/')
+            index.close()
+            index = ListingIndex(path)
+            self.assertEquals({'count': 2, 'size': 60},
+                              index.total('bucket'))
+            index.close()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,114 @@
+# -*- coding:utf8 -*-
+
+from StringIO import StringIO
+from mock import Mock
+from nos.exceptions import ServiceUnavailableError, NotFoundError
+from nos.metrics import Metrics, Histogram, get_operation
+from nos.retry import RetryPolicy
+from nos.transport import Transport
+
+from .test_cases import TestCase
+
+
+class TestMetrics(TestCase):
+    def test_get_operation(self):
+        cases = [
+            ('POST', None, {'delete': None}, {}, 'delete_objects'),
+            ('GET', None, {'uploads': None}, {}, 'list_multipart_uploads'),
+            ('POST', 'k', {'uploads': None}, {}, 'create_multipart_upload'),
+            ('PUT', 'k', {'partNumber': 1, 'uploadId': 'u'}, {},
+             'upload_part'),
+            ('POST', 'k', {'uploadId': 'u'}, {}, 'complete_multipart_upload'),
+            ('DELETE', 'k', {'uploadId': 'u'}, {}, 'abort_multipart_upload'),
+            ('GET', 'k', {'uploadId': 'u'}, {}, 'list_parts'),
+            ('GET', None, {}, {}, 'list_objects'),
+            ('PUT', 'k', {}, {'x-nos-copy-source': '/b/k'}, 'copy_object'),
+            ('PUT', 'k', {}, {'x-nos-move-source': '/b/k'}, 'move_object'),
+            ('PUT', 'k', {}, {}, 'put_object'),
+            ('GET', 'k', {}, {}, 'get_object'),
+            ('HEAD', 'k', {}, {}, 'head_object'),
+            ('DELETE', 'k', {}, {}, 'delete_object'),
+        ]
+        for method, key, params, headers, operation in cases:
+            self.assertEquals(operation,
+                              get_operation(method, key, params, headers))
+
+    def test_histogram(self):
+        h = Histogram((1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            h.observe(value)
+        self.assertEquals({
+            'count': 4,
+            'sum': 6.0,
+            'buckets': [(1, 2), (2, 3), (float('inf'), 4)]
+        }, h.snapshot())
+
+    def test_export_prometheus(self):
+        metrics = Metrics(buckets=(0.1, ))
+        metrics.histogram('duration', 'get_object').observe(0.05)
+        metrics.incr('requests', (('operation', 'get_object'),
+                                  ('status', 200)))
+        self.assertEquals(
+            '# TYPE nos_request_duration_seconds histogram\n'
+            'nos_request_duration_seconds_bucket'
+            '{operation="get_object",le="0.1"} 1\n'
+            'nos_request_duration_seconds_bucket'
+            '{operation="get_object",le="+Inf"} 1\n'
+            'nos_request_duration_seconds_sum{operation="get_object"} 0.05\n'
+            'nos_request_duration_seconds_count{operation="get_object"} 1\n'
+            '# TYPE nos_requests_total counter\n'
+            'nos_requests_total{operation="get_object",status="200"} 1\n',
+            metrics.export_prometheus()
+        )
+
+    def test_transport(self):
+        metrics = Metrics()
+        transport = Transport(metrics=metrics, retry_policy=RetryPolicy(
+            sleep=Mock()
+        ))
+        transport.connection.perform_request = Mock(side_effect=[
+            ServiceUnavailableError(503, '', '', '', ''),
+            (200, {}, StringIO('hello world'))
+        ])
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals('hello', body.read(5))
+        self.assertEquals(' world', body.read())
+
+        transport.connection.perform_request = Mock(
+            side_effect=NotFoundError(404, '', '', '', '')
+        )
+        self.assertRaises(NotFoundError, transport.perform_request,
+                          'PUT', 'bucket', 'key', body='data')
+
+        snapshot = metrics.snapshot()
+        get = (('operation', 'get_object'), )
+        put = (('operation', 'put_object'), )
+        self.assertEquals({
+            ('retries', get): 1,
+            ('bytes_sent', get): 0,
+            ('bytes_received', get): 11,
+            ('requests', get + (('status', 200), )): 1,
+            ('bytes_sent', put): 4,
+            ('requests', put + (('status', 'NotFoundError'), )): 1,
+        }, snapshot['counters'])
+        for name in Metrics.HISTOGRAMS:
+            self.assertEquals(
+                1, snapshot['histograms'][(name, 'get_object')]['count']
+            )
+        self.assertFalse(('body', 'put_object') in snapshot['histograms'])
+
+    def test_iterated_body(self):
+        metrics = Metrics()
+        transport = Transport(metrics=metrics)
+        transport.connection.perform_request = Mock(
+            return_value=(200, {}, StringIO('hello\nworld'))
+        )
+        _, _, body = transport.perform_request('GET', 'bucket', 'key')
+        self.assertEquals(['hello\n', 'world'], list(body))
+
+        snapshot = metrics.snapshot()
+        get = (('operation', 'get_object'), )
+        self.assertEquals(11, snapshot['counters'][('bytes_received', get)])
+        self.assertEquals(
+            1, snapshot['histograms'][('body', 'get_object')]['count']
+        )
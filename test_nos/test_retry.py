@@ -0,0 +1,103 @@
+# -*- coding:utf8 -*-
+
+from mock import Mock, patch
+from nos.exceptions import (ConnectionError, ConnectionTimeout,
+                            ServiceException, NotFoundError)
+from nos.retry import RetryPolicy, RetryBudget
+from nos.transport import Transport
+
+from .test_cases import TestCase
+
+
+def service_error(status, retry_after=None):
+    e = ServiceException(status, '', '', '', '')
+    e.retry_after = retry_after
+    return e
+
+
+class TestRetryPolicy(TestCase):
+    def delays(self, policy, errors):
+        state = policy.start()
+        return [state.next_delay(e) for e in errors]
+
+    def test_default(self):
+        policy = RetryPolicy(backoff_factor=0.1)
+        self.assertEquals(
+            [0.1, 0.2, None],
+            self.delays(policy, [ConnectionError('', '')] * 3)
+        )
+        self.assertEquals([None], self.delays(policy, [service_error(404)]))
+        self.assertEquals([None], self.delays(policy,
+                                              [ConnectionTimeout('', '')]))
+
+    def test_full_jitter(self):
+        policy = RetryPolicy(max_retries=10, backoff_factor=1, backoff_max=8,
+                             jitter='full')
+        for i, delay in enumerate(self.delays(policy,
+                                              [service_error(503)] * 10)):
+            self.assertTrue(0 <= delay <= min(8, 2 ** i))
+
+    def test_decorrelated_jitter(self):
+        policy = RetryPolicy(max_retries=10, backoff_factor=1, backoff_max=8,
+                             jitter='decorrelated')
+        previous = 1
+        for delay in self.delays(policy, [service_error(503)] * 10):
+            self.assertTrue(1 <= delay <= min(8, previous * 3))
+            previous = delay
+        self.assertRaises(ValueError, RetryPolicy, jitter='equal')
+
+    def test_retry_after(self):
+        policy = RetryPolicy(backoff_factor=0.1, backoff_max=30)
+        self.assertEquals(
+            [5, 30],
+            self.delays(policy, [service_error(503, 5),
+                                 service_error(503, 3600)])
+        )
+
+    def test_budget(self):
+        budget = RetryBudget(capacity=2, refill_ratio=0.5)
+        policy = RetryPolicy(max_retries=5, budget=budget)
+        self.assertEquals([0, 0, None],
+                          self.delays(policy, [service_error(500)] * 3))
+        policy.start().succeeded()
+        policy.start().succeeded()
+        self.assertEquals([0, None],
+                          self.delays(policy, [service_error(500)] * 2))
+        for _ in xrange(10):
+            budget.release()
+        self.assertEquals(2, budget.tokens)
+
+    def test_deadline(self):
+        policy = RetryPolicy(max_retries=5, backoff_factor=1, deadline=10)
+        with patch('time.time', Mock(return_value=100.0)):
+            state = policy.start()
+            self.assertEquals(10, state.get_timeout(None))
+            self.assertEquals(3, state.get_timeout(3))
+            self.assertEquals(1, state.next_delay(service_error(500)))
+        with patch('time.time', Mock(return_value=108.5)):
+            self.assertEquals(1.5, state.get_timeout(30))
+            self.assertEquals(None, state.next_delay(service_error(500)))
+
+
+class TestTransportRetry(TestCase):
+    def test_retry_policy(self):
+        sleep = Mock()
+        policy = RetryPolicy(max_retries=3, backoff_factor=0.5, sleep=sleep)
+        transport = Transport(retry_policy=policy)
+        transport.connection.perform_request = Mock(side_effect=[
+            service_error(503, 2), ConnectionError('', ''), (200, {}, '')
+        ])
+        self.assertEquals((200, {}, ''), transport.perform_request('GET'))
+        self.assertEquals([((2, ), {}), ((1.0, ), {})],
+                          sleep.call_args_list)
+
+    def test_default_policy(self):
+        transport = Transport(max_retries=1, retry_backoff_factor=0)
+        transport.connection.perform_request = Mock(
+            side_effect=NotFoundError(404, '', '', '', '')
+        )
+        self.assertRaises(NotFoundError, transport.perform_request, 'GET')
+        self.assertEquals(1, transport.connection.perform_request.call_count)
+        self.assertEquals(1, transport.retry_policy.max_retries)
+        self.assertEquals(Transport.BACKOFF_MAX,
+                          transport.retry_policy.backoff_max)
@@ -0,0 +1,131 @@
+# -*- coding:utf8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+from nos import Client
+from nos.emulator import Emulator, EmulatorConnection
+from nos.client.utils import parse_last_modified
+from nos.sync import sync_up, sync_down
+
+from .test_cases import TestCase
+
+
+class TestSync(TestCase):
+    def setUp(self):
+        super(TestSync, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.client = Client('id', 'secret',
+                             connection_class=EmulatorConnection,
+                             emulator=Emulator({'id': 'secret'}))
+        self.files = {
+            'index.html': '<html></html>',
+            'css/site.css': 'body {}',
+            'js/lib/app.js': 'x' * 3000,
+        }
+        for name, data in self.files.iteritems():
+            self.write(name, data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestSync, self).tearDown()
+
+    def write(self, name, data, directory=None):
+        path = os.path.join(directory or self.directory, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        return path
+
+    def keys(self, prefix='site/'):
+        return sorted(o['key'] for o in
+                      self.client.iter_objects('bucket', prefix=prefix))
+
+    def test_parse_last_modified(self):
+        self.assertEquals(0, parse_last_modified('1970-01-01T00:00:00.000Z'))
+        self.assertEquals(None, parse_last_modified('yesterday'))
+
+    def test_sync_up(self):
+        keys = ['site/css/site.css', 'site/index.html', 'site/js/lib/app.js']
+        result = sync_up(self.client, self.directory, 'bucket', 'site',
+                         part_size=1024)
+        self.assertEquals(keys, result['uploaded'])
+        self.assertEquals(keys, self.keys())
+        self.assertEquals(
+            self.files['js/lib/app.js'],
+            self.client.get_object('bucket',
+                                   'site/js/lib/app.js')['body'].read()
+        )
+
+        result = sync_up(self.client, self.directory, 'bucket', 'site/')
+        self.assertEquals([], result['uploaded'])
+        self.assertEquals(keys, result['unchanged'])
+
+        # same size, other content
+        self.write('index.html', '<body></body>')
+        os.remove(os.path.join(self.directory, 'css', 'site.css'))
+        result = sync_up(self.client, self.directory, 'bucket', 'site',
+                         delete=True, dry_run=True)
+        self.assertEquals(['site/index.html'], result['uploaded'])
+        self.assertEquals(['site/css/site.css'], result['deleted'])
+        self.assertEquals(keys, self.keys())
+
+        sync_up(self.client, self.directory, 'bucket', 'site', delete=True)
+        self.assertEquals(['site/index.html', 'site/js/lib/app.js'],
+                          self.keys())
+        self.assertEquals(
+            '<body></body>',
+            self.client.get_object('bucket', 'site/index.html')['body'].read()
+        )
+
+    def test_sync_up_without_checksum(self):
+        sync_up(self.client, self.directory, 'bucket', 'site')
+        path = self.write('index.html', 'X' * len(self.files['index.html']))
+        os.utime(path, (0, 0))
+        result = sync_up(self.client, self.directory, 'bucket', 'site',
+                         checksum=False)
+        self.assertEquals([], result['uploaded'])
+
+        future = time.time() + 3600
+        os.utime(path, (future, future))
+        result = sync_up(self.client, self.directory, 'bucket', 'site',
+                         checksum=False)
+        self.assertEquals(['site/index.html'], result['uploaded'])
+
+    def test_sync_down(self):
+        sync_up(self.client, self.directory, 'bucket', 'site')
+        self.client.put_object('bucket', 'site/../escape', 'x')
+        target = tempfile.mkdtemp()
+        try:
+            result = sync_down(self.client, 'bucket', 'site', target,
+                               part_size=1024)
+            self.assertEquals(
+                ['site/css/site.css', 'site/index.html',
+                 'site/js/lib/app.js'],
+                result['downloaded']
+            )
+            for name, data in self.files.iteritems():
+                with open(os.path.join(target, *name.split('/'))) as fp:
+                    self.assertEquals(data, fp.read())
+            self.assertFalse(os.path.exists(os.path.join(target, '..',
+                                                         'escape')))
+
+            result = sync_down(self.client, 'bucket', 'site', target,
+                               checksum=False)
+            self.assertEquals([], result['downloaded'])
+
+            self.client.put_object('bucket', 'site/index.html', 'new')
+            extra = self.write('extra.txt', 'extra', target)
+            result = sync_down(self.client, 'bucket', 'site', target,
+                               delete=True)
+            self.assertEquals(['site/index.html'], result['downloaded'])
+            self.assertEquals(['site/extra.txt'], result['deleted'])
+            self.assertFalse(os.path.exists(extra))
+            with open(os.path.join(target, 'index.html')) as fp:
+                self.assertEquals('new', fp.read())
+            self.assertEquals([], [n for n in os.listdir(target)
+                                   if n.endswith('.nos-sync')])
+        finally:
+            shutil.rmtree(target)
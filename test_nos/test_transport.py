@@ -3,7 +3,7 @@
 from mock import Mock, patch
 from nos.exceptions import (ConnectionTimeout, ConnectionError,
                             ServiceException, FileOpenModeError,
-                            BadRequestError)
+                            BadRequestError, InvalidBucketName)
 from nos.transport import Transport
 from nos.serializer import JSONSerializer
 from nos.connection import Urllib3HttpConnection
@@ -76,7 +76,8 @@ class TestTransport(TestCase):
             params={},
             body=None,
             headers={},
-            enable_ssl=False
+            enable_ssl=False,
+            signer=transport.signer
         )
         transport.connection.perform_request.assert_called_once_with(
             'GET', url, None, headers, timeout=None
@@ -160,3 +161,12 @@ class TestTransport(TestCase):
         self.assertRaises(
             BadRequestError, transport.perform_request, 'GET', body=d
         )
+
+    def test_prewarm(self):
+        transport = Transport(end_point='nos.netease.com', enable_ssl=True)
+        transport.connection.prewarm = Mock()
+        transport.prewarm(u'bucket', 4)
+        transport.connection.prewarm.assert_called_once_with(
+            'https://bucket.nos.netease.com/', 4
+        )
+        self.assertRaises(InvalidBucketName, transport.prewarm, '', 4)